@@ -0,0 +1,194 @@
+import os
+import time
+import asyncio
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+from check_photo_date import (MediaDateChecker, PROBE_PENDING, DEFAULT_CACHE_PATH,
+                              PROBE_TIMEOUT)
+from extractor_chain import ExtractorStats, OUTCOME_HIT, OUTCOME_MISS, OUTCOME_SKIP
+from video_probe import run_probe_async, ProbeError
+
+# 同时等待的ffprobe进程数：ffprobe在网络存储上主要是在等待I/O，并发数可以远大于CPU数
+ASYNC_PROBE_CONCURRENCY = 64
+# 解析文件头的线程数
+ASYNC_HEADER_WORKERS = 8
+# 同时处理中的文件数上限（包括等待ffprobe的视频和已完成但调用方还没有取走的结果），超过后暂停遍历目录
+ASYNC_MAX_IN_FLIGHT = 512
+
+_DONE = object()
+
+class AsyncMediaDateChecker(MediaDateChecker):
+    """MediaDateChecker的asyncio版本，用于嵌入在asyncio服务中
+
+    目录在单独的线程中遍历，文件头解析在线程池中运行，ffprobe通过asyncio.create_subprocess_exec
+    启动并由信号量限制并发数，因此大量视频在慢速网络存储上的等待时间可以重叠。
+    用法：async for result in checker.ascan(path): ...
+    文件移动仍然逐个进行，不会有两个文件争用同一个目标文件名。
+    调用方处理结果较慢时，结果占用的名额要等到被取走后才归还，遍历和检查随之暂停。
+    """
+
+    def __init__(self, directory, cache_path=DEFAULT_CACHE_PATH, probe_concurrency=ASYNC_PROBE_CONCURRENCY,
+                 header_workers=ASYNC_HEADER_WORKERS, probe_timeout=PROBE_TIMEOUT, max_in_flight=ASYNC_MAX_IN_FLIGHT,
+                 skip_unchanged_dirs=False):
+        super().__init__(directory, workers=1, cache_path=cache_path, probe_timeout=probe_timeout,
+                         checkpoint_dir=None, skip_unchanged_dirs=skip_unchanged_dirs)
+        self.probe_concurrency = probe_concurrency
+        self.header_workers = header_workers
+        self.max_in_flight = max_in_flight
+
+    async def ascan(self, path=None, move_no_info=False, move_big_video=False):
+        """异步扫描目录（默认为检查器的目录），按完成顺序产出ScanResult
+
+        ffprobe超时或崩溃的视频归入probe_failed类别；生成器关闭时（提前跳出async for后调用aclose()，
+        或由事件循环回收）取消尚未完成的文件并结束正在运行的ffprobe。
+        """
+        loop = asyncio.get_running_loop()
+        directory = path or self.directory
+        cache = self.open_cache()
+        entries = asyncio.Queue()
+        results = asyncio.Queue()
+        # 遍历线程每产出一个文件占用一个名额，结果被调用方取走（或文件没有结果）后归还，
+        # 避免一次性列举整个目录树，也避免结果在队列中无限堆积
+        slots = threading.Semaphore(self.max_in_flight)
+        stop = threading.Event()
+        walker_pool = ThreadPoolExecutor(max_workers=1)
+        header_pool = ThreadPoolExecutor(max_workers=self.header_workers)
+        context = {
+            'loop': loop,
+            'cache': cache,
+            'header_pool': header_pool,
+            'probe_semaphore': asyncio.Semaphore(self.probe_concurrency),
+            'move_lock': asyncio.Lock(),
+            'lookup': partial(self.lookup_known, cache=cache, need_bitrate=move_big_video),
+            'move_no_info': move_no_info,
+            'move_big_video': move_big_video,
+        }
+        self.probe_results = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.dir_hits = 0
+        self.dir_misses = 0
+        self.extractor_chain.stats = ExtractorStats()
+        dir_index = cache if self.skip_unchanged_dirs else None
+
+        walker = loop.run_in_executor(walker_pool, self._enumerate, directory, dir_index, loop, entries, slots, stop)
+        dispatcher = asyncio.ensure_future(self._dispatch(entries, results, slots, context))
+        try:
+            while True:
+                result = await results.get()
+                if result is _DONE:
+                    break
+                if isinstance(result, Exception):
+                    raise result
+                slots.release()
+                yield result
+            await walker
+            await dispatcher
+        finally:
+            stop.set()
+            dispatcher.cancel()
+            try:
+                await dispatcher
+            except (asyncio.CancelledError, Exception):
+                pass
+            walker_pool.shutdown(wait=False, cancel_futures=True)
+            header_pool.shutdown(wait=False, cancel_futures=True)
+            if cache:
+                self.cache_hits = cache.hits
+                self.cache_misses = cache.misses
+                self.dir_hits = cache.dir_hits
+                self.dir_misses = cache.dir_misses
+                cache.close()
+
+    def _enumerate(self, directory, dir_index, loop, entries, slots, stop):
+        """在遍历线程中列举文件并交给事件循环，stop被设置时提前结束"""
+        try:
+            for entry in self.iter_media_files(dir_index, directory):
+                while not slots.acquire(timeout=0.5):
+                    if stop.is_set():
+                        return
+                if stop.is_set():
+                    return
+                loop.call_soon_threadsafe(entries.put_nowait, entry)
+        finally:
+            loop.call_soon_threadsafe(entries.put_nowait, _DONE)
+
+    async def _dispatch(self, entries, results, slots, context):
+        """为每个文件创建一个任务，全部完成后放入结束标记（出错时放入异常）"""
+        tasks = set()
+        try:
+            while True:
+                entry = await entries.get()
+                if entry is _DONE:
+                    break
+                task = asyncio.ensure_future(self._check_entry(entry, results, slots, context))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+            await results.put(_DONE)
+        except Exception as e:
+            # 交给ascan抛出，避免调用方一直等待
+            await results.put(e)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _check_entry(self, entry, results, slots, context):
+        """检查单个文件：已知结果直接使用，否则在线程池中解析文件头，需要时再异步运行ffprobe
+
+        结果放入队列后名额由ascan在取走结果时归还，没有结果（或出错）时在这里归还。
+        查询缓存（SQLite和文件名匹配）也在线程池中进行，不阻塞事件循环。
+        """
+        queued = False
+        try:
+            known = await context['loop'].run_in_executor(context['header_pool'], context['lookup'], entry)
+            if known is not None:
+                _, check_result, extractor, skip_cache = known
+            else:
+                skip_cache = False
+                try:
+                    check_result, extractor = await context['loop'].run_in_executor(
+                        context['header_pool'],
+                        partial(self.check_media_with_source, entry.path, defer_probe=True, name_checked=True)
+                    )
+                except Exception as e:
+                    check_result, extractor = (False, f"检查文件时出错: {str(e)}", "未知", None), None
+                if check_result == PROBE_PENDING:
+                    check_result, extractor = await self._probe(entry, context)
+
+            result = await self._classify(entry, check_result, extractor, skip_cache, context)
+            if result is not None:
+                await results.put(result)
+                queued = True
+        finally:
+            if not queued:
+                slots.release()
+
+    async def _probe(self, entry, context):
+        """在信号量限制下异步运行ffprobe，返回 (检查结果或ProbeError, 提取方式)"""
+        async with context['probe_semaphore']:
+            start = time.perf_counter()
+            try:
+                probe = await run_probe_async(self.ffprobe_path, entry.path, self.probe_timeout)
+            except ProbeError as e:
+                print(f"处理视频 {entry.path} 时出错: {str(e)}")
+                self._record_probe(entry, time.perf_counter() - start, OUTCOME_SKIP)
+                return e, None
+            self._record_probe(entry, time.perf_counter() - start,
+                               OUTCOME_HIT if probe and probe.creation_time else OUTCOME_MISS)
+        self.probe_results[entry.path] = probe
+        return self.probe_check_result(probe, entry.path), 'ffprobe'
+
+    def _record_probe(self, entry, elapsed, outcome):
+        self.extractor_chain.stats.record('ffprobe', entry.ext, os.path.dirname(entry.path), elapsed, outcome)
+
+    async def _classify(self, entry, check_result, extractor, skip_cache, context):
+        """与iter_scan相同的归类规则（settle_result）；移动文件和写缓存在线程池中逐个执行，不阻塞事件循环"""
+        async with context['move_lock']:
+            return await context['loop'].run_in_executor(
+                context['header_pool'], self.settle_result, entry, check_result, extractor, skip_cache,
+                context['cache'], context['move_no_info'], context['move_big_video']
+            )
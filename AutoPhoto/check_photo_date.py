@@ -1,7 +1,5 @@
 import os
-import shutil
 from PIL import Image
-from PIL.ExifTags import TAGS
 from datetime import datetime
 import logging
 import tkinter as tk
@@ -9,13 +7,40 @@ from tkinter import ttk, filedialog, messagebox
 import threading
 import glob
 import ffmpeg
-import subprocess
 import sys
-import json
+import time
+import multiprocessing
+import zipfile
+import random
+from collections import namedtuple
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from pillow_heif import register_heif_opener, HeifFile  # 添加HEIC支持
 import win32file
 import win32con
 import pywintypes
+from scan_walker import walk_media_files
+from name_index import TargetNameIndex
+from copy_engine import move_file
+from date_organizer import DateTreeOrganizer, format_organize_result
+from duplicate_finder import (find_duplicates, redundant_files, format_duplicate_report,
+                              HASH_WORKERS, KEEP_NEWEST)
+from move_plan import MovePlan, apply_move_plan, undo_moves, format_apply_result
+from media_cache import MetadataCache
+from exif_reader import read_exif_date, ExifFormatError
+from video_parsers import read_video_info, can_parse, VideoFormatError
+from toolchain import get_toolchain
+from date_normalizer import parse_date, normalize_date, format_date
+from filename_dates import NameDateMatcher
+from livp_reader import read_livp_date
+from scan_checkpoint import ScanCheckpoint, checkpoint_path_for
+from scan_pipeline import Pipeline, format_stage_stats
+from scan_sampling import build_strata, estimate_total, estimate_cost
+from extractor_chain import (
+    Extractor, ExtractorChain, ExtractorStats, ExtractorSkipped,
+    TIER_NAME, TIER_METADATA, OUTCOME_HIT, OUTCOME_MISS, OUTCOME_SKIP
+)
+from video_probe import run_probe, ProbePool, ProbeError, ProbeCrash, PROBE_WORKERS, PROBE_TIMEOUT
 
 # 注册HEIC支持
 register_heif_opener()
@@ -25,8 +50,11 @@ DEFAULT_CHECK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Ch
 NO_INFO_DIR = os.path.join(DEFAULT_CHECK_DIR, 'NoInformation')
 NO_VIDEO_INFO_DIR = os.path.join(DEFAULT_CHECK_DIR, 'NoVideoInformation')
 BIG_VIDEO_DIR = os.path.join(DEFAULT_CHECK_DIR, 'BigVideo')  # 大视频文件夹
+DUPLICATE_DIR = os.path.join(DEFAULT_CHECK_DIR, 'Duplicates')  # 重复文件的多余副本（移动时才创建）
 LOG_DIR = os.path.dirname(os.path.abspath(__file__))  # AutoPhoto文件夹
 FFMPEG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ffmpeg-7.1.1', 'bin')  # ffmpeg目录
+DEFAULT_CACHE_PATH = os.path.join(LOG_DIR, 'media_cache.db')  # 元数据缓存数据库
+TOOLCHAIN_CACHE_PATH = os.path.join(LOG_DIR, 'toolchain_cache.json')  # ffmpeg/ffprobe查找结果缓存
 
 # 确保Check文件夹存在
 if not os.path.exists(DEFAULT_CHECK_DIR):
@@ -88,6 +116,19 @@ def get_log_file():
         
         return backup_log_file
 
+def get_move_plan_path():
+    """获取新的移动计划文件路径（保存在AutoPhoto文件夹中，执行前可以审阅或删减）"""
+    current_time = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return os.path.join(LOG_DIR, f'move_plan_{current_time}.jsonl')
+
+def journal_path_for_plan(plan_path):
+    """移动计划对应的移动日志：同一计划再次执行时继续使用同一个日志，已完成的移动被跳过"""
+    directory, file_name = os.path.split(plan_path)
+    stem = os.path.splitext(file_name)[0]
+    if stem.startswith('move_plan_'):
+        stem = stem[len('move_plan_'):]
+    return os.path.join(directory, f'move_journal_{stem}.jsonl')
+
 def write_to_log(log_file, content):
     """写入内容到日志文件"""
     try:
@@ -97,47 +138,12 @@ def write_to_log(log_file, content):
         print(f"写入日志文件时出错: {str(e)}")
 
 def check_ffmpeg():
-    """检查ffmpeg是否已安装"""
-    try:
-        # 首先尝试使用环境变量中的ffmpeg
-        result = subprocess.run(['ffprobe', '-version'], capture_output=True, text=True)
-        if result.returncode == 0:
-            return True
-            
-        # 如果环境变量中的ffmpeg不可用，尝试使用本地ffmpeg
-        ffprobe_path = os.path.join(FFMPEG_DIR, 'ffprobe.exe')
-        if os.path.exists(ffprobe_path):
-            result = subprocess.run([ffprobe_path, '-version'], capture_output=True, text=True)
-            return result.returncode == 0
-            
-        return False
-    except FileNotFoundError:
-        # 如果环境变量中的ffmpeg不可用，尝试使用本地ffmpeg
-        ffprobe_path = os.path.join(FFMPEG_DIR, 'ffprobe.exe')
-        if os.path.exists(ffprobe_path):
-            try:
-                result = subprocess.run([ffprobe_path, '-version'], capture_output=True, text=True)
-                return result.returncode == 0
-            except Exception:
-                return False
-        return False
+    """检查ffmpeg是否已安装（查找结果在进程内共用，并按文件修改时间缓存在磁盘上）"""
+    return get_toolchain(FFMPEG_DIR, TOOLCHAIN_CACHE_PATH).has_ffprobe
 
 def get_ffprobe_path():
     """获取ffprobe的路径"""
-    try:
-        # 首先尝试使用环境变量中的ffprobe
-        result = subprocess.run(['ffprobe', '-version'], capture_output=True, text=True)
-        if result.returncode == 0:
-            return 'ffprobe'
-    except FileNotFoundError:
-        pass
-        
-    # 如果环境变量中的ffprobe不可用，使用本地ffprobe
-    ffprobe_path = os.path.join(FFMPEG_DIR, 'ffprobe.exe')
-    if os.path.exists(ffprobe_path):
-        return ffprobe_path
-        
-    return None
+    return get_toolchain(FFMPEG_DIR, TOOLCHAIN_CACHE_PATH).ffprobe_path
 
 def show_ffmpeg_error():
     """显示ffmpeg安装提示"""
@@ -149,11 +155,135 @@ def show_ffmpeg_error():
         "当前查找路径：" + FFMPEG_DIR
     )
 
+# 可以只读文件头解析EXIF的图片格式
+NATIVE_EXIF_FORMATS = ('.jpg', '.jpeg', '.tiff', '.tif', '.png', '.heic', '.heif')
+# EXIF日期标签名对应的标签ID
+DATE_TAG_IDS = {
+    'DateTimeOriginal': 0x9003,
+    'DateTimeDigitized': 0x9004,
+    'DateTime': 0x0132,
+}
+
+# 并行扫描时每个工作进程只提交这么多个文件为一批，减少进程间通信次数
+SCAN_BATCH_SIZE = 32
+# Windows下ProcessPoolExecutor最多支持61个工作进程
+MAX_SCAN_WORKERS = 61
+
+# 流式扫描时GUI刷新部分结果的时间间隔（秒）
+PARTIAL_RESULT_INTERVAL = 0.5
+
+# 分阶段扫描时预读文件头的线程数（等待磁盘或网络存储，线程数可以多于CPU数）
+STAGE_READ_WORKERS = 8
+# 分阶段扫描时解析文件头的线程数：解析器是纯Python代码，受GIL限制多个线程并不能同时解析，
+# 只会互相争抢；解析阶段的作用是与预读和ffprobe的等待重叠，需要多核并行解析时使用iter_scan的进程池
+STAGE_PARSE_WORKERS = 1
+# 预读的文件头和视频文件尾的字节数（MP4的moov可能在文件末尾）
+HEADER_PREFETCH_BYTES = 64 * 1024
+
+# 快速估算时默认抽取的文件数
+DEFAULT_SAMPLE_SIZE = 400
+
+# 快速估算的结果：undated、big_videos、scan_seconds为scan_sampling.Estimate（含95%置信区间），
+# ext_counts为完整遍历得到的各扩展名文件数，ext_costs为样本中各扩展名每个文件的平均耗时（秒）
+ScanEstimate = namedtuple('ScanEstimate', [
+    'total_files', 'sampled', 'strata', 'ext_counts', 'ext_costs', 'livp_files',
+    'undated', 'big_videos', 'scan_seconds', 'walk_seconds', 'elapsed_seconds',
+])
+
+# 视频需要交给ffprobe线程池处理时，check_media_with_source返回的占位检查结果
+PROBE_PENDING = 'probe_pending'
+
+# 单个文件的扫描结果，category与结果字典的键一致：
+# with_date / without_date / big_videos / livp_files / probe_failed（ffprobe超时或崩溃）
+ScanResult = namedtuple('ScanResult', ['category', 'path', 'info', 'date_type', 'bitrate'])
+
+def new_scan_results():
+    """创建空的扫描结果字典"""
+    return {
+        'with_date': [],
+        'without_date': [],
+        'big_videos': [],  # 新增：大视频列表
+        'livp_files': [],  # zip包无法读取的LIVP文件（能读取的LIVP和普通图片一样归类）
+        'probe_failed': []  # ffprobe超时或崩溃的视频
+    }
+
+def add_scan_result(results, result):
+    """把单个ScanResult按原有的元组格式加入结果字典"""
+    if result.category == 'livp_files':
+        results['livp_files'].append(result.path)
+    elif result.category == 'big_videos':
+        results['big_videos'].append((result.path, f"{result.bitrate} kbps"))
+    else:
+        results[result.category].append((result.path, result.info, result.date_type, result.bitrate))
+
+def format_scan_result(result):
+    """把单个ScanResult格式化为GUI中显示的文本"""
+    lines = [f"文件: {result.path}"]
+    if result.category == 'big_videos':
+        lines.append(f"比特率: {result.bitrate} kbps")
+    elif result.category != 'livp_files':
+        lines.append(f"日期类型: {result.date_type}")
+        if result.category == 'with_date':
+            lines.append(f"日期: {result.info}")
+        else:
+            lines.append(f"原因: {result.info}")
+        if result.bitrate:
+            lines.append(f"比特率: {result.bitrate} kbps")
+    return '\n'.join(lines) + '\n\n'
+
+# 工作进程内复用的检查器（每个进程在启动时创建一次）
+_worker_checker = None
+
+def _init_scan_worker(directory):
+    """工作进程初始化：PIL和pillow_heif随模块导入时加载一次，这里只创建检查器"""
+    global _worker_checker
+    _worker_checker = MediaDateChecker(directory)
+
+def _check_media_batch(batch):
+    """在工作进程中检查一批文件，只做元数据提取，不移动文件
+
+    返回 (检查结果列表, 这一批新增的提取方式统计)。
+    """
+    checked = []
+    for entry in batch:
+        try:
+            check_result, extractor = _worker_checker.check_media_with_source(
+                entry.path, defer_probe=True, name_checked=True)
+            checked.append((entry, check_result, extractor))
+        except Exception as e:
+            checked.append((entry, (False, f"检查文件时出错: {str(e)}", "未知", None), None))
+    return checked, _worker_checker.extractor_chain.stats.take_delta()
+
+def resolve_worker_count(workers):
+    """把配置的进程数转换为实际使用的进程数（0或None表示使用全部CPU）"""
+    if not workers or workers <= 0:
+        workers = os.cpu_count() or 1
+    return max(1, min(workers, MAX_SCAN_WORKERS))
+
 class MediaDateChecker:
-    def __init__(self, directory):
+    def __init__(self, directory, workers=1, cache_path=DEFAULT_CACHE_PATH,
+                 probe_workers=PROBE_WORKERS, probe_timeout=PROBE_TIMEOUT, checkpoint_dir=LOG_DIR,
+                 skip_unchanged_dirs=False):
         self.directory = directory
+        self.workers = workers  # 并行扫描的进程数，1表示串行扫描
+        self.probe_workers = probe_workers  # 同时运行的ffprobe进程数
+        self.probe_timeout = probe_timeout  # 单个视频ffprobe的超时时间（秒）
+        self.cache_path = cache_path  # 元数据缓存位置，为None时不使用缓存
+        self.checkpoint_dir = checkpoint_dir  # 扫描检查点所在文件夹，为None时不记录检查点
+        self.cancelled = False  # 最近一次扫描是否被取消
+        self.resumed_results = 0  # 最近一次扫描从检查点恢复的结果数量
+        self.stage_stats = []  # 最近一次分阶段扫描各阶段的StageStats
+        self.name_index = TargetNameIndex()  # 移动文件时分配不冲突的目标文件名
+        self.move_plan = None  # 扫描时提供MovePlan则只记录移动计划，不移动文件
+        # 使用缓存时，修改时间未变化的目录复用上次记录的文件名，不再列举（每个文件仍然stat）；
+        # FAT/exFAT移动硬盘上目录的修改时间不可靠，可能漏掉新文件，因此默认关闭，由界面选项开启
+        self.skip_unchanged_dirs = skip_unchanged_dirs
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.dir_hits = 0
+        self.dir_misses = 0
         self.supported_image_formats = ['.jpg', '.jpeg', '.tiff', '.tif', '.png', '.heic', '.heif']
-        self.supported_video_formats = ['.mp4', '.mov', '.avi', '.mkv', '.wmv', '.flv', '.webm']
+        self.supported_video_formats = ['.mp4', '.mov', '.m4v', '.3gp', '.avi', '.mkv', '.wmv', '.flv', '.webm']
         self.date_tags = [
             'DateTimeOriginal',  # 原始拍摄时间
             'DateTimeDigitized', # 数字化时间
@@ -162,260 +292,300 @@ class MediaDateChecker:
         self.has_ffmpeg = check_ffmpeg()
         self.ffprobe_path = get_ffprobe_path()
         self.bitrate_threshold = 20000  # 比特率阈值（kbps）
+        # 文件名和文件夹名中的日期（信任级别见filename_dates.DEFAULT_TRUST）
+        self.name_dates = NameDateMatcher()
+        self.probe_results = {}  # 本次扫描中每个视频的ffprobe结果（路径 → ProbeResult）
+        # 日期提取链，每种提取方式的命中率和耗时写入extractor_chain.stats
+        self.extractor_chain = self.build_extractor_chain()
         
     def get_exif_date(self, image_path):
         """获取图片的EXIF日期信息"""
+        return self.get_exif_date_with_source(image_path)[0]
+
+    def get_exif_date_with_source(self, image_path):
+        """获取图片的EXIF日期信息，同时返回使用的提取方式"""
         try:
-            ext = os.path.splitext(image_path)[1].lower()
-            
-            # 特殊处理HEIC格式
-            if ext == '.heic':
-                try:
-                    print(f"\n开始处理HEIC文件: {image_path}")
-                    
-                    # 从文件名获取日期
-                    filename = os.path.basename(image_path)
-                    try:
-                        # 尝试从文件名解析日期（格式：YYYY-MM-DD HHMMSS）
-                        date_str = filename.split('.')[0]  # 移除扩展名
-                        date_obj = datetime.strptime(date_str, '%Y-%m-%d %H%M%S')
-                        print(f"从文件名获取到日期: {date_str}")
-                        return date_obj.strftime('%Y-%m-%d %H:%M:%S')
-                    except ValueError as e:
-                        print(f"从文件名解析日期失败: {str(e)}")
-                    
-                    # 使用HeifFile直接读取HEIC文件
-                    try:
-                        heif_file = HeifFile(image_path)
-                        print("成功打开HEIC文件")
-                        
-                        # 尝试从元数据中获取日期
-                        metadata = heif_file.metadata
-                        if metadata:
-                            print("元数据内容:", metadata)
-                            
-                            # 尝试不同的日期标签
-                            date_tags = [
-                                'DateTimeOriginal',
-                                'DateTimeDigitized',
-                                'DateTime',
-                                'CreateDate',
-                                'ModifyDate',
-                                'DateCreated',
-                                'DateModified',
-                                'DateTimeCreated',
-                                'DateTimeModified',
-                                'ContentCreateDate',
-                                'ContentModifyDate'
-                            ]
-                            
-                            for tag in date_tags:
-                                if tag in metadata:
-                                    date_str = metadata[tag]
-                                    print(f"找到日期标签 {tag}: {date_str}")
-                                    try:
-                                        # 尝试不同的日期格式
-                                        for fmt in [
-                                            '%Y:%m:%d %H:%M:%S',      # 2024:05:18 19:26:20
-                                            '%Y-%m-%d %H:%M:%S',      # 2024-05-18 19:26:20
-                                            '%Y/%m/%d %H:%M:%S',      # 2024/05/18 19:26:20
-                                            '%Y:%m:%d %H:%M:%S%z',    # 2024:05:18 19:26:20+0800
-                                            '%Y-%m-%d %H:%M:%S%z',    # 2024-05-18 19:26:20+0800
-                                            '%Y/%m/%d %H:%M:%S%z',    # 2024/05/18 19:26:20+0800
-                                            '%Y:%m:%d %H:%M:%S.%f',   # 2024:05:18 19:26:20.123
-                                            '%Y-%m-%d %H:%M:%S.%f',   # 2024-05-18 19:26:20.123
-                                            '%Y/%m/%d %H:%M:%S.%f',   # 2024/05/18 19:26:20.123
-                                            '%Y:%m:%d %H:%M:%S.%f%z', # 2024:05:18 19:26:20.123+0800
-                                            '%Y-%m-%d %H:%M:%S.%f%z', # 2024-05-18 19:26:20.123+0800
-                                            '%Y/%m/%d %H:%M:%S.%f%z'  # 2024/05/18 19:26:20.123+0800
-                                        ]:
-                                            try:
-                                                date_obj = datetime.strptime(date_str, fmt)
-                                                print(f"成功解析日期: {date_str} -> {date_obj}")
-                                                return date_obj.strftime('%Y-%m-%d %H:%M:%S')
-                                            except ValueError:
-                                                continue
-                                    except Exception as e:
-                                        print(f"解析日期时出错: {str(e)}")
-                                        continue
-                        else:
-                            print("未找到元数据")
-                    except Exception as e:
-                        print(f"读取HEIC文件时出错: {str(e)}")
-                    
-                    return None
-                except Exception as e:
-                    print(f"处理HEIC文件 {image_path} 时出错: {str(e)}")
-                    return None
+            date, _, extractor, reasons = self.extractor_chain.run(image_path)
+            if extractor is None and reasons:
+                print(f"无法读取图片 {image_path} 的日期: {reasons[-1]}")
+            return date, extractor
+        except Exception as e:
+            print(f"处理图片 {image_path} 时出错: {str(e)}")
+            return None, None
+
+    def build_extractor_chain(self):
+        """注册日期提取方式：文件名 → 文件头解析 → PIL/pillow_heif → ffprobe
+
+        文件内日期的几种提取方式按扫描中统计到的期望开销调整先后顺序，见extractor_chain.ExtractorChain。
+        """
+        images = set(self.supported_image_formats)
+        videos = set(self.supported_video_formats)
+        return ExtractorChain([
+            # 文件名符合可信的命名规则（如 IMG_20240518_192620、2024-05-18 192620）时不再打开文件
+            Extractor('filename', TIER_NAME, images, 0.00001, self._extract_filename),
+            # JPEG/TIFF/PNG/HEIC只读取文件头解析EXIF，结构无法识别时才交给PIL或pillow_heif
+            Extractor('exif_header', TIER_METADATA, images & set(NATIVE_EXIF_FORMATS), 0.0005, self._extract_exif_header),
+            Extractor('pillow_heif', TIER_METADATA, {'.heic'}, 0.05, self._extract_heif_metadata),
+            Extractor('PIL', TIER_METADATA, images - {'.heic'}, 0.01, self._extract_pil_exif),
+            # MP4/MOV、Matroska/WebM、AVI直接在进程内解析容器头，无法识别时才启动ffprobe
+            Extractor('video_header', TIER_METADATA, {ext for ext in videos if can_parse(ext)}, 0.001,
+                      self._extract_video_header),
+            Extractor('ffprobe', TIER_METADATA, videos, 0.2, self._extract_ffprobe),
+        ])
+
+    def _extract_filename(self, image_path, defer_probe):
+        named = self.name_dates.trusted_date(image_path)
+        if named is None:
+            raise ExtractorSkipped("文件名不符合可信的命名规则")
+        return format_date(named.date), None
+
+    def _extract_exif_header(self, image_path, defer_probe):
+        try:
+            return read_exif_date(image_path), None
+        except ExifFormatError as e:
+            print(f"快速解析EXIF失败，改用完整解析: {image_path} - {str(e)}")
+            raise ExtractorSkipped(f"快速解析EXIF失败: {str(e)}")
+
+    def _extract_heif_metadata(self, image_path, defer_probe):
+        try:
+            return self.read_heif_metadata_date(image_path), None
+        except Exception as e:
+            print(f"读取HEIC文件时出错: {str(e)}")
+            raise ExtractorSkipped(f"读取HEIC文件时出错: {str(e)}")
+
+    def _extract_pil_exif(self, image_path, defer_probe):
+        try:
+            return self.read_pil_exif_date(image_path), None
+        except Exception as e:
+            print(f"处理图片 {image_path} 时出错: {str(e)}")
+            raise ExtractorSkipped(f"PIL无法读取: {str(e)}")
+
+    def _extract_video_header(self, video_path, defer_probe):
+        try:
+            info = read_video_info(video_path)
+        except VideoFormatError as e:
+            print(f"快速解析视频失败，改用ffprobe: {video_path} - {str(e)}")
+            raise ExtractorSkipped(f"快速解析视频失败: {str(e)}")
+        except OSError as e:
+            print(f"读取视频 {video_path} 时出错: {str(e)}")
+            raise ExtractorSkipped(f"读取视频时出错: {str(e)}")
+        return info.creation_time, info.bitrate
+
+    def _extract_ffprobe(self, video_path, defer_probe):
+        """ffprobe超时或崩溃时抛出ProbeError（不是ExtractorSkipped，结果归入probe_failed）"""
+        if not self.has_ffmpeg:
+            raise ExtractorSkipped("未安装ffmpeg，无法处理视频")
+        if defer_probe and self.ffprobe_path:
+            return PROBE_PENDING, None
+        probe = self.probe_video(video_path)
+        if probe is None:
+            return None, None
+        return probe.creation_time, probe.bitrate
+
+    def get_heif_metadata_date(self, image_path):
+        """使用pillow_heif读取HEIC元数据中的日期（快速解析失败时的后备方案）"""
+        try:
+            return self.read_heif_metadata_date(image_path)
+        except Exception as e:
+            print(f"读取HEIC文件时出错: {str(e)}")
+            return None
+
+    def read_heif_metadata_date(self, image_path):
+        """读取HEIC元数据中的日期，文件无法打开时抛出异常"""
+        heif_file = HeifFile(image_path)
+        print("成功打开HEIC文件")
+        
+        # 尝试从元数据中获取日期
+        metadata = heif_file.metadata
+        if metadata:
+            # 尝试不同的日期标签
+            date_tags = [
+                'DateTimeOriginal',
+                'DateTimeDigitized',
+                'DateTime',
+                'CreateDate',
+                'ModifyDate',
+                'DateCreated',
+                'DateModified',
+                'DateTimeCreated',
+                'DateTimeModified',
+                'ContentCreateDate',
+                'ContentModifyDate'
+            ]
             
-            # 处理其他格式
-            try:
-                image = Image.open(image_path)
-                if not hasattr(image, '_getexif') or image._getexif() is None:
-                    print(f"文件 {image_path} 没有EXIF数据")
-                    return None
-                    
-                exif = image._getexif()
-                date_info = None
-                
-                for tag_id in exif:
-                    tag = TAGS.get(tag_id, tag_id)
-                    if tag in self.date_tags:
-                        date_info = exif[tag_id]
-                        print(f"从EXIF数据中找到日期: {date_info}")
-                        break
-                        
-                return date_info
-            except Exception as e:
-                print(f"处理图片 {image_path} 时出错: {str(e)}")
-                return None
-                
+            for tag in date_tags:
+                if tag in metadata:
+                    date_str = metadata[tag]
+                    print(f"找到日期标签 {tag}: {date_str}")
+                    # 支持冒号、短横线、斜杠分隔，可带小数秒和时区
+                    date_obj = parse_date(str(date_str), 'heif_metadata')
+                    if date_obj:
+                        print(f"成功解析日期: {date_str} -> {date_obj}")
+                        return format_date(date_obj)
+        else:
+            print("未找到元数据")
+        return None
+
+    def get_pil_exif_date(self, image_path):
+        """使用PIL读取图片的EXIF日期信息（快速解析失败时的后备方案）"""
+        try:
+            return self.read_pil_exif_date(image_path)
         except Exception as e:
             print(f"处理图片 {image_path} 时出错: {str(e)}")
             return None
 
-    def get_video_date(self, video_path):
-        """获取视频的创建媒体时间"""
+    def read_pil_exif_date(self, image_path):
+        """使用PIL读取EXIF日期，文件无法打开时抛出异常"""
+        with Image.open(image_path) as image:
+            exif = image._getexif() if hasattr(image, '_getexif') else None
+        if not exif:
+            print(f"文件 {image_path} 没有EXIF数据")
+            return None
+        
+        # 按date_tags的优先级查找日期标签
+        for tag in self.date_tags:
+            date_info = exif.get(DATE_TAG_IDS[tag])
+            if date_info:
+                print(f"从EXIF数据中找到日期: {date_info}")
+                return date_info
+        return None
+
+    def probe_video(self, video_path):
+        """对视频执行一次ffprobe并返回ProbeResult，同一次扫描中对同一文件只调用一次
+
+        ffprobe超时或崩溃时抛出ProbeError（不记录，下次调用会重新尝试）。
+        """
+        if video_path in self.probe_results:
+            return self.probe_results[video_path]
         if not self.has_ffmpeg or not self.ffprobe_path:
             return None
-            
+        
         try:
-            # 使用ffprobe获取视频元数据
-            cmd = [
-                self.ffprobe_path,
-                '-v', 'quiet',
-                '-print_format', 'json',
-                '-show_format',
-                '-show_entries', 'format=tags',
-                video_path
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            if result.returncode != 0:
-                print(f"ffprobe处理视频失败: {result.stderr}")
-                return None
-                
-            # 解析ffprobe输出
-            metadata = json.loads(result.stdout)
-            
-            # 尝试获取创建媒体时间
-            tags = metadata.get('format', {}).get('tags', {})
-            creation_time = None
-            
-            # 尝试不同的标签名
-            for tag in ['creation_time', 'date', 'date_created', 'creation_date']:
-                if tag in tags:
-                    creation_time = tags[tag]
-                    break
-            
-            if creation_time:
-                try:
-                    # 尝试解析不同格式的日期
-                    for fmt in [
-                        '%Y-%m-%d %H:%M:%S',  # 2024-03-14 15:30:00
-                        '%Y-%m-%dT%H:%M:%S.%fZ',  # 2024-03-14T15:30:00.000Z
-                        '%Y-%m-%dT%H:%M:%S',  # 2024-03-14T15:30:00
-                        '%Y:%m:%d %H:%M:%S',  # 2024:03:14 15:30:00
-                        '%Y/%m/%d %H:%M:%S',  # 2024/03/14 15:30:00
-                        '%Y-%m-%d'  # 2024-03-14
-                    ]:
-                        try:
-                            date_obj = datetime.strptime(creation_time, fmt)
-                            return date_obj.strftime('%Y-%m-%d %H:%M:%S')
-                        except ValueError:
-                            continue
-                except Exception as e:
-                    print(f"解析视频日期失败: {str(e)}")
-                    pass
-                    
-            return None
+            probe = run_probe(self.ffprobe_path, video_path, self.probe_timeout)
+        except ProbeError:
+            raise
         except Exception as e:
+            print(f"处理视频 {video_path} 时出错: {str(e)}")
+            probe = None
+        self.probe_results[video_path] = probe
+        return probe
+
+    def get_video_date(self, video_path):
+        """获取视频的创建媒体时间"""
+        try:
+            probe = self.probe_video(video_path)
+        except ProbeError as e:
             print(f"处理视频 {video_path} 时出错: {str(e)}")
             return None
+        return probe.creation_time if probe else None
 
     def get_video_bitrate(self, video_path):
         """获取视频的比特率（kbps）"""
-        if not self.has_ffmpeg or not self.ffprobe_path:
-            return None
-            
         try:
-            # 使用ffprobe获取视频比特率
-            cmd = [
-                self.ffprobe_path,
-                '-v', 'quiet',
-                '-print_format', 'json',
-                '-show_format',
-                video_path
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            if result.returncode != 0:
-                print(f"ffprobe处理视频失败: {result.stderr}")
-                return None
-                
-            # 解析ffprobe输出
-            metadata = json.loads(result.stdout)
-            
-            # 获取比特率（bps）并转换为kbps
-            bitrate = metadata.get('format', {}).get('bit_rate')
-            if bitrate:
-                return int(int(bitrate) / 1000)  # 转换为kbps
-                
-            return None
-        except Exception as e:
+            probe = self.probe_video(video_path)
+        except ProbeError as e:
             print(f"获取视频比特率时出错: {str(e)}")
             return None
+        return probe.bitrate if probe else None
+
+    def probe_check_result(self, probe, video_path):
+        """把ProbeResult转换为检查结果"""
+        if probe is None:
+            return self.with_name_fallback(video_path, (False, "未找到创建媒体时间", "创建媒体时间", None))
+        if probe.creation_time:
+            return (True, probe.creation_time, "创建媒体时间", probe.bitrate)
+        return self.with_name_fallback(video_path, (False, "未找到创建媒体时间", "创建媒体时间", probe.bitrate))
+
+    def with_name_fallback(self, file_path, check_result):
+        """文件内没有日期时，改用文件名或所在文件夹名中的日期（保留比特率）"""
+        if check_result[0]:
+            return check_result
+        named = self.name_dates.fallback_date(file_path)
+        if named is None:
+            return check_result
+        date_type = "文件夹日期" if named.source == 'folder' else "文件名日期"
+        return (True, format_date(named.date), date_type, check_result[3])
+
+    def check_livp_with_source(self, livp_path):
+        """检查LIVP实况照片：先读内含图片的EXIF，再读MOV的创建时间
+
+        zip包无法读取时检查结果为None（归入livp_files类别）。
+        """
+        start = time.perf_counter()
+        try:
+            date, member = read_livp_date(livp_path)
+        except (zipfile.BadZipFile, OSError) as e:
+            print(f"读取LIVP文件 {livp_path} 时出错: {str(e)}")
+            self.record_livp(livp_path, start, OUTCOME_SKIP)
+            return None, None
+        self.record_livp(livp_path, start, OUTCOME_HIT if date else OUTCOME_MISS)
+        extractor = 'livp_' + member if member else 'livp'
+        if date:
+            normalized = normalize_date(date, extractor)
+            if normalized:
+                return (True, normalized, "拍摄日期", None), extractor
+        return self.with_name_fallback(livp_path, (False, "未找到拍摄日期信息", "拍摄日期", None)), extractor
+
+    def record_livp(self, livp_path, start, outcome):
+        """LIVP不经过提取链，单独记录统计"""
+        self.extractor_chain.stats.record('livp', '.livp', os.path.dirname(livp_path),
+                                          time.perf_counter() - start, outcome)
 
     def check_media(self, file_path):
         """检查媒体文件的日期信息"""
+        return self.check_media_with_source(file_path)[0]
+
+    def check_media_with_source(self, file_path, defer_probe=False, name_checked=False):
+        """检查媒体文件的日期信息，同时返回使用的提取方式
+
+        返回 (检查结果, 提取方式)；结果依赖运行环境（如未安装ffmpeg）时提取方式为None，不写入缓存。
+        defer_probe为True时，需要ffprobe的视频不在这里处理，而是返回 (PROBE_PENDING, 'ffprobe')，
+        由扫描交给ffprobe线程池。name_checked为True表示调用方已经检查过可信的文件名日期。
+        """
         ext = os.path.splitext(file_path)[1].lower()
         
+        if ext == '.livp':
+            return self.check_livp_with_source(file_path)
+        
+        exclude = ('filename',) if name_checked else ()
         if ext in self.supported_image_formats:
-            date = self.get_exif_date(file_path)
+            try:
+                date, _, extractor, _ = self.extractor_chain.run(file_path, exclude=exclude)
+            except Exception as e:
+                print(f"处理图片 {file_path} 时出错: {str(e)}")
+                date, extractor = None, None
             if date:
-                try:
-                    # 尝试解析日期字符串
-                    if isinstance(date, str):
-                        # 如果已经是字符串格式，直接返回
-                        return True, date, "拍摄日期", None
-                    else:
-                        # 如果是其他格式，尝试解析
-                        date_obj = datetime.strptime(date, '%Y:%m:%d %H:%M:%S')
-                        return True, date_obj.strftime('%Y-%m-%d %H:%M:%S'), "拍摄日期", None
-                except ValueError as e:
-                    print(f"解析日期字符串时出错: {str(e)}")
-                    return False, "日期格式无效", "拍摄日期", None
-            return False, "未找到拍摄日期信息", "拍摄日期", None
+                # 统一转换为 YYYY-MM-DD HH:MM:SS，无法识别的日期（如 2024:05:18 ::）视为无效
+                normalized = normalize_date(str(date), extractor)
+                if normalized:
+                    date_type = "文件名日期" if extractor == 'filename' else "拍摄日期"
+                    return (True, normalized, date_type, None), extractor
+                print(f"解析日期字符串时出错: {date}")
+                return self.with_name_fallback(file_path, (False, "日期格式无效", "拍摄日期", None)), extractor
+            return self.with_name_fallback(file_path, (False, "未找到拍摄日期信息", "拍摄日期", None)), extractor
             
         elif ext in self.supported_video_formats:
-            if not self.has_ffmpeg:
-                return False, "未安装ffmpeg，无法处理视频", "创建媒体时间", None
-            date = self.get_video_date(file_path)
-            bitrate = self.get_video_bitrate(file_path)
+            try:
+                date, bitrate, extractor, reasons = self.extractor_chain.run(
+                    file_path, defer_probe, pending=PROBE_PENDING, exclude=exclude)
+            except ProbeError as e:
+                return (False, str(e), "创建媒体时间", None), None
+            if date == PROBE_PENDING:
+                return PROBE_PENDING, 'ffprobe'
             if date:
-                return True, date, "创建媒体时间", bitrate
-            return False, "未找到创建媒体时间", "创建媒体时间", bitrate
+                return (True, date, "创建媒体时间", bitrate), extractor
+            # 全部提取方式都无法处理时（如未安装ffmpeg）记录最后一个原因，不写入缓存
+            message = reasons[-1] if extractor is None and reasons else "未找到创建媒体时间"
+            return self.with_name_fallback(file_path, (False, message, "创建媒体时间", bitrate)), extractor
             
-        return False, "不支持的文件格式", "未知", None
+        return (False, "不支持的文件格式", "未知", None), None
 
     def move_to_no_info(self, file_path):
         """移动文件到NoInformation或NoVideoInformation文件夹"""
+        ext = os.path.splitext(file_path)[1].lower()
+        target_dir = NO_VIDEO_INFO_DIR if ext in self.supported_video_formats else NO_INFO_DIR
         try:
-            ext = os.path.splitext(file_path)[1].lower()
-            target_dir = NO_VIDEO_INFO_DIR if ext in self.supported_video_formats else NO_INFO_DIR
-            
-            file_name = os.path.basename(file_path)
-            new_path = os.path.join(target_dir, file_name)
-            
-            # 如果文件已存在，添加序号
-            counter = 1
-            name, ext = os.path.splitext(file_name)
-            while os.path.exists(new_path):
-                new_path = os.path.join(target_dir, f"{name}_{counter}{ext}")
-                counter += 1
-                
-            shutil.move(file_path, new_path)
-            return new_path
+            return self.move_into(file_path, target_dir, 'without_date')
         except Exception as e:
             print(f"移动文件 {file_path} 时出错: {str(e)}")
             return None
@@ -423,69 +593,559 @@ class MediaDateChecker:
     def move_to_big_video(self, video_path):
         """移动大视频到BigVideo文件夹"""
         try:
-            file_name = os.path.basename(video_path)
-            new_path = os.path.join(BIG_VIDEO_DIR, file_name)
-            
-            # 如果文件已存在，添加序号
-            counter = 1
-            name, ext = os.path.splitext(file_name)
-            while os.path.exists(new_path):
-                new_path = os.path.join(BIG_VIDEO_DIR, f"{name}_{counter}{ext}")
-                counter += 1
-                
-            shutil.move(video_path, new_path)
-            return new_path
+            return self.move_into(video_path, BIG_VIDEO_DIR, 'big_videos')
         except Exception as e:
             print(f"移动视频 {video_path} 时出错: {str(e)}")
             return None
 
-    def scan_directory(self, move_no_info=False, move_big_video=False):
-        """扫描目录中的所有媒体文件"""
-        results = {
-            'with_date': [],
-            'without_date': [],
-            'big_videos': [],  # 新增：大视频列表
-            'livp_files': []   # 新增：LIVP文件列表
-        }
-        
-        for root, _, files in os.walk(self.directory):
-            # 跳过NoInformation、NoVideoInformation和BigVideo文件夹
-            if NO_INFO_DIR in root or NO_VIDEO_INFO_DIR in root or BIG_VIDEO_DIR in root:
+    def move_into(self, file_path, target_dir, category=None):
+        """把文件移动到target_dir，同名文件已存在时添加序号，返回新路径
+
+        名称由self.name_index分配（每个目标文件夹只列举一次），移动失败时归还名称并抛出异常。
+        跨设备时由copy_engine.move_file复制并校验后才删除源文件。
+        生成移动计划时只把这次移动加入self.move_plan，文件留在原处，返回原路径。
+        """
+        if self.move_plan is not None:
+            self.move_plan.add(file_path, target_dir, category)
+            return file_path
+        new_path = self.name_index.reserve(target_dir, os.path.basename(file_path))
+        try:
+            move_file(file_path, new_path)
+        except Exception:
+            self.name_index.release(new_path)
+            raise
+        return new_path
+
+    def iter_media_files(self, dir_index=None, directory=None):
+        """遍历目录（默认为检查器的目录），逐个产出需要检查的媒体文件和LIVP文件条目"""
+        extensions = self.supported_image_formats + self.supported_video_formats + ['.livp']
+        # NoInformation、NoVideoInformation、BigVideo和Duplicates文件夹在进入之前就被跳过
+        exclude_dirs = (NO_INFO_DIR, NO_VIDEO_INFO_DIR, BIG_VIDEO_DIR, DUPLICATE_DIR)
+        return walk_media_files(directory or self.directory, extensions, exclude_dirs, dir_index)
+
+    def open_cache(self):
+        """打开元数据缓存，未配置或打开失败时返回None"""
+        if not self.cache_path:
+            return None
+        try:
+            return MetadataCache(self.cache_path)
+        except Exception as e:
+            print(f"打开元数据缓存失败，本次不使用缓存: {str(e)}")
+            return None
+
+    def lookup_known(self, entry, cache, need_bitrate=False):
+        """检查前先判断文件结果是否已知，按代价从低到高：
+        文件名符合可信命名规则的直接采用文件名日期；缓存命中的文件直接使用缓存结果。
+        视频需要比特率（移动大视频）时不能只看文件名。
+
+        已知时返回 (文件条目, 检查结果, 提取方式, 是否跳过写入缓存)，否则返回None。
+        """
+        if need_bitrate and entry.ext in self.supported_video_formats:
+            named = None
+        else:
+            start = time.perf_counter()
+            named = self.name_dates.trusted_date(entry.path)
+            self.extractor_chain.stats.record('filename', entry.ext, os.path.dirname(entry.path),
+                                              time.perf_counter() - start, OUTCOME_HIT if named else OUTCOME_SKIP)
+        if named:
+            # 文件名日期不需要打开文件，也不写入缓存（否则之后需要比特率时会拿到空值）
+            return entry, (True, format_date(named.date), "文件名日期", None), 'filename', True
+        if cache:
+            hit = cache.get(entry)
+            if hit is not None:
+                return entry, hit[0], hit[1], True
+        return None
+
+    def check_media_serial(self, media_files, lookup):
+        """在当前进程中逐个检查媒体文件，产出 (文件条目, 检查结果, 提取方式, 是否跳过写入缓存)"""
+        for entry in media_files:
+            known = lookup(entry)
+            if known is not None:
+                yield known
                 continue
-                
-            for file in files:
-                file_path = os.path.join(root, file)
-                ext = os.path.splitext(file)[1].lower()
-                
-                # 统计LIVP文件
-                if ext == '.livp':
-                    results['livp_files'].append(file_path)
+            check_result, extractor = self.check_media_with_source(entry.path, defer_probe=True, name_checked=True)
+            yield entry, check_result, extractor, False
+
+    def resolve_probes(self, checked, probe_pool):
+        """把等待ffprobe的视频交给线程池，其余结果原样产出；视频的结果在ffprobe完成后按完成顺序产出
+
+        ffprobe超时或崩溃的视频，检查结果为对应的ProbeError。
+        """
+        for item in checked:
+            entry, check_result = item[0], item[1]
+            if check_result == PROBE_PENDING:
+                probe_pool.submit(entry, entry.path)
+            else:
+                yield item
+            # 顺带取走已经完成的视频；排队过多时等待至少一个完成，避免无限制地积压
+            for entry, probe, error, elapsed in probe_pool.completed(block=probe_pool.is_full()):
+                yield self.probe_outcome(entry, probe, error, elapsed)
+        for entry, probe, error, elapsed in probe_pool.drain():
+            yield self.probe_outcome(entry, probe, error, elapsed)
+
+    def probe_outcome(self, entry, probe, error, elapsed=0.0):
+        """把线程池返回的ffprobe结果转换为 (文件条目, 检查结果, 提取方式, 是否跳过写入缓存)"""
+        if probe is not None and probe.creation_time:
+            outcome = OUTCOME_HIT
+        else:
+            outcome = OUTCOME_SKIP if error is not None else OUTCOME_MISS
+        self.extractor_chain.stats.record('ffprobe', entry.ext, os.path.dirname(entry.path), elapsed, outcome)
+        if error is not None:
+            print(f"处理视频 {entry.path} 时出错: {str(error)}")
+            return entry, error, None, False
+        self.probe_results[entry.path] = probe
+        return entry, self.probe_check_result(probe, entry.path), 'ffprobe', False
+
+    def check_media_parallel(self, media_files, lookup, workers):
+        """使用进程池并行检查媒体文件，按完成顺序产出 (文件条目, 检查结果, 提取方式, 是否跳过写入缓存)"""
+        max_pending = workers * 4  # 限制在途批次数量，避免一次性提交整个目录树
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_scan_worker,
+                                       initargs=(self.directory,))
+        # 扫描被取消时（生成器提前关闭）丢弃尚未开始的批次，只等待正在运行的批次
+        try:
+            pending = set()
+            batch = []
+            for entry in media_files:
+                known = lookup(entry)
+                if known is not None:
+                    yield known
                     continue
-                
-                if ext in self.supported_image_formats or ext in self.supported_video_formats:
-                    has_date, date_info, date_type, bitrate = self.check_media(file_path)
-                    
-                    # 检查视频比特率
-                    if ext in self.supported_video_formats and move_big_video and bitrate and bitrate > self.bitrate_threshold:
-                        new_path = self.move_to_big_video(file_path)
-                        if new_path:
-                            results['big_videos'].append((new_path, f"{bitrate} kbps"))
-                        continue
-                    
-                    if has_date:
-                        results['with_date'].append((file_path, date_info, date_type, bitrate))
-                    else:
-                        if move_no_info:
-                            new_path = self.move_to_no_info(file_path)
-                            if new_path:
-                                results['without_date'].append((new_path, date_info, date_type, bitrate))
-                        else:
-                            results['without_date'].append((file_path, date_info, date_type, bitrate))
+                batch.append(entry)
+                if len(batch) < SCAN_BATCH_SIZE:
+                    continue
+                pending.add(executor.submit(_check_media_batch, batch))
+                batch = []
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield from self.batch_outcome(future.result())
+            if batch:
+                pending.add(executor.submit(_check_media_batch, batch))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from self.batch_outcome(future.result())
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def batch_outcome(self, batch_result):
+        """合并工作进程的提取方式统计，并产出这一批的 (文件条目, 检查结果, 提取方式, 是否跳过写入缓存)"""
+        checked, stats_delta = batch_result
+        self.extractor_chain.stats.merge(stats_delta)
+        for entry, check_result, extractor in checked:
+            yield entry, check_result, extractor, False
+
+    def classify_result(self, file_path, ext, check_result, move_no_info, move_big_video):
+        """把单个文件的检查结果归类为ScanResult（文件移动只在主进程中串行执行）
+
+        移动失败的文件不产生结果，返回None。
+        """
+        has_date, date_info, date_type, bitrate = check_result
+        
+        # 检查视频比特率
+        if ext in self.supported_video_formats and move_big_video and bitrate and bitrate > self.bitrate_threshold:
+            new_path = self.move_to_big_video(file_path)
+            if new_path:
+                return ScanResult('big_videos', new_path, None, date_type, bitrate)
+            return None
+        
+        if has_date:
+            return ScanResult('with_date', file_path, date_info, date_type, bitrate)
+        if move_no_info:
+            new_path = self.move_to_no_info(file_path)
+            if new_path:
+                return ScanResult('without_date', new_path, date_info, date_type, bitrate)
+            return None
+        return ScanResult('without_date', file_path, date_info, date_type, bitrate)
+
+    def checkpoint_for(self, move_no_info=False, move_big_video=False):
+        """返回本目录和这组移动选项对应的扫描检查点，未配置检查点文件夹时返回None"""
+        if not self.checkpoint_dir:
+            return None
+        options = {'move_no_info': bool(move_no_info), 'move_big_video': bool(move_big_video)}
+        return ScanCheckpoint(checkpoint_path_for(self.checkpoint_dir, self.directory), self.directory, options)
+
+    def has_checkpoint(self, move_no_info=False, move_big_video=False):
+        """是否有可以继续的未完成扫描（移动选项需与上次一致）"""
+        checkpoint = self.checkpoint_for(move_no_info, move_big_video)
+        return checkpoint is not None and checkpoint.exists()
+
+    def open_checkpoint(self, checkpoint, resume):
+        """打开检查点开始记录（resume为True且检查点可以继续时读取上次的结果），失败时返回None"""
+        try:
+            checkpoint.open(resume and checkpoint.exists())
+            return checkpoint
+        except (OSError, ValueError) as e:
+            print(f"打开扫描检查点失败，本次不记录检查点: {str(e)}")
+            return None
+
+    def replay_checkpoint(self, checkpoint, on_result=None):
+        """产出检查点中上次扫描已经归类的结果"""
+        for fields in checkpoint.results:
+            result = ScanResult(*fields)
+            self.resumed_results += 1
+            if on_result:
+                on_result(result)
+            yield result
+        checkpoint.results = []
+
+    def settle_result(self, entry, check_result, extractor, skip_cache, cache, move_no_info, move_big_video):
+        """把检查结果归类为ScanResult，执行移动并更新缓存（同一时间只在一个线程中调用）
+
+        移动失败的文件返回None。
+        """
+        if check_result is None:
+            return ScanResult('livp_files', entry.path, None, None, None)
+        if isinstance(check_result, ProbeError):
+            # 超时或崩溃不代表没有日期，不移动文件也不写入缓存，下次扫描重新尝试
+            return ScanResult('probe_failed', entry.path, str(check_result), "创建媒体时间", None)
+        result = self.classify_result(entry.path, entry.ext, check_result, move_no_info, move_big_video)
+        if result is not None and cache:
+            # 文件被移动后原路径的缓存失效
+            if result.path != entry.path:
+                cache.discard(entry.path)
+            elif extractor and not skip_cache:
+                cache.put(entry, check_result, extractor)
+        return result
+
+    def iter_scan(self, move_no_info=False, move_big_video=False, workers=None, on_result=None,
+                  cancel_event=None, resume=False, move_plan=None):
+        """流式扫描目录，每个文件归类完成后立即产出一个ScanResult
+
+        workers为None时使用创建检查器时配置的进程数；大于1时元数据提取在进程池中并行执行，
+        移动文件仍由当前进程逐个完成，因此不会有两个进程争用同一个目标文件名。
+        启用缓存时，大小、修改时间和inode均未变化的文件直接使用缓存结果，不再打开文件；
+        开启skip_unchanged_dirs时，修改时间未变化的目录复用上次记录的文件名，不再列举。
+        需要ffprobe的视频交给有上限的ffprobe线程池，每个文件有独立的超时，
+        慢视频不会阻塞后面的图片；超时或崩溃的视频归入probe_failed类别。
+        on_result回调（如果提供）会在产出每个结果之前被调用。
+        
+        扫描过程中每个文件的结果（包括移动后的路径）和处理完的目录都记录在检查点中；
+        resume为True且有未完成的扫描时，先产出上次的结果，再从中断处继续，已归类的文件不再检查或移动。
+        cancel_event（threading.Event）被设置后在两个文件之间停止扫描，self.cancelled为True，检查点保留。
+        
+        提供move_plan（MovePlan）时不移动文件，需要移动的文件加入计划、结果中保留原路径，
+        之后用apply_move_plan批量执行；生成计划不修改文件，因此不记录检查点。
+        """
+        workers = resolve_worker_count(self.workers if workers is None else workers)
+        cache = self.open_cache()
+        probe_pool = ProbePool(self.ffprobe_path, self.probe_workers, self.probe_timeout) if self.ffprobe_path else None
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.dir_hits = 0
+        self.dir_misses = 0
+        self.probe_results = {}
+        self.stage_stats = []
+        self.extractor_chain.stats = ExtractorStats()
+        self.cancelled = False
+        self.resumed_results = 0
+        self.move_plan = move_plan
+        checkpoint = self.checkpoint_for(move_no_info, move_big_video) if move_plan is None else None
+        finished = False
         
+        try:
+            media_files = self.iter_media_files(cache if self.skip_unchanged_dirs else None)
+            if checkpoint:
+                checkpoint = self.open_checkpoint(checkpoint, resume)
+            if checkpoint:
+                yield from self.replay_checkpoint(checkpoint, on_result)
+                media_files = checkpoint.track(media_files)
+            
+            lookup = partial(self.lookup_known, cache=cache, need_bitrate=move_big_video)
+            if workers > 1:
+                checked = self.check_media_parallel(media_files, lookup, workers)
+            else:
+                checked = self.check_media_serial(media_files, lookup)
+            if probe_pool:
+                checked = self.resolve_probes(checked, probe_pool)
+            
+            for entry, check_result, extractor, skip_cache in checked:
+                if cancel_event is not None and cancel_event.is_set():
+                    # 当前文件的结果不产出也不记录，继续扫描时会重新检查
+                    self.cancelled = True
+                    break
+                result = self.settle_result(entry, check_result, extractor, skip_cache, cache,
+                                            move_no_info, move_big_video)
+                if checkpoint:
+                    checkpoint.record(entry.path, result)
+                if result is None:
+                    continue
+                if on_result:
+                    on_result(result)
+                yield result
+            finished = not self.cancelled
+        finally:
+            self.move_plan = None
+            if probe_pool:
+                probe_pool.close()
+            if checkpoint:
+                checkpoint.close(finished)
+            if cache:
+                self.cache_hits = cache.hits
+                self.cache_misses = cache.misses
+                self.dir_hits = cache.dir_hits
+                self.dir_misses = cache.dir_misses
+                cache.close()
+
+    def prefetch_header(self, entry):
+        """读取文件开头（视频还有结尾）的若干字节，使之后的解析从系统缓存读取
+
+        分阶段扫描中由预读阶段的多个线程执行，磁盘或网络的等待与解析阶段的CPU计算重叠。
+        """
+        try:
+            with open(entry.path, 'rb') as f:
+                f.read(HEADER_PREFETCH_BYTES)
+                if entry.ext in self.supported_video_formats and entry.size > 2 * HEADER_PREFETCH_BYTES:
+                    f.seek(-HEADER_PREFETCH_BYTES, os.SEEK_END)
+                    f.read(HEADER_PREFETCH_BYTES)
+        except OSError as e:
+            # 解析阶段会再次打开文件并报告错误
+            print(f"预读文件 {entry.path} 时出错: {str(e)}")
+
+    def iter_scan_staged(self, move_no_info=False, move_big_video=False, on_result=None, cancel_event=None,
+                         resume=False, move_plan=None, read_workers=STAGE_READ_WORKERS,
+                         parse_workers=STAGE_PARSE_WORKERS):
+        """分阶段流式扫描：walk → classify → read → parse → probe → move/report
+
+        每个阶段有自己的线程数和有界队列（见scan_pipeline.Pipeline），队列满时上游等待：
+        walk（1个线程）遍历目录；classify（1个线程）用文件名和缓存判断结果是否已知；
+        read（read_workers个线程）预读文件头；parse（parse_workers个线程，见STAGE_PARSE_WORKERS）提取日期；
+        probe（probe_workers个线程）运行ffprobe；move/report在当前线程中逐个归类、移动文件并写缓存。
+        适合网络存储等读取延迟高的目录：预读和ffprobe的等待互相重叠。
+        结束后各阶段的队列长度、吞吐量和忙碌比例记录在self.stage_stats中并写入报告。
+        检查点、resume、cancel_event和move_plan与iter_scan相同（结果按完成顺序产出，检查点按目录计数，
+        不依赖顺序）；取消时已在流水线中但尚未归类的文件不记录，继续扫描时重新检查。
+        """
+        cache = self.open_cache()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.dir_hits = 0
+        self.dir_misses = 0
+        self.probe_results = {}
+        self.extractor_chain.stats = ExtractorStats()
+        self.cancelled = False
+        self.resumed_results = 0
+        self.stage_stats = []
+        self.move_plan = move_plan
+        checkpoint = self.checkpoint_for(move_no_info, move_big_video) if move_plan is None else None
+        if checkpoint:
+            checkpoint = self.open_checkpoint(checkpoint, resume)
+        finished = False
+        lookup = partial(self.lookup_known, cache=cache, need_bitrate=move_big_video)
+        
+        def classify(entry):
+            known = lookup(entry)
+            return ('report', known) if known is not None else ('read', entry)
+        
+        def read(entry):
+            self.prefetch_header(entry)
+            return 'parse', entry
+        
+        def parse(entry):
+            try:
+                check_result, extractor = self.check_media_with_source(entry.path, defer_probe=True, name_checked=True)
+            except Exception as e:
+                check_result, extractor = (False, f"检查文件时出错: {str(e)}", "未知", None), None
+            if check_result == PROBE_PENDING:
+                return 'probe', entry
+            return 'report', (entry, check_result, extractor, False)
+        
+        def probe(entry):
+            start = time.perf_counter()
+            try:
+                probe_result, error = run_probe(self.ffprobe_path, entry.path, self.probe_timeout), None
+            except ProbeError as e:
+                probe_result, error = None, e
+            except Exception as e:
+                probe_result, error = None, ProbeCrash(f"调用ffprobe失败: {str(e)}")
+            return 'report', self.probe_outcome(entry, probe_result, error, time.perf_counter() - start)
+        
+        media_files = self.iter_media_files(cache if self.skip_unchanged_dirs else None)
+        if checkpoint:
+            media_files = checkpoint.track(media_files)
+        pipeline = Pipeline(cancel_event)
+        pipeline.add_source('walk', media_files, 'classify')
+        pipeline.add_stage('classify', 1, classify)
+        pipeline.add_stage('read', read_workers, read)
+        pipeline.add_stage('parse', max(1, parse_workers), parse)
+        pipeline.add_stage('probe', self.probe_workers, probe)
+        pipeline.add_sink('report')
+        
+        try:
+            if checkpoint:
+                yield from self.replay_checkpoint(checkpoint, on_result)
+            for entry, check_result, extractor, skip_cache in pipeline.run():
+                result = self.settle_result(entry, check_result, extractor, skip_cache, cache,
+                                            move_no_info, move_big_video)
+                if checkpoint:
+                    checkpoint.record(entry.path, result)
+                if result is None:
+                    continue
+                if on_result:
+                    on_result(result)
+                yield result
+            finished = not pipeline.cancelled
+        finally:
+            self.move_plan = None
+            self.cancelled = pipeline.cancelled
+            self.stage_stats = pipeline.stats()
+            if checkpoint:
+                checkpoint.close(finished)
+            if cache:
+                self.cache_hits = cache.hits
+                self.cache_misses = cache.misses
+                self.dir_hits = cache.dir_hits
+                self.dir_misses = cache.dir_misses
+                cache.close()
+
+    def scan_directory(self, move_no_info=False, move_big_video=False, workers=None, on_result=None,
+                       cancel_event=None, resume=False, move_plan=None):
+        """扫描目录中的所有媒体文件，返回按类别汇总的结果字典（取消时只包含已完成的部分）"""
+        results = new_scan_results()
+        for result in self.iter_scan(move_no_info, move_big_video, workers, on_result, cancel_event, resume,
+                                     move_plan):
+            add_scan_result(results, result)
         return results
 
-    def print_report(self, results, log_file):
-        """打印检查报告"""
+    def find_duplicates(self, extra_dirs=(), workers=HASH_WORKERS):
+        """在检查目录（以及extra_dirs，如其他备份文件夹）的媒体文件中查找内容相同的文件，返回DuplicateReport
+
+        文件大小取自遍历时的目录项，启用缓存时未变化的目录不再列举；
+        只有大小相同的文件才读取头尾，头尾也相同的才读取整个文件（见duplicate_finder.find_duplicates）。
+        """
+        cache = self.open_cache()
+        try:
+            entries = {}
+            for directory in (self.directory,) + tuple(extra_dirs):
+                for entry in self.iter_media_files(cache if self.skip_unchanged_dirs else None, directory):
+                    # 目录互相包含时同一文件只算一次
+                    entries.setdefault(os.path.normcase(os.path.abspath(entry.path)), entry)
+            return find_duplicates(entries.values(), workers)
+        finally:
+            if cache:
+                cache.close()
+
+    def plan_duplicate_moves(self, report, policy=KEEP_NEWEST, preferred_roots=()):
+        """把每组重复文件中多余的副本移到Duplicates文件夹的移动计划（保留的一份由policy决定）"""
+        plan = MovePlan()
+        for path, _ in redundant_files(report, policy, preferred_roots):
+            plan.add(path, DUPLICATE_DIR, 'duplicates')
+        return plan
+
+    def print_duplicate_report(self, report, log_file):
+        """打印重复文件报告"""
+        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        lines = [f"\n=== 重复文件报告 ({current_time}) ===", f"检查目录: {self.directory}"]
+        lines.extend(format_duplicate_report(report))
+        lines.append("\n" + "="*50 + "\n")
+        write_to_log(log_file, '\n'.join(lines))
+        return '\n'.join(lines)
+
+    def estimate_scan(self, sample_size=DEFAULT_SAMPLE_SIZE, seed=None):
+        """快速估算：遍历一次目录统计文件数，只对按目录分层抽取的样本提取日期
+
+        格式分布和LIVP数量来自完整遍历，是准确值；无日期文件数、超过比特率阈值的视频数
+        和完整扫描耗时由样本估计，并给出95%置信区间。遍历时只保留文件数和有限的随机样本（见build_strata）；
+        开启skip_unchanged_dirs时和完整扫描一样使用缓存中的目录记录，未变化的目录不再列举。
+        不移动文件，也不读取缓存中的检查结果，因此耗时对应的是没有缓存的首次完整扫描（单进程）。
+        """
+        start = time.perf_counter()
+        ext_counts = {}
+
+        def counted(entries):
+            for entry in entries:
+                ext_counts[entry.ext] = ext_counts.get(entry.ext, 0) + 1
+                yield entry
+
+        cache = self.open_cache() if self.skip_unchanged_dirs else None
+        try:
+            strata = build_strata(counted(self.iter_media_files(cache)), sample_size, random.Random(seed))
+        finally:
+            if cache:
+                cache.close()
+        walk_seconds = time.perf_counter() - start
+        undated_values = []
+        big_video_values = []
+        costs_by_ext = {}
+        for stratum in strata:
+            undated = []
+            big_videos = []
+            for entry in stratum.sample:
+                file_start = time.perf_counter()
+                try:
+                    check_result, _ = self.check_media_with_source(entry.path)
+                except Exception as e:
+                    print(f"检查文件 {entry.path} 时出错: {str(e)}")
+                    check_result = (False, str(e), "未知", None)
+                costs_by_ext.setdefault(entry.ext, []).append(time.perf_counter() - file_start)
+                # 无法读取的LIVP文件（检查结果为None）单独归类，不算作无日期
+                has_date = check_result is None or check_result[0]
+                bitrate = check_result[3] if check_result else None
+                undated.append(0 if has_date else 1)
+                big_videos.append(1 if entry.ext in self.supported_video_formats and bitrate
+                                  and bitrate > self.bitrate_threshold else 0)
+            undated_values.append((stratum.population, undated))
+            big_video_values.append((stratum.population, big_videos))
+        
+        total = sum(ext_counts.values())
+        sampled = sum(len(stratum.sample) for stratum in strata)
+        video_count = sum(count for ext, count in ext_counts.items() if ext in self.supported_video_formats)
+        return ScanEstimate(
+            total_files=total,
+            sampled=sampled,
+            strata=len(strata),
+            ext_counts=ext_counts,
+            ext_costs={ext: sum(costs) / len(costs) for ext, costs in costs_by_ext.items()},
+            livp_files=ext_counts.get('.livp', 0),
+            undated=estimate_total(undated_values, sum(sum(v) for _, v in undated_values), total),
+            big_videos=estimate_total(big_video_values, sum(sum(v) for _, v in big_video_values), video_count),
+            scan_seconds=estimate_cost(ext_counts, costs_by_ext),
+            walk_seconds=walk_seconds,
+            elapsed_seconds=time.perf_counter() - start,
+        )
+
+    def print_estimate_report(self, estimate, log_file, workers=None):
+        """打印快速估算报告"""
+        workers = resolve_worker_count(self.workers if workers is None else workers)
+        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        
+        def share(count):
+            return f"{count / estimate.total_files:.1%}" if estimate.total_files else "0%"
+        
+        def interval(value):
+            return f"约 {value.value:.0f} 个 (95%置信区间 {value.low:.0f} ~ {value.high:.0f})"
+        
+        def duration(seconds):
+            return f"{seconds / 60:.1f} 分钟" if seconds >= 120 else f"{seconds:.1f} 秒"
+        
+        report = []
+        report.append(f"\n=== 媒体文件快速估算报告 ({current_time}) ===")
+        report.append(f"检查目录: {self.directory}")
+        report.append(f"文件总数: {estimate.total_files} 个, 抽样 {estimate.sampled} 个 (分为 {estimate.strata} 层)")
+        report.append(f"估算耗时: {estimate.elapsed_seconds:.1f} 秒 (其中遍历目录 {estimate.walk_seconds:.1f} 秒)")
+        
+        report.append("\n格式分布 (完整统计):")
+        for ext, count in sorted(estimate.ext_counts.items(), key=lambda item: -item[1]):
+            cost = estimate.ext_costs.get(ext)
+            cost_text = f", 平均每个 {cost * 1000:.1f} 毫秒" if cost is not None else ""
+            report.append(f"{ext}: {count} 个 ({share(count)}){cost_text}")
+        report.append(f"LIVP文件: {estimate.livp_files} 个")
+        
+        report.append("\n样本估计:")
+        report.append(f"无日期信息的文件: {interval(estimate.undated)}")
+        report.append(f"比特率大于{self.bitrate_threshold}kbps的视频: {interval(estimate.big_videos)}")
+        scan = estimate.scan_seconds
+        report.append(f"完整扫描预计耗时 (单进程, 无缓存): {duration(scan.value)} "
+                      f"(95%置信区间 {duration(scan.low)} ~ {duration(scan.high)})")
+        if workers > 1:
+            report.append(f"使用 {workers} 个进程时约 {duration(scan.value / workers)} (实际受磁盘速度限制)")
+        
+        report.append("\n" + "="*50 + "\n")
+        write_to_log(log_file, '\n'.join(report))
+        return '\n'.join(report)
+
+    def print_report(self, results, log_file, move_plan=None, plan_path=None):
+        """打印检查报告（生成了移动计划时附上计划中的每个移动）"""
         try:
             current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             
@@ -493,10 +1153,28 @@ class MediaDateChecker:
             report = []
             report.append(f"\n=== 媒体文件日期检查报告 ({current_time}) ===")
             report.append(f"检查目录: {self.directory}")
+            if self.resumed_results:
+                report.append(f"继续上次未完成的扫描: 恢复 {self.resumed_results} 个已归类的文件")
+            if self.cancelled:
+                report.append("扫描已取消: 以下只包含取消前完成的文件，下次可以继续")
+            if self.cache_path:
+                report.append(f"元数据缓存: 命中 {self.cache_hits} 个, 未命中 {self.cache_misses} 个")
+                report.append(f"目录指纹: 未变化 {self.dir_hits} 个, 重新列举 {self.dir_misses} 个")
+            
+            # 分阶段扫描时各阶段的吞吐量和队列长度
+            if self.stage_stats:
+                report.append("\n扫描阶段统计:")
+                report.extend(format_stage_stats(self.stage_stats))
+            
+            # 各提取方式按扩展名的命中率和耗时（缓存命中的文件不计入）
+            stats_lines = self.extractor_chain.stats.report_lines()
+            if stats_lines:
+                report.append("\n提取方式统计:")
+                report.extend(stats_lines)
             
-            # 显示LIVP文件信息
+            # 显示无法读取的LIVP文件
             if results['livp_files']:
-                report.append(f"\nLIVP文件 ({len(results['livp_files'])}个):")
+                report.append(f"\n无法读取的LIVP文件 ({len(results['livp_files'])}个):")
                 for path in results['livp_files']:
                     report.append(f"文件: {path}")
                     report.append("")
@@ -509,6 +1187,14 @@ class MediaDateChecker:
                     report.append(f"比特率: {bitrate}")
                     report.append("")
             
+            # 显示ffprobe超时或崩溃的视频
+            if results['probe_failed']:
+                report.append(f"\n探测失败的视频 ({len(results['probe_failed'])}个):")
+                for path, reason, date_type, _ in results['probe_failed']:
+                    report.append(f"文件: {path}")
+                    report.append(f"原因: {reason}")
+                    report.append("")
+            
             report.append(f"\n有日期信息的文件 ({len(results['with_date'])}个):")
             for path, date, date_type, bitrate in results['with_date']:
                 report.append(f"文件: {path}")
@@ -518,6 +1204,14 @@ class MediaDateChecker:
                     report.append(f"比特率: {bitrate} kbps")
                 report.append("")
             
+            # 只生成了计划、尚未执行的移动
+            if move_plan:
+                report.append(f"\n移动计划 ({len(move_plan)}个文件待移动，尚未执行):")
+                if plan_path:
+                    report.append(f"计划文件: {plan_path}")
+                for op in move_plan.ops:
+                    report.append(f"{op.source} -> {op.target}")
+            
             report.append(f"\n没有日期信息的文件 ({len(results['without_date'])}个):")
             for path, reason, date_type, bitrate in results['without_date']:
                 report.append(f"文件: {path}")
@@ -552,6 +1246,10 @@ class MediaCheckerGUI:
         
         # 存储检查结果
         self.check_results = None
+        # 设置后扫描在两个文件之间停止
+        self.cancel_event = threading.Event()
+        # 上次执行移动计划的移动日志，用于撤销
+        self.last_journal = None
         
         self.setup_ui()
         
@@ -596,15 +1294,46 @@ class MediaCheckerGUI:
         self.move_big_video_var = tk.BooleanVar()
         ttk.Checkbutton(left_frame, text="自动移动比特率大于20000kbps的视频到BigVideo文件夹", variable=self.move_big_video_var).grid(row=5, column=0, columnspan=3, pady=10, sticky=(tk.W, tk.E))
         
-        # 开始按钮
-        ttk.Button(left_frame, text="开始检查", command=self.start_check).grid(row=6, column=0, columnspan=3, pady=10)
+        # 并行进程数选项（1表示串行扫描）
+        workers_frame = ttk.Frame(left_frame)
+        workers_frame.grid(row=6, column=0, columnspan=3, pady=5, sticky=(tk.W, tk.E))
+        ttk.Label(workers_frame, text="并行检查进程数:").pack(side=tk.LEFT)
+        self.workers_var = tk.IntVar(value=os.cpu_count() or 1)
+        ttk.Spinbox(workers_frame, from_=1, to=MAX_SCAN_WORKERS, textvariable=self.workers_var, width=5).pack(side=tk.LEFT, padx=5)
+        
+        # 目录未变化时复用上次的文件名列表（FAT/exFAT盘上目录修改时间不可靠，可能漏掉新文件）
+        self.skip_dirs_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(workers_frame, text="跳过未变化的目录", variable=self.skip_dirs_var).pack(side=tk.LEFT, padx=20)
+        
+        # 分阶段扫描：预读、解析和ffprobe在各自的线程中重叠进行，适合网络存储等读取延迟高的目录
+        self.staged_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(workers_frame, text="分阶段扫描（网络存储）", variable=self.staged_var).pack(side=tk.LEFT, padx=20)
+        
+        # 移动计划选项：扫描时只生成计划，确认后再批量移动（可以撤销）
+        self.plan_moves_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(workers_frame, text="先生成移动计划，确认后再移动", variable=self.plan_moves_var).pack(side=tk.LEFT, padx=20)
         
-        # 添加修改日期按钮
-        ttk.Button(left_frame, text="修改文件创建日期", command=self.update_file_dates).grid(row=7, column=0, columnspan=3, pady=10)
+        # 开始按钮和快速估算按钮（快速估算只抽样检查，用于估计完整扫描的结果和耗时）
+        buttons_frame = ttk.Frame(left_frame)
+        buttons_frame.grid(row=7, column=0, columnspan=3, pady=10)
+        ttk.Button(buttons_frame, text="开始检查", command=self.start_check).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons_frame, text="快速估算", command=self.start_estimate).pack(side=tk.LEFT, padx=5)
+        self.cancel_button = ttk.Button(buttons_frame, text="取消检查", command=self.cancel_check, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
+        
+        # 添加修改日期按钮，以及执行已保存的移动计划、撤销上次移动的按钮
+        actions_frame = ttk.Frame(left_frame)
+        actions_frame.grid(row=8, column=0, columnspan=3, pady=10)
+        ttk.Button(actions_frame, text="修改文件创建日期", command=self.update_file_dates).pack(side=tk.LEFT, padx=5)
+        ttk.Button(actions_frame, text="按日期整理", command=self.organize_by_date).pack(side=tk.LEFT, padx=5)
+        ttk.Button(actions_frame, text="查找重复文件", command=self.start_duplicates).pack(side=tk.LEFT, padx=5)
+        ttk.Button(actions_frame, text="执行移动计划", command=self.open_move_plan).pack(side=tk.LEFT, padx=5)
+        self.undo_button = ttk.Button(actions_frame, text="撤销上次移动", command=self.undo_last_moves, state=tk.DISABLED)
+        self.undo_button.pack(side=tk.LEFT, padx=5)
         
         # 创建标签页
         self.notebook = ttk.Notebook(left_frame)
-        self.notebook.grid(row=8, column=0, columnspan=3, pady=10, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.notebook.grid(row=9, column=0, columnspan=3, pady=10, sticky=(tk.W, tk.E, tk.N, tk.S))
         
         # 创建有信息文件的标签页
         self.with_info_frame = ttk.Frame(self.notebook)
@@ -624,15 +1353,31 @@ class MediaCheckerGUI:
         self.big_video_text = tk.Text(self.big_video_frame, height=20, width=80)
         self.big_video_text.pack(fill=tk.BOTH, expand=True)
         
-        # 创建LIVP文件的标签页
+        # 创建无法读取的LIVP文件的标签页
         self.livp_frame = ttk.Frame(self.notebook)
-        self.notebook.add(self.livp_frame, text="LIVP文件")
+        self.notebook.add(self.livp_frame, text="无法读取的LIVP")
         self.livp_text = tk.Text(self.livp_frame, height=20, width=80)
         self.livp_text.pack(fill=tk.BOTH, expand=True)
         
+        # 创建ffprobe超时或崩溃的视频标签页
+        self.probe_failed_frame = ttk.Frame(self.notebook)
+        self.notebook.add(self.probe_failed_frame, text="探测失败")
+        self.probe_failed_text = tk.Text(self.probe_failed_frame, height=20, width=80)
+        self.probe_failed_text.pack(fill=tk.BOTH, expand=True)
+        
+        # 结果类别与对应的文本框
+        self.result_texts = {
+            'with_date': self.with_info_text,
+            'without_date': self.without_info_text,
+            'big_videos': self.big_video_text,
+            'livp_files': self.livp_text,
+            'probe_failed': self.probe_failed_text,
+        }
+        self.partial_counts = {category: 0 for category in self.result_texts}
+        
         # 进度条
         self.progress = ttk.Progressbar(left_frame, length=300, mode='indeterminate')
-        self.progress.grid(row=9, column=0, columnspan=3, pady=10)
+        self.progress.grid(row=10, column=0, columnspan=3, pady=10)
         
         # 创建右侧信息栏
         right_frame = ttk.Frame(main_frame, padding="10")
@@ -651,7 +1396,8 @@ class MediaCheckerGUI:
             ("有日期信息", "0"),
             ("无日期信息", "0"),
             ("大视频文件", "0"),
-            ("LIVP文件", "0"),
+            ("无法读取的LIVP", "0"),
+            ("探测失败", "0"),
             ("文件总数", "0")  # 新增：文件总数
         ]
         
@@ -678,38 +1424,171 @@ class MediaCheckerGUI:
         if not check_ffmpeg():
             show_ffmpeg_error()
             return
+        
+        # 上次同一目录的扫描被取消或中断时，询问是否从中断处继续
+        checker = MediaDateChecker(self.dir_path.get())
+        resume = False
+        if not self.planning_moves() and checker.has_checkpoint(self.move_var.get(), self.move_big_video_var.get()):
+            resume = messagebox.askyesno("继续扫描", "该目录有未完成的扫描，是否从上次中断处继续？\n选择“否”将重新开始扫描。")
             
         self.progress.start()
+        self.cancel_event.clear()
+        self.cancel_button.config(state=tk.NORMAL)
         
-        # 清空所有文本框
-        self.with_info_text.delete(1.0, tk.END)
-        self.without_info_text.delete(1.0, tk.END)
-        self.big_video_text.delete(1.0, tk.END)
-        self.livp_text.delete(1.0, tk.END)
+        # 清空所有文本框和统计信息
+        for text_widget in self.result_texts.values():
+            text_widget.delete(1.0, tk.END)
+        self.update_stats(new_scan_results())
+        self.partial_counts = {category: 0 for category in self.result_texts}
         
         # 创建新的日志文件
         current_log_file = get_log_file()
         self.log_label.config(text=f"当前检查记录保存在: {current_log_file}")
         
         # 在新线程中运行检查
-        thread = threading.Thread(target=self.run_check, args=(current_log_file,))
+        thread = threading.Thread(target=self.run_check, args=(current_log_file, resume))
         thread.daemon = True
         thread.start()
         
-    def run_check(self, log_file):
+    def cancel_check(self):
+        """请求取消正在运行的扫描（扫描在处理完当前文件后停止，检查点保留）"""
+        self.cancel_event.set()
+        self.cancel_button.config(state=tk.DISABLED)
+        
+    def planning_moves(self):
+        """本次检查是否只生成移动计划（勾选了移动选项和“先生成移动计划”）"""
+        return self.plan_moves_var.get() and (self.move_var.get() or self.move_big_video_var.get())
+        
+    def run_check(self, log_file, resume=False):
         try:
-            checker = MediaDateChecker(self.dir_path.get())
-            results = checker.scan_directory(
+            checker = MediaDateChecker(self.dir_path.get(), workers=self.workers_var.get(),
+                                       skip_unchanged_dirs=self.skip_dirs_var.get())
+            move_plan = MovePlan() if self.planning_moves() else None
+            results = new_scan_results()
+            batch = []
+            last_flush = time.monotonic()
+            
+            # 边扫描边把部分结果分批交给主线程显示
+            scan = checker.iter_scan_staged if self.staged_var.get() else checker.iter_scan
+            for result in scan(
                 move_no_info=self.move_var.get(),
-                move_big_video=self.move_big_video_var.get()
-            )
+                move_big_video=self.move_big_video_var.get(),
+                cancel_event=self.cancel_event,
+                resume=resume,
+                move_plan=move_plan
+            ):
+                add_scan_result(results, result)
+                batch.append(result)
+                now = time.monotonic()
+                if now - last_flush >= PARTIAL_RESULT_INTERVAL:
+                    self.root.after(0, self.show_partial_results, batch)
+                    batch = []
+                    last_flush = now
+            
+            if batch:
+                self.root.after(0, self.show_partial_results, batch)
+            
+            # 保存移动计划，供确认前审阅
+            plan_path = None
+            if move_plan:
+                plan_path = get_move_plan_path()
+                move_plan.save(plan_path)
+            
+            # 用本次扫描的检查器生成并写入报告（包含缓存命中统计和移动计划）
+            checker.print_report(results, log_file, move_plan, plan_path)
             
             # 更新UI
             self.root.after(0, self.update_results, results, log_file)
+            if checker.cancelled:
+                self.root.after(0, messagebox.showinfo, "已取消", "扫描已取消，下次检查该目录时可以从中断处继续")
+            elif move_plan:
+                self.root.after(0, self.confirm_move_plan, move_plan, plan_path, log_file)
         except Exception as e:
             self.root.after(0, self.show_error, str(e))
         finally:
             self.root.after(0, self.progress.stop)
+            self.root.after(0, self.cancel_button.config, {'state': tk.DISABLED})
+            
+    def confirm_move_plan(self, move_plan, plan_path, log_file):
+        """扫描生成移动计划后询问是否立即执行（选择“否”时可以审阅计划文件后再执行）"""
+        if messagebox.askyesno(
+            "移动计划",
+            f"共有 {len(move_plan)} 个文件需要移动，计划已保存在:\n{plan_path}\n\n"
+            "是否现在执行？选择“否”可以审阅或删减计划文件后，用“执行移动计划”按钮执行。"
+        ):
+            self.start_apply(move_plan, plan_path, log_file)
+            
+    def open_move_plan(self):
+        """选择保存的移动计划文件并执行（中断过的计划继续执行未完成的部分）"""
+        plan_path = filedialog.askopenfilename(
+            initialdir=LOG_DIR, filetypes=[("移动计划", "move_plan_*.jsonl"), ("所有文件", "*.*")]
+        )
+        if not plan_path:
+            return
+        try:
+            move_plan = MovePlan.load(plan_path)
+        except (OSError, ValueError, KeyError) as e:
+            messagebox.showerror("错误", f"读取移动计划失败: {str(e)}")
+            return
+        self.start_apply(move_plan, plan_path, get_log_file())
+        
+    def start_apply(self, move_plan, plan_path, log_file):
+        self.progress.start()
+        thread = threading.Thread(target=self.run_apply, args=(move_plan, journal_path_for_plan(plan_path), log_file))
+        thread.daemon = True
+        thread.start()
+        
+    def run_apply(self, move_plan, journal_path, log_file):
+        try:
+            result = apply_move_plan(move_plan, journal_path)
+            lines = format_apply_result(result, journal_path)
+            write_to_log(log_file, '\n'.join(lines))
+            self.last_journal = journal_path
+            self.root.after(0, self.undo_button.config, {'state': tk.NORMAL})
+            self.root.after(0, messagebox.showinfo, "移动完成", '\n'.join(lines[:2]))
+        except Exception as e:
+            self.root.after(0, self.show_error, f"执行移动计划时出错: {str(e)}")
+        finally:
+            self.root.after(0, self.progress.stop)
+            
+    def undo_last_moves(self):
+        """把上次执行移动计划移动的文件移回原位置"""
+        if not self.last_journal:
+            return
+        if not messagebox.askyesno("撤销移动", "是否把上次移动的文件全部移回原位置？"):
+            return
+        self.undo_button.config(state=tk.DISABLED)
+        self.progress.start()
+        thread = threading.Thread(target=self.run_undo, args=(self.last_journal,))
+        thread.daemon = True
+        thread.start()
+        
+    def run_undo(self, journal_path):
+        try:
+            undone, failed = undo_moves(journal_path)
+            message = f"已移回 {undone} 个文件"
+            if failed:
+                message += f"，{len(failed)} 个文件移回失败（见控制台输出）"
+            self.root.after(0, messagebox.showinfo, "撤销完成", message)
+        except Exception as e:
+            self.root.after(0, self.show_error, f"撤销移动时出错: {str(e)}")
+        finally:
+            self.root.after(0, self.progress.stop)
+            
+    def show_partial_results(self, batch):
+        """在扫描过程中追加显示一批结果并更新统计"""
+        for result in batch:
+            self.result_texts[result.category].insert(tk.END, format_scan_result(result))
+            self.partial_counts[result.category] += 1
+        
+        self.stats_labels["有日期信息"].config(text=str(self.partial_counts['with_date']))
+        self.stats_labels["无日期信息"].config(text=str(self.partial_counts['without_date']))
+        self.stats_labels["大视频文件"].config(text=str(self.partial_counts['big_videos']))
+        self.stats_labels["无法读取的LIVP"].config(text=str(self.partial_counts['livp_files']))
+        self.stats_labels["探测失败"].config(text=str(self.partial_counts['probe_failed']))
+        total_files = (self.partial_counts['with_date'] + self.partial_counts['without_date']
+                       + self.partial_counts['livp_files'] + self.partial_counts['probe_failed'])
+        self.stats_labels["文件总数"].config(text=str(total_files))
             
     def update_stats(self, results):
         """更新统计信息"""
@@ -717,81 +1596,72 @@ class MediaCheckerGUI:
         self.stats_labels["有日期信息"].config(text=str(len(results['with_date'])))
         self.stats_labels["无日期信息"].config(text=str(len(results['without_date'])))
         self.stats_labels["大视频文件"].config(text=str(len(results['big_videos'])))
-        self.stats_labels["LIVP文件"].config(text=str(len(results['livp_files'])))
+        self.stats_labels["无法读取的LIVP"].config(text=str(len(results['livp_files'])))
+        self.stats_labels["探测失败"].config(text=str(len(results['probe_failed'])))
         
-        # 计算文件总数（有日期信息 + 无日期信息 + LIVP文件）
-        total_files = len(results['with_date']) + len(results['without_date']) + len(results['livp_files'])
+        # 计算文件总数（有日期信息 + 无日期信息 + LIVP文件 + 探测失败）
+        total_files = (len(results['with_date']) + len(results['without_date'])
+                       + len(results['livp_files']) + len(results['probe_failed']))
         self.stats_labels["文件总数"].config(text=str(total_files))
 
     def update_results(self, results, log_file):
+        """扫描结束后补充各标签页的标题（文件列表已在扫描过程中显示，报告已由扫描线程写入）"""
         # 保存检查结果
         self.check_results = results
         
-        # 清空所有文本框
-        self.with_info_text.delete(1.0, tk.END)
-        self.without_info_text.delete(1.0, tk.END)
-        self.big_video_text.delete(1.0, tk.END)
-        self.livp_text.delete(1.0, tk.END)
-        
         # 更新统计信息
         self.update_stats(results)
         
-        # 显示LIVP文件信息
-        if results['livp_files']:
-            self.livp_text.insert(tk.END, f"LIVP文件 ({len(results['livp_files'])}个):\n\n")
-            for path in results['livp_files']:
-                self.livp_text.insert(tk.END, f"文件: {path}\n\n")
-        else:
-            self.livp_text.insert(tk.END, "没有找到LIVP文件\n")
-        
-        # 显示大视频信息
-        if results['big_videos']:
-            self.big_video_text.insert(tk.END, f"大视频文件 ({len(results['big_videos'])}个):\n\n")
-            for path, bitrate in results['big_videos']:
-                self.big_video_text.insert(tk.END, f"文件: {path}\n")
-                self.big_video_text.insert(tk.END, f"比特率: {bitrate}\n\n")
-        else:
-            self.big_video_text.insert(tk.END, "没有找到大视频文件\n")
-        
-        # 显示有日期的文件
-        if results['with_date']:
-            self.with_info_text.insert(tk.END, f"有日期信息的文件 ({len(results['with_date'])}个):\n\n")
-            for path, date, date_type, bitrate in results['with_date']:
-                self.with_info_text.insert(tk.END, f"文件: {path}\n")
-                self.with_info_text.insert(tk.END, f"日期类型: {date_type}\n")
-                self.with_info_text.insert(tk.END, f"日期: {date}\n")
-                if bitrate:
-                    self.with_info_text.insert(tk.END, f"比特率: {bitrate} kbps\n")
-                self.with_info_text.insert(tk.END, "\n")
-        else:
-            self.with_info_text.insert(tk.END, "没有找到有日期信息的文件\n")
-            
-        # 显示没有日期的文件
-        if results['without_date']:
-            self.without_info_text.insert(tk.END, f"没有日期信息的文件 ({len(results['without_date'])}个):\n\n")
-            for path, reason, date_type, bitrate in results['without_date']:
-                self.without_info_text.insert(tk.END, f"文件: {path}\n")
-                self.without_info_text.insert(tk.END, f"日期类型: {date_type}\n")
-                self.without_info_text.insert(tk.END, f"原因: {reason}\n")
-                if bitrate:
-                    self.without_info_text.insert(tk.END, f"比特率: {bitrate} kbps\n")
-                self.without_info_text.insert(tk.END, "\n")
-        else:
-            self.without_info_text.insert(tk.END, "没有找到无日期信息的文件\n")
-        
-        # 自动滚动到顶部
-        self.with_info_text.see("1.0")
-        self.without_info_text.see("1.0")
-        self.big_video_text.see("1.0")
-        self.livp_text.see("1.0")
-        
-        # 生成并写入报告
-        checker = MediaDateChecker(self.dir_path.get())
-        checker.print_report(results, log_file)
+        titles = {
+            'with_date': "有日期信息的文件",
+            'without_date': "没有日期信息的文件",
+            'big_videos': "大视频文件",
+            'livp_files': "无法读取的LIVP文件",
+            'probe_failed': "探测失败的视频",
+        }
+        not_found = {
+            'with_date': "没有找到有日期信息的文件",
+            'without_date': "没有找到无日期信息的文件",
+            'big_videos': "没有找到大视频文件",
+            'livp_files': "没有无法读取的LIVP文件",
+            'probe_failed': "没有探测失败的视频",
+        }
+        for category, text_widget in self.result_texts.items():
+            if results[category]:
+                text_widget.insert("1.0", f"{titles[category]} ({len(results[category])}个):\n\n")
+            else:
+                text_widget.insert(tk.END, f"{not_found[category]}\n")
+            # 自动滚动到顶部
+            text_widget.see("1.0")
             
     def show_error(self, error_msg):
         messagebox.showerror("错误", error_msg)
         
+    def start_estimate(self):
+        if not self.dir_path.get():
+            messagebox.showerror("错误", "请选择媒体文件目录")
+            return
+        
+        self.progress.start()
+        current_log_file = get_log_file()
+        self.log_label.config(text=f"当前估算记录保存在: {current_log_file}")
+        
+        thread = threading.Thread(target=self.run_estimate, args=(current_log_file,))
+        thread.daemon = True
+        thread.start()
+        
+    def run_estimate(self, log_file):
+        try:
+            checker = MediaDateChecker(self.dir_path.get(), workers=self.workers_var.get(),
+                                       skip_unchanged_dirs=self.skip_dirs_var.get())
+            estimate = checker.estimate_scan()
+            report = checker.print_estimate_report(estimate, log_file)
+            self.root.after(0, messagebox.showinfo, "快速估算", report.strip().strip('='))
+        except Exception as e:
+            self.root.after(0, self.show_error, str(e))
+        finally:
+            self.root.after(0, self.progress.stop)
+        
     def update_file_dates(self):
         """修改文件创建日期"""
         if not self.check_results:
@@ -804,24 +1674,7 @@ class MediaCheckerGUI:
         # 处理有日期信息的文件
         for path, date, date_type, _ in self.check_results['with_date']:
             try:
-                # 尝试不同的日期格式
-                date_formats = [
-                    '%Y-%m-%d %H:%M:%S',  # 2024-05-18 19:26:20
-                    '%Y:%m:%d %H:%M:%S',  # 2024:05:18 19:26:20
-                    '%Y/%m/%d %H:%M:%S',  # 2024/05/18 19:26:20
-                    '%Y-%m-%d %H%M%S',    # 2024-05-18 192620
-                    '%Y:%m:%d %H%M%S',    # 2024:05:18 192620
-                    '%Y/%m/%d %H%M%S'     # 2024/05/18 192620
-                ]
-                
-                date_obj = None
-                for fmt in date_formats:
-                    try:
-                        date_obj = datetime.strptime(date, fmt)
-                        break
-                    except ValueError:
-                        continue
-                
+                date_obj = parse_date(date, 'check_result')
                 if date_obj:
                     files_to_update.append((path, date_obj, date_type))
                 else:
@@ -831,29 +1684,13 @@ class MediaCheckerGUI:
                 continue
                 
         # 处理无日期信息的文件，尝试从文件名获取日期
+        name_dates = NameDateMatcher()
         for path, reason, date_type, _ in self.check_results['without_date']:
             try:
-                # 尝试从文件名解析日期（格式：YYYY-MM-DD HHMMSS）
-                filename = os.path.basename(path)
-                date_str = filename.split('.')[0]  # 移除扩展名
-                
-                # 尝试不同的日期格式
-                date_formats = [
-                    '%Y-%m-%d %H%M%S',    # 2024-05-18 192620
-                    '%Y:%m:%d %H%M%S',    # 2024:05:18 192620
-                    '%Y/%m/%d %H%M%S'     # 2024/05/18 192620
-                ]
-                
-                date_obj = None
-                for fmt in date_formats:
-                    try:
-                        date_obj = datetime.strptime(date_str, fmt)
-                        break
-                    except ValueError:
-                        continue
-                
-                if date_obj:
-                    files_to_update.append((path, date_obj, "文件名日期"))
+                # 按文件名命名规则匹配（包括只作为后备的规则，如 mmexport时间戳）
+                named = name_dates.match_filename(path)
+                if named:
+                    files_to_update.append((path, named.date, "文件名日期"))
             except Exception as e:
                 print(f"处理文件名日期时出错: {path} - {str(e)}")
                 continue
@@ -912,6 +1749,78 @@ class MediaCheckerGUI:
         # 在主线程中显示结果
         self.root.after(0, lambda: self._show_update_result(success_count, fail_count, skipped_count))
         
+    def start_duplicates(self):
+        if not self.dir_path.get():
+            messagebox.showerror("错误", "请选择媒体文件目录")
+            return
+        log_file = get_log_file()
+        self.log_label.config(text=f"当前检查记录保存在: {log_file}")
+        self.progress.start()
+        thread = threading.Thread(target=self.run_duplicates, args=(log_file,))
+        thread.daemon = True
+        thread.start()
+        
+    def run_duplicates(self, log_file):
+        try:
+            checker = MediaDateChecker(self.dir_path.get(), skip_unchanged_dirs=self.skip_dirs_var.get())
+            report = checker.find_duplicates()
+            checker.print_duplicate_report(report, log_file)
+            self.root.after(0, self.confirm_duplicates, checker, report, log_file)
+        except Exception as e:
+            self.root.after(0, self.show_error, f"查找重复文件时出错: {str(e)}")
+        finally:
+            self.root.after(0, self.progress.stop)
+            
+    def confirm_duplicates(self, checker, report, log_file):
+        """显示重复文件数量，询问是否把多余的副本（每组保留最新的一份）移到Duplicates文件夹"""
+        if not report.sets:
+            messagebox.showinfo("查找重复文件", "没有找到重复文件")
+            return
+        move_plan = checker.plan_duplicate_moves(report)
+        if messagebox.askyesno(
+            "查找重复文件",
+            f"找到 {len(report.sets)} 组重复文件，详细列表已写入检查记录。\n\n"
+            f"是否把其中 {len(move_plan)} 个多余的副本（每组保留最新的一份）移到Duplicates文件夹？\n"
+            "移动后可以用“撤销上次移动”恢复。"
+        ):
+            plan_path = get_move_plan_path()
+            move_plan.save(plan_path)
+            self.start_apply(move_plan, plan_path, log_file)
+        
+    def organize_by_date(self):
+        """把有日期的文件以硬链接放入所选文件夹下的 年/月 目录树（原文件不动，再次整理时只处理变化的文件）"""
+        if not self.check_results:
+            messagebox.showwarning("警告", "请先运行检查")
+            return
+        root = filedialog.askdirectory(title="选择整理的目标文件夹")
+        if not root:
+            return
+        items = []
+        for path, date, date_type, _ in self.check_results['with_date']:
+            date_obj = parse_date(date, 'check_result')
+            if date_obj:
+                items.append((path, date_obj))
+            else:
+                print(f"无法解析日期: {date} for {path}")
+        if not items:
+            messagebox.showinfo("提示", "没有找到可以整理的文件")
+            return
+        self.progress.start()
+        thread = threading.Thread(target=self.run_organize, args=(root, items, self.dir_path.get()))
+        thread.daemon = True
+        thread.start()
+        
+    def run_organize(self, root, items, source_dir):
+        try:
+            result = DateTreeOrganizer(root).organize(items, source_dir=source_dir)
+            lines = format_organize_result(result, root)
+            write_to_log(get_log_file(), '\n'.join(lines))
+            self.root.after(0, messagebox.showinfo, "整理完成", '\n'.join(lines[:3]))
+        except Exception as e:
+            self.root.after(0, self.show_error, f"按日期整理时出错: {str(e)}")
+        finally:
+            self.root.after(0, self.progress.stop)
+        
     def _show_update_result(self, success_count, fail_count, skipped_count):
         """显示修改结果"""
         message = f"文件日期修改完成\n成功: {success_count} 个文件\n失败: {fail_count} 个文件"
@@ -928,4 +1837,6 @@ def main():
     app.run()
 
 if __name__ == "__main__":
+    # 打包为exe后进程池需要freeze_support才能正常启动工作进程
+    multiprocessing.freeze_support()
     main() 
\ No newline at end of file
@@ -1,147 +1,111 @@
 import os
-import shutil
-from PIL import Image
-from PIL.ExifTags import TAGS
-from datetime import datetime
-import logging
-import glob
-import ffmpeg
-import subprocess
 import sys
-import json
-from pillow_heif import register_heif_opener, HeifFile
+import time
+import threading
+import multiprocessing
 import win32file
 import win32con
 import pywintypes
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                             QPushButton, QLabel, QLineEdit, QFileDialog, QMessageBox,
-                            QTabWidget, QTextEdit, QProgressBar, QCheckBox, QGroupBox, QDesktopWidget)
+                            QTabWidget, QTextEdit, QProgressBar, QCheckBox, QGroupBox, QDesktopWidget,
+                            QSpinBox)
 from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from PyQt5.QtGui import QTextCursor
+from date_normalizer import parse_date
+from filename_dates import NameDateMatcher
 
-# 注册HEIC支持
-register_heif_opener()
-
-# 设置默认检查目录
-DEFAULT_CHECK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Check')
-NO_INFO_DIR = os.path.join(DEFAULT_CHECK_DIR, 'NoInformation')
-NO_VIDEO_INFO_DIR = os.path.join(DEFAULT_CHECK_DIR, 'NoVideoInformation')
-BIG_VIDEO_DIR = os.path.join(DEFAULT_CHECK_DIR, 'BigVideo')
-LOG_DIR = os.path.dirname(os.path.abspath(__file__))
-FFMPEG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ffmpeg-7.1.1', 'bin')
-
-# 确保必要的目录存在
-for directory in [DEFAULT_CHECK_DIR, NO_INFO_DIR, NO_VIDEO_INFO_DIR, BIG_VIDEO_DIR]:
-    if not os.path.exists(directory):
-        os.makedirs(directory)
-        print(f"创建目录: {directory}")
-
-def get_log_file():
-    """获取新的日志文件路径"""
-    try:
-        if not os.path.exists(LOG_DIR):
-            os.makedirs(LOG_DIR)
-            print(f"创建日志目录: {LOG_DIR}")
-
-        current_time = datetime.now().strftime('%Y%m%d_%H%M%S')
-        log_file = os.path.join(LOG_DIR, f'photo_check_{current_time}.txt')
-        
-        with open(log_file, 'w', encoding='utf-8') as f:
-            f.write(f"=== 检查记录文件创建时间: {current_time} ===\n")
-        
-        log_files = glob.glob(os.path.join(LOG_DIR, 'photo_check_*.txt'))
-        log_files.sort(reverse=True)
-        
-        for old_file in log_files[3:]:
-            try:
-                os.remove(old_file)
-            except Exception as e:
-                print(f"删除旧文件失败: {str(e)}")
-        
-        return log_file
-    except Exception as e:
-        print(f"创建日志文件时出错: {str(e)}")
-        backup_log_dir = DEFAULT_CHECK_DIR
-        current_time = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_log_file = os.path.join(backup_log_dir, f'photo_check_{current_time}.txt')
-        
-        with open(backup_log_file, 'w', encoding='utf-8') as f:
-            f.write(f"=== 检查记录文件创建时间: {current_time} ===\n")
-        
-        return backup_log_file
-
-def write_to_log(log_file, content):
-    """写入内容到日志文件"""
-    try:
-        with open(log_file, 'a', encoding='utf-8') as f:
-            f.write(content + '\n')
-    except Exception as e:
-        print(f"写入日志文件时出错: {str(e)}")
-
-def check_ffmpeg():
-    """检查ffmpeg是否已安装"""
-    try:
-        result = subprocess.run(['ffprobe', '-version'], capture_output=True, text=True)
-        if result.returncode == 0:
-            return True
-            
-        ffprobe_path = os.path.join(FFMPEG_DIR, 'ffprobe.exe')
-        if os.path.exists(ffprobe_path):
-            result = subprocess.run([ffprobe_path, '-version'], capture_output=True, text=True)
-            return result.returncode == 0
-            
-        return False
-    except FileNotFoundError:
-        ffprobe_path = os.path.join(FFMPEG_DIR, 'ffprobe.exe')
-        if os.path.exists(ffprobe_path):
-            try:
-                result = subprocess.run([ffprobe_path, '-version'], capture_output=True, text=True)
-                return result.returncode == 0
-            except Exception:
-                return False
-        return False
-
-def get_ffprobe_path():
-    """获取ffprobe的路径"""
-    try:
-        result = subprocess.run(['ffprobe', '-version'], capture_output=True, text=True)
-        if result.returncode == 0:
-            return 'ffprobe'
-    except FileNotFoundError:
-        pass
-        
-    ffprobe_path = os.path.join(FFMPEG_DIR, 'ffprobe.exe')
-    if os.path.exists(ffprobe_path):
-        return ffprobe_path
-        
-    return None
+# 检查逻辑与Tk版本共用，避免两份MediaDateChecker各自维护
+from check_photo_date import (DEFAULT_CHECK_DIR, FFMPEG_DIR, LOG_DIR, MAX_SCAN_WORKERS, PARTIAL_RESULT_INTERVAL,
+                              MediaDateChecker, get_log_file, get_move_plan_path, journal_path_for_plan,
+                              write_to_log, check_ffmpeg, new_scan_results, add_scan_result, format_scan_result)
+from move_plan import MovePlan, apply_move_plan, undo_moves, format_apply_result
 
 class CheckThread(QThread):
     """检查线程"""
     progress = pyqtSignal(str)
+    partial = pyqtSignal(list)
     finished = pyqtSignal(dict)
     error = pyqtSignal(str)
 
-    def __init__(self, directory, move_no_info, move_big_video):
+    def __init__(self, directory, move_no_info, move_big_video, workers=1, log_file=None, resume=False,
+                 skip_unchanged_dirs=False, staged=False, move_plan=None):
         super().__init__()
         self.directory = directory
+        self.log_file = log_file
         self.move_no_info = move_no_info
         self.move_big_video = move_big_video
-        # 确保 checker 在 MediaDateChecker 定义之后被创建
-        self.checker = MediaDateChecker(directory)
+        self.resume = resume
+        self.staged = staged
+        self.move_plan = move_plan  # 提供MovePlan时只生成移动计划，不移动文件
+        self.plan_path = None
+        self.cancel_event = threading.Event()
+        self.checker = MediaDateChecker(directory, workers=workers, skip_unchanged_dirs=skip_unchanged_dirs)
+
+    def cancel(self):
+        """请求取消扫描：扫描在处理完当前文件后停止，检查点保留以便下次继续"""
+        self.cancel_event.set()
 
     def run(self):
         try:
             print("检查线程启动...")
-            results = self.checker.scan_directory(
+            results = new_scan_results()
+            batch = []
+            last_flush = time.monotonic()
+            
+            # 边扫描边把部分结果分批发送给界面显示
+            scan = self.checker.iter_scan_staged if self.staged else self.checker.iter_scan
+            for result in scan(
                 move_no_info=self.move_no_info,
-                move_big_video=self.move_big_video
-            )
+                move_big_video=self.move_big_video,
+                cancel_event=self.cancel_event,
+                resume=self.resume,
+                move_plan=self.move_plan
+            ):
+                add_scan_result(results, result)
+                batch.append(result)
+                now = time.monotonic()
+                if now - last_flush >= PARTIAL_RESULT_INTERVAL:
+                    self.partial.emit(batch)
+                    batch = []
+                    last_flush = now
+            
+            if batch:
+                self.partial.emit(batch)
+            
+            # 保存移动计划，供确认前审阅
+            if self.move_plan:
+                self.plan_path = get_move_plan_path()
+                self.move_plan.save(self.plan_path)
+            
+            # 用本次扫描的检查器生成并写入报告（包含缓存命中统计和移动计划）
+            if self.log_file:
+                self.checker.print_report(results, self.log_file, self.move_plan, self.plan_path)
             print("检查线程完成.")
             self.finished.emit(results)
         except Exception as e:
             print(f"检查线程出错: {str(e)}")
             self.error.emit(str(e))
 
+class EstimateThread(QThread):
+    """快速估算线程：只抽样检查，估计完整扫描的结果和耗时"""
+    finished = pyqtSignal(str)
+    error = pyqtSignal(str)
+
+    def __init__(self, directory, workers=1, log_file=None, skip_unchanged_dirs=False):
+        super().__init__()
+        self.log_file = log_file
+        self.checker = MediaDateChecker(directory, workers=workers, skip_unchanged_dirs=skip_unchanged_dirs)
+
+    def run(self):
+        try:
+            estimate = self.checker.estimate_scan()
+            report = self.checker.print_estimate_report(estimate, self.log_file)
+            self.finished.emit(report)
+        except Exception as e:
+            print(f"估算线程出错: {str(e)}")
+            self.error.emit(str(e))
+
 class UpdateDatesThread(QThread):
     """更新日期线程"""
     progress = pyqtSignal(str)
@@ -184,401 +148,49 @@ class UpdateDatesThread(QThread):
 
         self.finished.emit(success_count, fail_count, skipped_count)
 
-class MediaDateChecker:
-    def __init__(self, directory):
-        self.directory = directory
-        self.supported_image_formats = ['.jpg', '.jpeg', '.tiff', '.tif', '.png', '.heic', '.heif']
-        self.supported_video_formats = ['.mp4', '.mov', '.avi', '.mkv', '.wmv', '.flv', '.webm']
-        self.date_tags = [
-            'DateTimeOriginal',  # 原始拍摄时间
-            'DateTimeDigitized', # 数字化时间
-            'DateTime',          # 修改时间
-        ]
-        self.has_ffmpeg = check_ffmpeg()
-        self.ffprobe_path = get_ffprobe_path()
-        self.bitrate_threshold = 20000  # 比特率阈值（kbps）
-        
-    def get_exif_date(self, image_path):
-        """获取图片的EXIF日期信息"""
-        try:
-            ext = os.path.splitext(image_path)[1].lower()
-            
-            # 特殊处理HEIC格式
-            if ext == '.heic':
-                try:
-                    print(f"\n开始处理HEIC文件: {image_path}")
-                    
-                    # 从文件名获取日期
-                    filename = os.path.basename(image_path)
-                    try:
-                        # 尝试从文件名解析日期（格式：YYYY-MM-DD HHMMSS）
-                        date_str = filename.split('.')[0]  # 移除扩展名
-                        date_obj = datetime.strptime(date_str, '%Y-%m-%d %H%M%S')
-                        print(f"从文件名获取到日期: {date_str}")
-                        return date_obj.strftime('%Y-%m-%d %H:%M:%S')
-                    except ValueError as e:
-                        print(f"从文件名解析日期失败: {str(e)}")
-                    
-                    # 使用HeifFile直接读取HEIC文件
-                    try:
-                        heif_file = HeifFile(image_path)
-                        print("成功打开HEIC文件")
-                        
-                        # 尝试从元数据中获取日期
-                        metadata = heif_file.metadata
-                        if metadata:
-                            print("元数据内容:", metadata)
-                            
-                            # 尝试不同的日期标签
-                            date_tags = [
-                                'DateTimeOriginal',
-                                'DateTimeDigitized',
-                                'DateTime',
-                                'CreateDate',
-                                'ModifyDate',
-                                'DateCreated',
-                                'DateModified',
-                                'DateTimeCreated',
-                                'DateTimeModified',
-                                'ContentCreateDate',
-                                'ContentModifyDate'
-                            ]
-                            
-                            for tag in date_tags:
-                                if tag in metadata:
-                                    date_str = metadata[tag]
-                                    print(f"找到日期标签 {tag}: {date_str}")
-                                    try:
-                                        # 尝试不同的日期格式
-                                        for fmt in [
-                                            '%Y:%m:%d %H:%M:%S',      # 2024:05:18 19:26:20
-                                            '%Y-%m-%d %H:%M:%S',      # 2024-05-18 19:26:20
-                                            '%Y/%m/%d %H:%M:%S',      # 2024/05/18 19:26:20
-                                            '%Y:%m:%d %H:%M:%S%z',    # 2024:05:18 19:26:20+0800
-                                            '%Y-%m-%d %H:%M:%S%z',    # 2024-05-18 19:26:20+0800
-                                            '%Y/%m/%d %H:%M:%S%z',    # 2024/05/18 19:26:20+0800
-                                            '%Y:%m:%d %H:%M:%S.%f',   # 2024:05:18 19:26:20.123
-                                            '%Y-%m-%d %H:%M:%S.%f',   # 2024-05-18 19:26:20.123
-                                            '%Y/%m/%d %H:%M:%S.%f',   # 2024/05/18 19:26:20.123
-                                            '%Y:%m:%d %H:%M:%S.%f%z', # 2024:05:18 19:26:20.123+0800
-                                            '%Y-%m-%d %H:%M:%S.%f%z', # 2024-05-18 19:26:20.123+0800
-                                            '%Y/%m/%d %H:%M:%S.%f%z'  # 2024/05/18 19:26:20.123+0800
-                                        ]:
-                                            try:
-                                                date_obj = datetime.strptime(date_str, fmt)
-                                                print(f"成功解析日期: {date_str} -> {date_obj}")
-                                                return date_obj.strftime('%Y-%m-%d %H:%M:%S')
-                                            except ValueError:
-                                                continue
-                                    except Exception as e:
-                                        print(f"解析日期时出错: {str(e)}")
-                                        continue
-                        else:
-                            print("未找到元数据")
-                    except Exception as e:
-                        print(f"读取HEIC文件时出错: {str(e)}")
-                    
-                    return None
-                except Exception as e:
-                    print(f"处理HEIC文件 {image_path} 时出错: {str(e)}")
-                    return None
-            
-            # 处理其他格式
-            try:
-                image = Image.open(image_path)
-                if not hasattr(image, '_getexif') or image._getexif() is None:
-                    print(f"文件 {image_path} 没有EXIF数据")
-                    return None
-                    
-                exif = image._getexif()
-                date_info = None
-                
-                for tag_id in exif:
-                    tag = TAGS.get(tag_id, tag_id)
-                    if tag in self.date_tags:
-                        date_info = exif[tag_id]
-                        print(f"从EXIF数据中找到日期: {date_info}")
-                        break
-                        
-                return date_info
-            except Exception as e:
-                print(f"处理图片 {image_path} 时出错: {str(e)}")
-                return None
-                
-        except Exception as e:
-            print(f"处理图片 {image_path} 时出错: {str(e)}")
-            return None
+class ApplyMovesThread(QThread):
+    """执行移动计划线程：每个移动都记录在移动日志中，可以撤销"""
+    finished = pyqtSignal(list)
+    error = pyqtSignal(str)
 
-    def get_video_date(self, video_path):
-        """获取视频的创建媒体时间"""
-        if not self.has_ffmpeg or not self.ffprobe_path:
-            return None
-            
-        try:
-            # 使用ffprobe获取视频元数据
-            cmd = [
-                self.ffprobe_path,
-                '-v', 'quiet',
-                '-print_format', 'json',
-                '-show_format',
-                '-show_entries', 'format=tags',
-                video_path
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            if result.returncode != 0:
-                print(f"ffprobe处理视频失败: {result.stderr}")
-                return None
-                
-            # 解析ffprobe输出
-            metadata = json.loads(result.stdout)
-            
-            # 尝试获取创建媒体时间
-            tags = metadata.get('format', {}).get('tags', {})
-            creation_time = None
-            
-            # 尝试不同的标签名
-            for tag in ['creation_time', 'date', 'date_created', 'creation_date']:
-                if tag in tags:
-                    creation_time = tags[tag]
-                    break
-            
-            if creation_time:
-                try:
-                    # 尝试解析不同格式的日期
-                    for fmt in [
-                        '%Y-%m-%d %H:%M:%S',  # 2024-03-14 15:30:00
-                        '%Y-%m-%dT%H:%M:%S.%fZ',  # 2024-03-14T15:30:00.000Z
-                        '%Y-%m-%dT%H:%M:%S',  # 2024-03-14T15:30:00
-                        '%Y:%m:%d %H:%M:%S',  # 2024:03:14 15:30:00
-                        '%Y/%m/%d %H:%M:%S',  # 2024/03/14 15:30:00
-                        '%Y-%m-%d'  # 2024-03-14
-                    ]:
-                        try:
-                            date_obj = datetime.strptime(creation_time, fmt)
-                            return date_obj.strftime('%Y-%m-%d %H:%M:%S')
-                        except ValueError:
-                            continue
-                except Exception as e:
-                    print(f"解析视频日期失败: {str(e)}")
-                    pass
-                    
-            return None
-        except Exception as e:
-            print(f"处理视频 {video_path} 时出错: {str(e)}")
-            return None
+    def __init__(self, move_plan, journal_path, log_file):
+        super().__init__()
+        self.move_plan = move_plan
+        self.journal_path = journal_path
+        self.log_file = log_file
 
-    def get_video_bitrate(self, video_path):
-        """获取视频的比特率（kbps）"""
-        if not self.has_ffmpeg or not self.ffprobe_path:
-            return None
-            
+    def run(self):
         try:
-            # 使用ffprobe获取视频比特率
-            cmd = [
-                self.ffprobe_path,
-                '-v', 'quiet',
-                '-print_format', 'json',
-                '-show_format',
-                video_path
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            if result.returncode != 0:
-                print(f"ffprobe处理视频失败: {result.stderr}")
-                return None
-                
-            # 解析ffprobe输出
-            metadata = json.loads(result.stdout)
-            
-            # 获取比特率（bps）并转换为kbps
-            bitrate = metadata.get('format', {}).get('bit_rate')
-            if bitrate:
-                return int(int(bitrate) / 1000)  # 转换为kbps
-                
-            return None
+            result = apply_move_plan(self.move_plan, self.journal_path)
+            lines = format_apply_result(result, self.journal_path)
+            write_to_log(self.log_file, '\n'.join(lines))
+            self.finished.emit(lines)
         except Exception as e:
-            print(f"获取视频比特率时出错: {str(e)}")
-            return None
+            print(f"执行移动计划出错: {str(e)}")
+            self.error.emit(f"执行移动计划时出错: {str(e)}")
 
-    def check_media(self, file_path):
-        """检查媒体文件的日期信息"""
-        ext = os.path.splitext(file_path)[1].lower()
-        
-        if ext in self.supported_image_formats:
-            date = self.get_exif_date(file_path)
-            if date:
-                try:
-                    # 尝试解析日期字符串
-                    if isinstance(date, str):
-                        # 如果已经是字符串格式，直接返回
-                        return True, date, "拍摄日期", None
-                    else:
-                        # 如果是其他格式，尝试解析
-                        date_obj = datetime.strptime(date, '%Y:%m:%d %H:%M:%S')
-                        return True, date_obj.strftime('%Y-%m-%d %H:%M:%S'), "拍摄日期", None
-                except ValueError as e:
-                    print(f"解析日期字符串时出错: {str(e)}")
-                    return False, "日期格式无效", "拍摄日期", None
-            return False, "未找到拍摄日期信息", "拍摄日期", None
-            
-        elif ext in self.supported_video_formats:
-            if not self.has_ffmpeg:
-                return False, "未安装ffmpeg，无法处理视频", "创建媒体时间", None
-            date = self.get_video_date(file_path)
-            bitrate = self.get_video_bitrate(file_path)
-            if date:
-                return True, date, "创建媒体时间", bitrate
-            return False, "未找到创建媒体时间", "创建媒体时间", bitrate
-            
-        return False, "不支持的文件格式", "未知", None
-
-    def move_to_no_info(self, file_path):
-        """移动文件到NoInformation或NoVideoInformation文件夹"""
-        try:
-            ext = os.path.splitext(file_path)[1].lower()
-            target_dir = NO_VIDEO_INFO_DIR if ext in self.supported_video_formats else NO_INFO_DIR
-            
-            file_name = os.path.basename(file_path)
-            new_path = os.path.join(target_dir, file_name)
-            
-            # 如果文件已存在，添加序号
-            counter = 1
-            name, ext = os.path.splitext(file_name)
-            while os.path.exists(new_path):
-                new_path = os.path.join(target_dir, f"{name}_{counter}{ext}")
-                counter += 1
-                
-            shutil.move(file_path, new_path)
-            return new_path
-        except Exception as e:
-            print(f"移动文件 {file_path} 时出错: {str(e)}")
-            return None
+class UndoMovesThread(QThread):
+    """撤销移动线程：按移动日志把文件移回原位置"""
+    finished = pyqtSignal(int, int)
+    error = pyqtSignal(str)
 
-    def move_to_big_video(self, video_path):
-        """移动大视频到BigVideo文件夹"""
-        try:
-            file_name = os.path.basename(video_path)
-            new_path = os.path.join(BIG_VIDEO_DIR, file_name)
-            
-            # 如果文件已存在，添加序号
-            counter = 1
-            name, ext = os.path.splitext(file_name)
-            while os.path.exists(new_path):
-                new_path = os.path.join(BIG_VIDEO_DIR, f"{name}_{counter}{ext}")
-                counter += 1
-                
-            shutil.move(video_path, new_path)
-            return new_path
-        except Exception as e:
-            print(f"移动视频 {video_path} 时出错: {str(e)}")
-            return None
-
-    def scan_directory(self, move_no_info=False, move_big_video=False):
-        """扫描目录中的所有媒体文件"""
-        results = {
-            'with_date': [],
-            'without_date': [],
-            'big_videos': [],  # 新增：大视频列表
-            'livp_files': []   # 新增：LIVP文件列表
-        }
-        
-        for root, _, files in os.walk(self.directory):
-            # 跳过NoInformation、NoVideoInformation和BigVideo文件夹
-            if NO_INFO_DIR in root or NO_VIDEO_INFO_DIR in root or BIG_VIDEO_DIR in root:
-                continue
-                
-            for file in files:
-                file_path = os.path.join(root, file)
-                ext = os.path.splitext(file)[1].lower()
-                
-                # 统计LIVP文件
-                if ext == '.livp':
-                    results['livp_files'].append(file_path)
-                    continue
-                
-                if ext in self.supported_image_formats or ext in self.supported_video_formats:
-                    has_date, date_info, date_type, bitrate = self.check_media(file_path)
-                    
-                    # 检查视频比特率
-                    if ext in self.supported_video_formats and move_big_video and bitrate and bitrate > self.bitrate_threshold:
-                        new_path = self.move_to_big_video(file_path)
-                        if new_path:
-                            results['big_videos'].append((new_path, f"{bitrate} kbps"))
-                        continue
-                    
-                    if has_date:
-                        results['with_date'].append((file_path, date_info, date_type, bitrate))
-                    else:
-                        if move_no_info:
-                            new_path = self.move_to_no_info(file_path)
-                            if new_path:
-                                results['without_date'].append((new_path, date_info, date_type, bitrate))
-                        else:
-                            results['without_date'].append((file_path, date_info, date_type, bitrate))
-        
-        return results
+    def __init__(self, journal_path):
+        super().__init__()
+        self.journal_path = journal_path
 
-    def print_report(self, results, log_file):
-        """打印检查报告"""
+    def run(self):
         try:
-            current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            
-            # 准备报告内容
-            report = []
-            report.append(f"\n=== 媒体文件日期检查报告 ({current_time}) ===")
-            report.append(f"检查目录: {self.directory}")
-            
-            # 显示LIVP文件信息
-            if results['livp_files']:
-                report.append(f"\nLIVP文件 ({len(results['livp_files'])}个):")
-                for path in results['livp_files']:
-                    report.append(f"文件: {path}")
-                    report.append("")
-            
-            # 显示大视频信息
-            if results['big_videos']:
-                report.append(f"\n大视频文件 ({len(results['big_videos'])}个):")
-                for path, bitrate in results['big_videos']:
-                    report.append(f"文件: {path}")
-                    report.append(f"比特率: {bitrate}")
-                    report.append("")
-            
-            report.append(f"\n有日期信息的文件 ({len(results['with_date'])}个):")
-            for path, date, date_type, bitrate in results['with_date']:
-                report.append(f"文件: {path}")
-                report.append(f"日期类型: {date_type}")
-                report.append(f"日期: {date}")
-                if bitrate:
-                    report.append(f"比特率: {bitrate} kbps")
-                report.append("")
-            
-            report.append(f"\n没有日期信息的文件 ({len(results['without_date'])}个):")
-            for path, reason, date_type, bitrate in results['without_date']:
-                report.append(f"文件: {path}")
-                report.append(f"日期类型: {date_type}")
-                report.append(f"原因: {reason}")
-                if bitrate:
-                    report.append(f"比特率: {bitrate} kbps")
-                report.append("")
-            
-            report.append("\n" + "="*50 + "\n")
-            
-            # 写入日志文件
-            write_to_log(log_file, '\n'.join(report))
-            
-            return '\n'.join(report)
-                
+            undone, failed = undo_moves(self.journal_path)
+            self.finished.emit(undone, len(failed))
         except Exception as e:
-            error_msg = f"生成报告时出错: {str(e)}"
-            print(error_msg)
-            write_to_log(log_file, error_msg)
-            return error_msg
+            print(f"撤销移动出错: {str(e)}")
+            self.error.emit(f"撤销移动时出错: {str(e)}")
 
 class MediaCheckerGUI(QMainWindow):
     def __init__(self):
         super().__init__()
         self.check_results = None
+        self.last_journal = None  # 上次执行移动计划的移动日志，用于撤销
         self.initUI()
 
     def initUI(self):
@@ -632,8 +244,31 @@ class MediaCheckerGUI(QMainWindow):
         self.move_checkbox = QCheckBox("自动移动无日期文件到对应文件夹")
         self.move_big_video_checkbox = QCheckBox("自动移动比特率大于20000kbps的视频到BigVideo文件夹")
         
+        # 目录未变化时复用上次的文件名列表（FAT/exFAT盘上目录修改时间不可靠，可能漏掉新文件）
+        self.skip_dirs_checkbox = QCheckBox("跳过未变化的目录")
+        
+        # 分阶段扫描：预读、解析和ffprobe在各自的线程中重叠进行，适合网络存储等读取延迟高的目录
+        self.staged_checkbox = QCheckBox("分阶段扫描（网络存储）")
+        
+        # 移动计划选项：扫描时只生成计划，确认后再批量移动（可以撤销）
+        self.plan_moves_checkbox = QCheckBox("先生成移动计划，确认后再移动")
+        self.plan_moves_checkbox.setChecked(True)
+        
         options_layout.addWidget(self.move_checkbox)
         options_layout.addWidget(self.move_big_video_checkbox)
+        options_layout.addWidget(self.skip_dirs_checkbox)
+        options_layout.addWidget(self.staged_checkbox)
+        options_layout.addWidget(self.plan_moves_checkbox)
+        
+        # 并行进程数选项（1表示串行扫描）
+        workers_layout = QHBoxLayout()
+        workers_layout.addWidget(QLabel("并行检查进程数:"))
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, MAX_SCAN_WORKERS)
+        self.workers_spin.setValue(min(os.cpu_count() or 1, MAX_SCAN_WORKERS))
+        workers_layout.addWidget(self.workers_spin)
+        workers_layout.addStretch()
+        options_layout.addLayout(workers_layout)
         options_group.setLayout(options_layout)
         left_layout.addWidget(options_group)
 
@@ -641,12 +276,31 @@ class MediaCheckerGUI(QMainWindow):
         buttons_layout = QHBoxLayout()
         self.check_btn = QPushButton("开始检查")
         self.check_btn.clicked.connect(self.start_check)
+        self.estimate_btn = QPushButton("快速估算")
+        self.estimate_btn.clicked.connect(self.start_estimate)
+        self.cancel_btn = QPushButton("取消检查")
+        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.clicked.connect(self.cancel_check)
         self.update_dates_btn = QPushButton("修改文件创建日期")
         self.update_dates_btn.clicked.connect(self.update_file_dates)
         buttons_layout.addWidget(self.check_btn)
+        buttons_layout.addWidget(self.estimate_btn)
+        buttons_layout.addWidget(self.cancel_btn)
         buttons_layout.addWidget(self.update_dates_btn)
         left_layout.addLayout(buttons_layout)
 
+        # 执行已保存的移动计划、撤销上次移动的按钮
+        moves_layout = QHBoxLayout()
+        self.apply_plan_btn = QPushButton("执行移动计划")
+        self.apply_plan_btn.clicked.connect(self.open_move_plan)
+        self.undo_btn = QPushButton("撤销上次移动")
+        self.undo_btn.setEnabled(False)
+        self.undo_btn.clicked.connect(self.undo_last_moves)
+        moves_layout.addWidget(self.apply_plan_btn)
+        moves_layout.addWidget(self.undo_btn)
+        moves_layout.addStretch()
+        left_layout.addLayout(moves_layout)
+
         # 标签页
         self.tab_widget = QTabWidget()
         
@@ -665,10 +319,25 @@ class MediaCheckerGUI(QMainWindow):
         self.big_video_text.setReadOnly(True)
         self.tab_widget.addTab(self.big_video_text, "大视频文件")
         
-        # LIVP文件标签页
+        # 无法读取的LIVP文件标签页
         self.livp_text = QTextEdit()
         self.livp_text.setReadOnly(True)
-        self.tab_widget.addTab(self.livp_text, "LIVP文件")
+        self.tab_widget.addTab(self.livp_text, "无法读取的LIVP")
+        
+        # ffprobe超时或崩溃的视频标签页
+        self.probe_failed_text = QTextEdit()
+        self.probe_failed_text.setReadOnly(True)
+        self.tab_widget.addTab(self.probe_failed_text, "探测失败")
+        
+        # 结果类别与对应的文本框
+        self.result_texts = {
+            'with_date': self.with_info_text,
+            'without_date': self.without_info_text,
+            'big_videos': self.big_video_text,
+            'livp_files': self.livp_text,
+            'probe_failed': self.probe_failed_text,
+        }
+        self.partial_counts = {category: 0 for category in self.result_texts}
         
         left_layout.addWidget(self.tab_widget)
 
@@ -689,7 +358,8 @@ class MediaCheckerGUI(QMainWindow):
             ("有日期信息", "0"),
             ("无日期信息", "0"),
             ("大视频文件", "0"),
-            ("LIVP文件", "0"),
+            ("无法读取的LIVP", "0"),
+            ("探测失败", "0"),
             ("文件总数", "0")
         ]
         
@@ -727,15 +397,26 @@ class MediaCheckerGUI(QMainWindow):
                 f"当前查找路径：{FFMPEG_DIR}")
             return
 
+        # 上次同一目录的扫描被取消或中断时，询问是否从中断处继续
+        resume = False
+        if not self.planning_moves() and MediaDateChecker(self.dir_path.text()).has_checkpoint(
+                self.move_checkbox.isChecked(), self.move_big_video_checkbox.isChecked()):
+            reply = QMessageBox.question(self, "继续扫描",
+                "该目录有未完成的扫描，是否从上次中断处继续？\n选择“否”将重新开始扫描。",
+                QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+            resume = reply == QMessageBox.Yes
+
         self.progress_bar.setRange(0, 0)
         self.check_btn.setEnabled(False)
         self.update_dates_btn.setEnabled(False)
+        self.estimate_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
 
-        # 清空所有文本框
-        self.with_info_text.clear()
-        self.without_info_text.clear()
-        self.big_video_text.clear()
-        self.livp_text.clear()
+        # 清空所有文本框和统计信息
+        for text_widget in self.result_texts.values():
+            text_widget.clear()
+        self.partial_counts = {category: 0 for category in self.result_texts}
+        self.update_stats(new_scan_results())
 
         # 创建新的日志文件
         current_log_file = get_log_file()
@@ -745,65 +426,186 @@ class MediaCheckerGUI(QMainWindow):
         self.check_thread = CheckThread(
             self.dir_path.text(),
             self.move_checkbox.isChecked(),
-            self.move_big_video_checkbox.isChecked()
+            self.move_big_video_checkbox.isChecked(),
+            self.workers_spin.value(),
+            current_log_file,
+            resume,
+            self.skip_dirs_checkbox.isChecked(),
+            self.staged_checkbox.isChecked(),
+            MovePlan() if self.planning_moves() else None
         )
+        self.check_thread.partial.connect(self.show_partial_results)
         self.check_thread.finished.connect(self.update_results)
         self.check_thread.error.connect(self.show_error)
         self.check_thread.start()
 
-    def update_results(self, results):
-        print("更新结果...")
-        self.check_results = results
+    def cancel_check(self):
+        self.cancel_btn.setEnabled(False)
+        self.check_thread.cancel()
+
+    def planning_moves(self):
+        """本次检查是否只生成移动计划（勾选了移动选项和“先生成移动计划”）"""
+        return self.plan_moves_checkbox.isChecked() and (
+            self.move_checkbox.isChecked() or self.move_big_video_checkbox.isChecked())
+
+    def confirm_move_plan(self, move_plan, plan_path, log_file):
+        """扫描生成移动计划后询问是否立即执行（选择“否”时可以审阅计划文件后再执行）"""
+        reply = QMessageBox.question(self, "移动计划",
+            f"共有 {len(move_plan)} 个文件需要移动，计划已保存在:\n{plan_path}\n\n"
+            "是否现在执行？选择“否”可以审阅或删减计划文件后，用“执行移动计划”按钮执行。",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+        if reply == QMessageBox.Yes:
+            self.start_apply(move_plan, plan_path, log_file)
+
+    def open_move_plan(self):
+        """选择保存的移动计划文件并执行（中断过的计划继续执行未完成的部分）"""
+        plan_path, _ = QFileDialog.getOpenFileName(self, "选择移动计划", LOG_DIR,
+                                                   "移动计划 (move_plan_*.jsonl);;所有文件 (*.*)")
+        if not plan_path:
+            return
+        try:
+            move_plan = MovePlan.load(plan_path)
+        except (OSError, ValueError, KeyError) as e:
+            QMessageBox.critical(self, "错误", f"读取移动计划失败: {str(e)}")
+            return
+        self.start_apply(move_plan, plan_path, get_log_file())
+
+    def start_apply(self, move_plan, plan_path, log_file):
+        self.progress_bar.setRange(0, 0)
+        self.check_btn.setEnabled(False)
+        self.apply_plan_btn.setEnabled(False)
+        self.undo_btn.setEnabled(False)
+
+        self.apply_thread = ApplyMovesThread(move_plan, journal_path_for_plan(plan_path), log_file)
+        self.apply_thread.finished.connect(self.show_apply_result)
+        self.apply_thread.error.connect(self.show_error)
+        self.apply_thread.start()
+
+    def show_apply_result(self, lines):
         self.progress_bar.setRange(0, 1)
         self.progress_bar.setValue(1)
         self.check_btn.setEnabled(True)
-        self.update_dates_btn.setEnabled(True)
+        self.apply_plan_btn.setEnabled(True)
+        self.last_journal = self.apply_thread.journal_path
+        self.undo_btn.setEnabled(True)
+        QMessageBox.information(self, "移动完成", '\n'.join(lines[:2]))
+
+    def undo_last_moves(self):
+        """把上次执行移动计划移动的文件移回原位置"""
+        if not self.last_journal:
+            return
+        reply = QMessageBox.question(self, "撤销移动", "是否把上次移动的文件全部移回原位置？",
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if reply != QMessageBox.Yes:
+            return
+        self.progress_bar.setRange(0, 0)
+        self.undo_btn.setEnabled(False)
+        self.apply_plan_btn.setEnabled(False)
 
-        # 更新统计信息
+        self.undo_thread = UndoMovesThread(self.last_journal)
+        self.undo_thread.finished.connect(self.show_undo_result)
+        self.undo_thread.error.connect(self.show_error)
+        self.undo_thread.start()
+
+    def show_undo_result(self, undone, failed):
+        self.progress_bar.setRange(0, 1)
+        self.progress_bar.setValue(1)
+        self.apply_plan_btn.setEnabled(True)
+        message = f"已移回 {undone} 个文件"
+        if failed:
+            message += f"，{failed} 个文件移回失败（见控制台输出）"
+        QMessageBox.information(self, "撤销完成", message)
+
+    def start_estimate(self):
+        if not self.dir_path.text():
+            QMessageBox.warning(self, "警告", "请选择媒体文件目录")
+            return
+
+        self.progress_bar.setRange(0, 0)
+        self.check_btn.setEnabled(False)
+        self.estimate_btn.setEnabled(False)
+
+        current_log_file = get_log_file()
+        self.log_label.setText(f"当前估算记录保存在: {current_log_file}")
+
+        self.estimate_thread = EstimateThread(self.dir_path.text(), self.workers_spin.value(), current_log_file,
+                                              skip_unchanged_dirs=self.skip_dirs_checkbox.isChecked())
+        self.estimate_thread.finished.connect(self.show_estimate)
+        self.estimate_thread.error.connect(self.show_error)
+        self.estimate_thread.start()
+
+    def show_estimate(self, report):
+        self.progress_bar.setRange(0, 1)
+        self.progress_bar.setValue(1)
+        self.check_btn.setEnabled(True)
+        self.estimate_btn.setEnabled(True)
+        QMessageBox.information(self, "快速估算", report.strip().strip('='))
+
+    def show_partial_results(self, batch):
+        """在扫描过程中追加显示一批结果并更新统计"""
+        for result in batch:
+            text_widget = self.result_texts[result.category]
+            text_widget.moveCursor(QTextCursor.End)
+            text_widget.insertPlainText(format_scan_result(result))
+            self.partial_counts[result.category] += 1
+        
+        self.stats_labels["有日期信息"].setText(str(self.partial_counts['with_date']))
+        self.stats_labels["无日期信息"].setText(str(self.partial_counts['without_date']))
+        self.stats_labels["大视频文件"].setText(str(self.partial_counts['big_videos']))
+        self.stats_labels["无法读取的LIVP"].setText(str(self.partial_counts['livp_files']))
+        self.stats_labels["探测失败"].setText(str(self.partial_counts['probe_failed']))
+        total_files = (self.partial_counts['with_date'] + self.partial_counts['without_date']
+                       + self.partial_counts['livp_files'] + self.partial_counts['probe_failed'])
+        self.stats_labels["文件总数"].setText(str(total_files))
+
+    def update_stats(self, results):
+        """更新统计信息"""
         self.stats_labels["有日期信息"].setText(str(len(results['with_date'])))
         self.stats_labels["无日期信息"].setText(str(len(results['without_date'])))
         self.stats_labels["大视频文件"].setText(str(len(results['big_videos'])))
-        self.stats_labels["LIVP文件"].setText(str(len(results['livp_files'])))
-        total_files = len(results['with_date']) + len(results['without_date']) + len(results['livp_files'])
+        self.stats_labels["无法读取的LIVP"].setText(str(len(results['livp_files'])))
+        self.stats_labels["探测失败"].setText(str(len(results['probe_failed'])))
+        total_files = (len(results['with_date']) + len(results['without_date'])
+                       + len(results['livp_files']) + len(results['probe_failed']))
         self.stats_labels["文件总数"].setText(str(total_files))
 
-        # 更新各个标签页的内容
-        self.update_tab_content(self.with_info_text, results['with_date'], "有日期信息的文件")
-        self.update_tab_content(self.without_info_text, results['without_date'], "没有日期信息的文件")
-        self.update_tab_content(self.big_video_text, results['big_videos'], "大视频文件")
-        self.update_tab_content(self.livp_text, results['livp_files'], "LIVP文件")
+    def update_results(self, results):
+        print("更新结果...")
+        self.check_results = results
+        self.progress_bar.setRange(0, 1)
+        self.progress_bar.setValue(1)
+        self.check_btn.setEnabled(True)
+        self.update_dates_btn.setEnabled(True)
+        self.estimate_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
 
-        # 生成并写入报告
-        checker = MediaDateChecker(self.dir_path.text())
-        current_log_file = self.log_label.text().replace("当前检查记录保存在: ", "") # 获取当前的log文件路径
-        checker.print_report(results, current_log_file)
+        # 更新统计信息
+        self.update_stats(results)
+
+        # 文件列表已在扫描过程中显示，这里只补充各标签页的标题
+        titles = {
+            'with_date': "有日期信息的文件",
+            'without_date': "没有日期信息的文件",
+            'big_videos': "大视频文件",
+            'livp_files': "无法读取的LIVP文件",
+            'probe_failed': "探测失败的视频",
+        }
+        for category, text_widget in self.result_texts.items():
+            title = titles[category]
+            if results[category]:
+                cursor = text_widget.textCursor()
+                cursor.movePosition(QTextCursor.Start)
+                cursor.insertText(f"{title} ({len(results[category])}个):\n\n")
+                text_widget.moveCursor(QTextCursor.Start)
+            else:
+                text_widget.append(f"没有找到{title}\n")
+        if self.check_thread.checker.cancelled:
+            QMessageBox.information(self, "已取消", "扫描已取消，下次检查该目录时可以从中断处继续")
+        elif self.check_thread.move_plan:
+            self.confirm_move_plan(self.check_thread.move_plan, self.check_thread.plan_path,
+                                   self.check_thread.log_file)
         print("结果更新完成.")
 
-    def update_tab_content(self, text_widget, items, title):
-        if items:
-            text_widget.append(f"{title} ({len(items)}个):\n")
-            for item in items:
-                if isinstance(item, tuple):
-                    if len(item) == 2:  # 大视频文件
-                        path, bitrate = item
-                        text_widget.append(f"文件: {path}\n")
-                        text_widget.append(f"比特率: {bitrate}\n")
-                    else:  # 有日期或无日期文件
-                        path, info, date_type, bitrate = item
-                        text_widget.append(f"文件: {path}\n")
-                        text_widget.append(f"日期类型: {date_type}\n")
-                        if isinstance(info, str):
-                            text_widget.append(f"日期: {info}\n")
-                        else:
-                            text_widget.append(f"原因: {info}\n")
-                        if bitrate:
-                            text_widget.append(f"比特率: {bitrate} kbps\n")
-                else:  # LIVP文件
-                    text_widget.append(f"文件: {item}\n")
-                text_widget.append("")
-        else:
-            text_widget.append(f"没有找到{title}\n")
-
     def update_file_dates(self):
         if not self.check_results:
             QMessageBox.warning(self, "警告", "请先运行检查")
@@ -814,23 +616,7 @@ class MediaCheckerGUI(QMainWindow):
         # 处理有日期信息的文件
         for path, date, date_type, _ in self.check_results['with_date']:
             try:
-                date_formats = [
-                    '%Y-%m-%d %H:%M:%S',
-                    '%Y:%m:%d %H:%M:%S',
-                    '%Y/%m/%d %H:%M:%S',
-                    '%Y-%m-%d %H%M%S',
-                    '%Y:%m:%d %H%M%S',
-                    '%Y/%m/%d %H%M%S'
-                ]
-                
-                date_obj = None
-                for fmt in date_formats:
-                    try:
-                        date_obj = datetime.strptime(date, fmt)
-                        break
-                    except ValueError:
-                        continue
-                
+                date_obj = parse_date(date, 'check_result')
                 if date_obj:
                     files_to_update.append((path, date_obj, date_type))
             except Exception as e:
@@ -838,27 +624,12 @@ class MediaCheckerGUI(QMainWindow):
                 continue
 
         # 处理无日期信息的文件
+        name_dates = NameDateMatcher()
         for path, reason, date_type, _ in self.check_results['without_date']:
             try:
-                filename = os.path.basename(path)
-                date_str = filename.split('.')[0]
-                
-                date_formats = [
-                    '%Y-%m-%d %H%M%S',
-                    '%Y:%m:%d %H%M%S',
-                    '%Y/%m/%d %H%M%S'
-                ]
-                
-                date_obj = None
-                for fmt in date_formats:
-                    try:
-                        date_obj = datetime.strptime(date_str, fmt)
-                        break
-                    except ValueError:
-                        continue
-                
-                if date_obj:
-                    files_to_update.append((path, date_obj, "文件名日期"))
+                named = name_dates.match_filename(path)
+                if named:
+                    files_to_update.append((path, named.date, "文件名日期"))
             except Exception as e:
                 print(f"处理文件名日期时出错: {path} - {str(e)}")
                 continue
@@ -900,7 +671,10 @@ class MediaCheckerGUI(QMainWindow):
         self.progress_bar.setRange(0, 1)
         self.progress_bar.setValue(1)
         self.check_btn.setEnabled(True)
+        self.estimate_btn.setEnabled(True)
         self.update_dates_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
+        self.apply_plan_btn.setEnabled(True)
         QMessageBox.critical(self, "错误", error_msg)
 
 def main():
@@ -911,4 +685,6 @@ def main():
     sys.exit(app.exec_())
 
 if __name__ == "__main__":
+    # 打包为exe后进程池需要freeze_support才能正常启动工作进程
+    multiprocessing.freeze_support()
     main() 
\ No newline at end of file
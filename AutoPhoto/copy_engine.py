@@ -0,0 +1,304 @@
+import os
+import sys
+import mmap
+import errno
+import shutil
+import struct
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+try:
+    import win32file
+except ImportError:  # 非Windows系统
+    win32file = None
+
+# 复制过程中的临时文件后缀，校验通过后才改为目标名称
+PARTIAL_SUFFIX = '.part'
+# 普通读写复制和校验时的缓冲区大小（按页对齐分配）
+COPY_BUFFER_SIZE = 8 * 1024 * 1024
+# copy_file_range/sendfile每次调用复制的字节数
+KERNEL_COPY_CHUNK = 64 * 1024 * 1024
+# Linux的FICLONE ioctl（btrfs、xfs等支持reflink的文件系统上共享数据块，不复制数据）
+FICLONE = 0x40049409
+# 同一对设备之间同时进行的复制数：机械硬盘并发读写会来回寻道，只复制一个；SSD可以并发
+HDD_COPY_WORKERS = 1
+SSD_COPY_WORKERS = 4
+# Windows下查询磁盘是否有寻道延迟（机械硬盘）：IOCTL_STORAGE_QUERY_PROPERTY，
+# PropertyId为StorageDeviceSeekPenaltyProperty，QueryType为PropertyStandardQuery
+IOCTL_STORAGE_QUERY_PROPERTY = 0x002D1400
+STORAGE_DEVICE_SEEK_PENALTY_PROPERTY = 7
+PROPERTY_STANDARD_QUERY = 0
+
+# 内核复制不支持这对文件（跨文件系统、文件系统不支持等）时的错误码，改用下一种方式
+_UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTTY,
+                       errno.EPERM, errno.EBADF}
+
+class CopyVerifyError(OSError):
+    """复制后的文件与源文件内容不一致"""
+
+def _reflink(src_fd, dst_fd):
+    """尝试reflink克隆，成功返回True"""
+    if fcntl is None or not sys.platform.startswith('linux'):
+        return False
+    try:
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        return True
+    except OSError as e:
+        if e.errno in _UNSUPPORTED_ERRNOS:
+            return False
+        raise
+
+def _copy_file_range(src_fd, dst_fd, size):
+    """用copy_file_range复制（数据不经过用户空间），不支持时返回False"""
+    if not hasattr(os, 'copy_file_range'):
+        return False
+    offset = 0
+    while offset < size:
+        try:
+            copied = os.copy_file_range(src_fd, dst_fd, min(KERNEL_COPY_CHUNK, size - offset), offset, offset)
+        except OSError as e:
+            if offset == 0 and e.errno in _UNSUPPORTED_ERRNOS:
+                return False
+            raise
+        if copied == 0:
+            break
+        offset += copied
+    return True
+
+def _sendfile(src_fd, dst_fd, size):
+    """用sendfile复制（Linux下目标可以是普通文件），不支持时返回False"""
+    if not hasattr(os, 'sendfile') or not sys.platform.startswith('linux'):
+        return False
+    offset = 0
+    os.lseek(dst_fd, 0, os.SEEK_SET)
+    while offset < size:
+        try:
+            sent = os.sendfile(dst_fd, src_fd, offset, min(KERNEL_COPY_CHUNK, size - offset))
+        except OSError as e:
+            if offset == 0 and e.errno in _UNSUPPORTED_ERRNOS:
+                return False
+            raise
+        if sent == 0:
+            break
+        offset += sent
+    return True
+
+def _copy_buffered(src, dst):
+    """用页对齐的大缓冲区逐块读写复制"""
+    buffer = mmap.mmap(-1, COPY_BUFFER_SIZE)
+    try:
+        view = memoryview(buffer)
+        src.seek(0)
+        dst.seek(0)
+        while True:
+            n = src.readinto(view)
+            if not n:
+                break
+            dst.write(view[:n])
+        view.release()
+    finally:
+        buffer.close()
+
+def _copy_data(source, target):
+    """把source的内容复制到新文件target，返回使用的复制方式"""
+    if win32file is not None:
+        # Windows自带的复制引擎对大文件使用无缓冲I/O
+        win32file.CopyFile(source, target, True)
+        return 'CopyFile'
+    with open(source, 'rb', buffering=0) as src, open(target, 'xb', buffering=0) as dst:
+        size = os.fstat(src.fileno()).st_size
+        if _reflink(src.fileno(), dst.fileno()):
+            return 'reflink'
+        if _copy_file_range(src.fileno(), dst.fileno(), size):
+            method = 'copy_file_range'
+        elif _sendfile(src.fileno(), dst.fileno(), size):
+            method = 'sendfile'
+        else:
+            _copy_buffered(src, dst)
+            method = 'buffered'
+        os.fsync(dst.fileno())
+        return method
+
+def file_checksum(path, drop_cache=False):
+    """流式计算文件的SHA-1
+
+    drop_cache为True时先请求系统丢弃该文件的页缓存（仅支持posix_fadvise的系统），
+    使校验读取的是磁盘上的数据，而不是刚写入时留在内存中的副本。
+    """
+    h = hashlib.sha1()
+    buffer = mmap.mmap(-1, COPY_BUFFER_SIZE)
+    try:
+        view = memoryview(buffer)
+        with open(path, 'rb', buffering=0) as f:
+            if drop_cache and hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+            while True:
+                n = f.readinto(view)
+                if not n:
+                    break
+                h.update(view[:n])
+        view.release()
+    finally:
+        buffer.close()
+    return h.hexdigest()
+
+def verify_copy(source, target):
+    """比较源文件和副本的大小和SHA-1，不一致时抛出CopyVerifyError
+
+    两个文件通常在不同的磁盘上，在两个线程中同时读取，耗时接近读取较大一侧的时间。
+    """
+    if os.path.getsize(source) != os.path.getsize(target):
+        raise CopyVerifyError(errno.EIO, f"复制后大小不一致: {target}")
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        source_sum = executor.submit(file_checksum, source)
+        target_sum = file_checksum(target, drop_cache=True)
+        if source_sum.result() != target_sum:
+            raise CopyVerifyError(errno.EIO, f"复制后校验失败: {target}")
+
+def copy_file(source, target, verify=True):
+    """复制文件并保留时间戳，不覆盖已有文件，返回使用的复制方式
+
+    依次尝试reflink克隆、copy_file_range、sendfile，最后用大缓冲区读写（Windows下使用CopyFile）。
+    数据先写入临时文件，校验通过后才改为target，失败时删除临时文件并抛出异常。
+    reflink与源文件共享数据块，只比较大小。
+    """
+    partial = target + PARTIAL_SUFFIX
+    if os.path.lexists(partial):
+        os.remove(partial)
+    try:
+        method = _copy_data(source, partial)
+        shutil.copystat(source, partial)
+        if method == 'reflink':
+            if os.path.getsize(source) != os.path.getsize(partial):
+                raise CopyVerifyError(errno.EIO, f"复制后大小不一致: {target}")
+        elif verify:
+            verify_copy(source, partial)
+        if os.path.lexists(target):
+            raise FileExistsError(errno.EEXIST, f"目标文件已存在: {target}")
+        os.replace(partial, target)
+    except BaseException:
+        if os.path.lexists(partial):
+            os.remove(partial)
+        raise
+    return method
+
+def move_file(source, target, verify=True):
+    """移动文件，不覆盖已有文件，返回使用的方式
+
+    同一文件系统内用os.rename；跨设备时用copy_file复制并校验，成功后才删除源文件。
+    """
+    if os.path.lexists(target):
+        raise FileExistsError(errno.EEXIST, f"目标文件已存在: {target}")
+    try:
+        os.rename(source, target)
+        return 'rename'
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    method = copy_file(source, target, verify)
+    os.remove(source)
+    return method
+
+def _is_rotational_windows(path):
+    """Windows下按卷查询寻道延迟（DEVICE_SEEK_PENALTY_DESCRIPTOR.IncursSeekPenalty），
+    网络路径、没有盘符或驱动不支持该查询（部分USB移动硬盘）时返回None
+    """
+    drive = os.path.splitdrive(os.path.abspath(path))[0]
+    if len(drive) != 2 or drive[1] != ':':
+        return None
+    try:
+        # 只查询属性，不需要读写权限（普通用户也可以打开卷）
+        handle = win32file.CreateFile(
+            f'\\\\.\\{drive}', 0, win32file.FILE_SHARE_READ | win32file.FILE_SHARE_WRITE,
+            None, win32file.OPEN_EXISTING, 0, None
+        )
+    except Exception:
+        return None
+    try:
+        query = struct.pack('<III', STORAGE_DEVICE_SEEK_PENALTY_PROPERTY, PROPERTY_STANDARD_QUERY, 0)
+        descriptor = win32file.DeviceIoControl(handle, IOCTL_STORAGE_QUERY_PROPERTY, query, 12)
+        # DEVICE_SEEK_PENALTY_DESCRIPTOR：Version、Size（DWORD），IncursSeekPenalty（BOOLEAN）
+        return struct.unpack_from('<II?', descriptor)[2]
+    except Exception:
+        return None
+    finally:
+        handle.Close()
+
+def is_rotational(path):
+    """path所在的磁盘是否为机械硬盘：True/False，无法判断时返回None
+
+    Linux读取sysfs中的queue/rotational，Windows通过win32file查询卷的寻道延迟。
+    """
+    if win32file is not None:
+        return _is_rotational_windows(path)
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        dev = os.stat(path).st_dev
+        block = os.path.realpath(f'/sys/dev/block/{os.major(dev)}:{os.minor(dev)}')
+        # 分区没有queue目录，使用所在磁盘的
+        for candidate in (block, os.path.dirname(block)):
+            flag = os.path.join(candidate, 'queue', 'rotational')
+            if os.path.exists(flag):
+                with open(flag, 'r') as f:
+                    return f.read().strip() == '1'
+    except (OSError, ValueError):
+        pass
+    return None
+
+class CopyScheduler:
+    """跨设备复制的线程池，按 (源设备, 目标设备) 分别限制同时进行的复制数
+
+    两端都是SSD时最多SSD_COPY_WORKERS个，否则（包括无法判断，如USB移动硬盘）只复制一个，
+    避免机械硬盘并发读写时来回寻道。workers指定时所有设备都使用这个并发数。
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers or max(HDD_COPY_WORKERS, SSD_COPY_WORKERS))
+        self.lock = threading.Lock()
+        self.limits = {}     # (源设备, 目标设备) → BoundedSemaphore
+        self.rotational = {}  # 设备 → is_rotational结果
+
+    def _device_rotational(self, dev, path):
+        if dev not in self.rotational:
+            self.rotational[dev] = is_rotational(path)
+        return self.rotational[dev]
+
+    def _limit_for(self, source, target_dir):
+        src_dev = os.stat(source).st_dev
+        dst_dev = os.stat(target_dir).st_dev
+        with self.lock:
+            key = (src_dev, dst_dev)
+            limit = self.limits.get(key)
+            if limit is None:
+                if self.workers:
+                    count = self.workers
+                elif (self._device_rotational(src_dev, source) is False
+                      and self._device_rotational(dst_dev, target_dir) is False):
+                    count = SSD_COPY_WORKERS
+                else:
+                    count = HDD_COPY_WORKERS
+                limit = self.limits[key] = threading.BoundedSemaphore(count)
+            return limit
+
+    def _run(self, func, source, target, verify):
+        with self._limit_for(source, os.path.dirname(target)):
+            return func(source, target, verify)
+
+    def submit_move(self, source, target, verify=True):
+        """提交一次跨设备移动，返回Future（结果为复制方式）"""
+        return self.executor.submit(self._run, move_file, source, target, verify)
+
+    def submit_copy(self, source, target, verify=True):
+        """提交一次复制（保留源文件），返回Future（结果为复制方式）"""
+        return self.executor.submit(self._run, copy_file, source, target, verify)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,97 @@
+import re
+from datetime import datetime, timedelta, timezone
+
+# 秒之后可选的小数部分和时区（Z、+08:00、+0800）
+_FRACTION_AND_ZONE = r'(?:[.,](?P<fraction>\d{1,9}))?\s*(?P<zone>Z|[+-]\d{2}:?\d{2})?'
+_TIME = r'(?P<hour>\d{1,2}):(?P<minute>\d{2})(?::(?P<second>\d{2}))?' + _FRACTION_AND_ZONE
+_MONTHS = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12,
+}
+
+# 支持的日期写法：名称 → 预编译的整串匹配正则（用命名分组取出各字段）
+LAYOUTS = {
+    # EXIF：2024:05:18 19:26:20（可带小数秒和时区）
+    'exif': re.compile(r'(?P<year>\d{4}):(?P<month>\d{1,2}):(?P<day>\d{1,2})[ T]' + _TIME),
+    # ISO 8601：2024-05-18T19:26:20.000Z、2024-05-18 19:26:20+08:00
+    'iso': re.compile(r'(?P<year>\d{4})-(?P<month>\d{1,2})-(?P<day>\d{1,2})[ T]' + _TIME),
+    # 斜杠：2024/05/18 19:26:20
+    'slash': re.compile(r'(?P<year>\d{4})/(?P<month>\d{1,2})/(?P<day>\d{1,2})[ T]' + _TIME),
+    # 紧凑时间：2024-05-18 192620（也接受 : 和 / 分隔的日期）
+    'compact': re.compile(
+        r'(?P<year>\d{4})[-:/](?P<month>\d{2})[-:/](?P<day>\d{2}) (?P<hour>\d{2})(?P<minute>\d{2})(?P<second>\d{2})'
+    ),
+    # 只有日期：2024-05-18
+    'date': re.compile(r'(?P<year>\d{4})-(?P<month>\d{1,2})-(?P<day>\d{1,2})'),
+    # C语言ctime：MON JAN 01 12:00:00 2024（AVI的IDIT常用）
+    'ctime': re.compile(
+        r'(?:[A-Za-z]{3}\s+)?(?P<month_name>[A-Za-z]{3})\s+(?P<day>\d{1,2})\s+'
+        r'(?P<hour>\d{1,2}):(?P<minute>\d{2}):(?P<second>\d{2})\s+(?P<year>\d{4})'
+    ),
+}
+
+# 每个来源上一次匹配成功的写法，下次优先尝试（同一来源的日期写法通常一致）
+_last_layout = {}
+
+def _build(match):
+    """把匹配结果转换为datetime，数值不合法（如2月30日）时返回None"""
+    fields = match.groupdict()
+    if fields.get('month_name'):
+        month = _MONTHS.get(fields['month_name'].lower())
+        if month is None:
+            return None
+    else:
+        month = int(fields['month'])
+
+    fraction = fields.get('fraction')
+    microsecond = int(fraction[:6].ljust(6, '0')) if fraction else 0
+    tzinfo = None
+    zone = fields.get('zone')
+    if zone == 'Z':
+        tzinfo = timezone.utc
+    elif zone:
+        sign = -1 if zone[0] == '-' else 1
+        digits = zone[1:].replace(':', '')
+        tzinfo = timezone(sign * timedelta(hours=int(digits[:2]), minutes=int(digits[2:])))
+
+    try:
+        return datetime(
+            int(fields['year']), month, int(fields['day']),
+            int(fields.get('hour') or 0), int(fields.get('minute') or 0), int(fields.get('second') or 0),
+            microsecond, tzinfo=tzinfo
+        )
+    except ValueError:
+        return None
+
+def parse_date(text, source=None, layouts=None):
+    """把日期字符串解析为datetime，无法识别时返回None
+
+    source用于区分日期来源（如 'exif'、'ffprobe'），同一来源上次成功的写法会被优先尝试；
+    layouts可以限制只接受其中几种写法。带时区的日期返回带tzinfo的datetime。
+    """
+    if not text:
+        return None
+    text = text.strip().rstrip('\x00')
+    names = layouts or LAYOUTS
+    last = _last_layout.get(source)
+    if last in names:
+        match = LAYOUTS[last].fullmatch(text)
+        if match:
+            return _build(match)
+    for name in names:
+        if name == last:
+            continue
+        match = LAYOUTS[name].fullmatch(text)
+        if match:
+            _last_layout[source] = name
+            return _build(match)
+    return None
+
+def format_date(date_obj):
+    """格式化为程序统一使用的 YYYY-MM-DD HH:MM:SS（保留原时区的本地时间）"""
+    return date_obj.strftime('%Y-%m-%d %H:%M:%S')
+
+def normalize_date(text, source=None, layouts=None):
+    """解析日期字符串并格式化为 YYYY-MM-DD HH:MM:SS，无法识别时返回None"""
+    date_obj = parse_date(text, source, layouts)
+    return format_date(date_obj) if date_obj else None
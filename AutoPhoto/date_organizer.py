@@ -0,0 +1,250 @@
+import os
+import errno
+import sqlite3
+from collections import namedtuple
+from itertools import groupby
+from name_index import TargetNameIndex
+from copy_engine import CopyScheduler, move_file
+
+# 整理方式：hardlink —— 同一文件系统内建立硬链接（跨设备时复制）；
+# copy —— 复制（支持reflink的文件系统上克隆，不占额外空间）；move —— 移动原文件
+ORGANIZE_HARDLINK = 'hardlink'
+ORGANIZE_COPY = 'copy'
+ORGANIZE_MOVE = 'move'
+ORGANIZE_MODES = (ORGANIZE_HARDLINK, ORGANIZE_COPY, ORGANIZE_MOVE)
+
+# 默认的目录结构（strftime格式，/分隔子文件夹）：2024/05
+DEFAULT_TREE_PATTERN = '%Y/%m'
+# 整理记录数据库，保存在目标根目录中
+ORGANIZE_INDEX_NAME = '.autophoto_organize.db'
+# 每批处理的文件数（按源目录分组，每批结束时提交一次整理记录）
+ORGANIZE_BATCH_SIZE = 500
+
+# 整理结果：placed —— 新放入目录树；relocated —— 日期变化后在目录树内移到新位置；
+# unchanged —— 日期和文件都未变化，跳过；removed —— 源文件已删除，清理了目录树中的副本；
+# failed —— [(源路径, 原因), ...]；methods —— 各放置方式（link、rename、reflink、sendfile……）的次数
+OrganizeResult = namedtuple('OrganizeResult', ['placed', 'relocated', 'unchanged', 'removed', 'failed', 'methods'])
+
+# 整理记录中的一行
+_Placement = namedtuple('_Placement', ['source', 'target', 'date', 'size', 'mtime_ns', 'mode'])
+
+class OrganizeIndex:
+    """整理记录（SQLite）：每个源文件放到了目录树中的哪里，以及当时的日期、大小和修改时间"""
+
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS placed ('
+            'source TEXT PRIMARY KEY, target TEXT, date TEXT, size INTEGER, mtime_ns INTEGER, mode TEXT)'
+        )
+        self.conn.commit()
+
+    def load(self):
+        """返回全部记录：源路径 → _Placement"""
+        rows = self.conn.execute('SELECT source, target, date, size, mtime_ns, mode FROM placed')
+        return {row[0]: _Placement(*row) for row in rows}
+
+    def save(self, placements, removed):
+        self.conn.executemany('INSERT OR REPLACE INTO placed VALUES (?, ?, ?, ?, ?, ?)', placements)
+        self.conn.executemany('DELETE FROM placed WHERE source = ?', [(source,) for source in removed])
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+class DateTreeOrganizer:
+    """把有日期的文件按日期放入目标根目录下的目录树（默认 YYYY/MM）
+
+    每次整理都记录在根目录的整理记录中，再次整理时只处理新文件、日期变化的文件
+    （在目录树内改名移动到新位置）和内容变化的文件（重新放置），其余文件不再触碰；
+    硬链接和复制方式下，源文件已被删除的副本也会从目录树中清理；因此变空的 YYYY/MM 文件夹随后删除。
+    """
+
+    def __init__(self, root, pattern=DEFAULT_TREE_PATTERN, mode=ORGANIZE_HARDLINK, copy_workers=None,
+                 batch_size=ORGANIZE_BATCH_SIZE):
+        if mode not in ORGANIZE_MODES:
+            raise ValueError(f"不支持的整理方式: {mode}")
+        self.root = os.path.abspath(root)
+        self.pattern = pattern
+        self.mode = mode
+        self.copy_workers = copy_workers
+        self.batch_size = batch_size
+        self.names = TargetNameIndex()
+        self.vacated = set()  # 本次整理中有文件被移走或删除的目录树文件夹
+
+    def target_dir_for(self, date_obj):
+        """日期对应的目标文件夹"""
+        return os.path.join(self.root, *date_obj.strftime(self.pattern).split('/'))
+
+    def _in_tree(self, path):
+        return os.path.normcase(os.path.abspath(path)).startswith(os.path.normcase(self.root) + os.sep)
+
+    def _place(self, source, target, scheduler):
+        """按整理方式把source放到target，返回放置方式或Future（跨设备复制）"""
+        if self.mode == ORGANIZE_MOVE:
+            return move_file(source, target)
+        if self.mode == ORGANIZE_HARDLINK:
+            try:
+                os.link(source, target)
+                return 'link'
+            except OSError as e:
+                # 跨设备或文件系统不支持硬链接时改为复制（Windows下FAT/exFAT的CreateHardLink失败映射为EINVAL）
+                if e.errno not in (errno.EXDEV, errno.EPERM, errno.EOPNOTSUPP, errno.EMLINK, errno.EINVAL):
+                    raise
+        return scheduler.submit_copy(source, target)
+
+    def _remove_target(self, placement):
+        """删除目录树中由整理生成的副本（移动方式下目录树中的就是原文件，不删除）"""
+        if placement.mode != ORGANIZE_MOVE and os.path.lexists(placement.target):
+            os.remove(placement.target)
+            self.names.release(placement.target)
+            self.vacated.add(os.path.dirname(placement.target))
+
+    def _prune_empty(self):
+        """删除因移走或清理文件而变空的目录树文件夹（逐级向上，直到根目录或非空的文件夹）"""
+        for directory in sorted(self.vacated, key=len, reverse=True):
+            while self._in_tree(directory):
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    # 不为空或已被删除
+                    break
+                directory = os.path.dirname(directory)
+        self.vacated = set()
+
+    def organize(self, items, source_dir=None, on_progress=None):
+        """整理 (源路径, datetime) 列表，返回OrganizeResult
+
+        source_dir为这次扫描的目录时，记录中位于该目录下、源文件已不存在的副本会被清理。
+        位于目标根目录中的源文件（根目录在扫描目录内时会被扫描到）：移动方式下按新日期在目录树内调整，
+        其他方式下是整理生成的副本，跳过。on_progress(已处理数, 总数) 在每批结束后调用。
+        """
+        os.makedirs(self.root, exist_ok=True)
+        index = OrganizeIndex(os.path.join(self.root, ORGANIZE_INDEX_NAME))
+        scheduler = CopyScheduler(self.copy_workers)
+        known = index.load()
+        by_target = {os.path.normcase(p.target): p for p in known.values()}
+        placed = relocated = unchanged = removed = 0
+        failed = []
+        methods = {}
+        seen = set()
+
+        def count(method):
+            methods[method] = methods.get(method, 0) + 1
+
+        items = sorted(items, key=lambda item: item[0])
+        total = len(items)
+        done = 0
+        try:
+            # 同一源目录的文件连续处理，每批最多batch_size个
+            for _, group in groupby(items, key=lambda item: os.path.dirname(item[0])):
+                group = list(group)
+                for start in range(0, len(group), self.batch_size):
+                    batch = group[start:start + self.batch_size]
+                    saved = []
+                    copies = []
+                    for source, date_obj in batch:
+                        seen.add(source)
+                        date_text = date_obj.strftime('%Y-%m-%d %H:%M:%S')
+                        target_dir = self.target_dir_for(date_obj)
+                        try:
+                            if self._in_tree(source):
+                                if self.mode != ORGANIZE_MOVE or by_target.get(os.path.normcase(source)) is None:
+                                    unchanged += 1
+                                    continue
+                                # 移动方式下目录树中的文件：按记录找回源路径，日期变化时在树内移动
+                                previous = by_target[os.path.normcase(source)]
+                                source_key = previous.source
+                            else:
+                                # 移动方式下目录树之外的文件都是新文件（之前的同名文件已被移走）
+                                previous = known.get(source) if self.mode != ORGANIZE_MOVE else None
+                                source_key = source
+                            st = os.stat(source)
+                            if previous is not None and os.path.lexists(previous.target):
+                                same_file = previous.size == st.st_size and previous.mtime_ns == st.st_mtime_ns
+                                if same_file and os.path.dirname(previous.target) == target_dir:
+                                    unchanged += 1
+                                    continue
+                                if same_file or self.mode == ORGANIZE_MOVE:
+                                    # 只是日期变化：在目录树内改名移动，不重新复制
+                                    os.makedirs(target_dir, exist_ok=True)
+                                    target = self.names.reserve(target_dir, os.path.basename(previous.target))
+                                    try:
+                                        move_file(previous.target, target)
+                                    except Exception:
+                                        self.names.release(target)
+                                        raise
+                                    self.names.release(previous.target)
+                                    self.vacated.add(os.path.dirname(previous.target))
+                                    saved.append(_Placement(source_key, target, date_text, st.st_size,
+                                                            st.st_mtime_ns, previous.mode))
+                                    relocated += 1
+                                    count('rename')
+                                    continue
+                                # 内容变化：删除旧副本后重新放置
+                                self._remove_target(previous)
+                            os.makedirs(target_dir, exist_ok=True)
+                            target = self.names.reserve(target_dir, os.path.basename(source))
+                            try:
+                                method = self._place(source, target, scheduler)
+                            except Exception:
+                                self.names.release(target)
+                                raise
+                            placement = _Placement(source, target, date_text, st.st_size, st.st_mtime_ns, self.mode)
+                            if isinstance(method, str):
+                                saved.append(placement)
+                                placed += 1
+                                count(method)
+                            else:
+                                copies.append((placement, method))
+                        except Exception as e:
+                            failed.append((source, str(e)))
+                            print(f"整理文件 {source} 时出错: {str(e)}")
+                    for placement, future in copies:
+                        try:
+                            count(future.result())
+                            saved.append(placement)
+                            placed += 1
+                        except Exception as e:
+                            self.names.release(placement.target)
+                            failed.append((placement.source, str(e)))
+                            print(f"整理文件 {placement.source} 时出错: {str(e)}")
+                    index.save(saved, [])
+                    done += len(batch)
+                    if on_progress:
+                        on_progress(done, total)
+
+            # 清理源文件已删除的副本
+            if source_dir and self.mode != ORGANIZE_MOVE:
+                prefix = os.path.normcase(os.path.abspath(source_dir)) + os.sep
+                stale = []
+                for source, placement in known.items():
+                    if (source not in seen and os.path.normcase(source).startswith(prefix)
+                            and not os.path.exists(source)):
+                        try:
+                            self._remove_target(placement)
+                            stale.append(source)
+                        except OSError as e:
+                            failed.append((source, str(e)))
+                index.save([], stale)
+                removed = len(stale)
+            self._prune_empty()
+        finally:
+            scheduler.shutdown()
+            index.close()
+        return OrganizeResult(placed, relocated, unchanged, removed, failed, methods)
+
+def format_organize_result(result, root):
+    """生成整理后的报告行"""
+    methods = ', '.join(f"{name} {count}" for name, count in sorted(result.methods.items()))
+    lines = [
+        f"按日期整理到: {root}",
+        f"新放入 {result.placed} 个, 日期变化移到新位置 {result.relocated} 个, 未变化 {result.unchanged} 个, "
+        f"清理已删除文件的副本 {result.removed} 个, 失败 {len(result.failed)} 个",
+    ]
+    if methods:
+        lines.append(f"放置方式: {methods}")
+    for source, reason in result.failed:
+        lines.append(f"整理失败: {source} - {reason}")
+    return lines
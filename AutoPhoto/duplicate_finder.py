@@ -0,0 +1,217 @@
+import os
+import hashlib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from copy_engine import file_checksum
+from scan_walker import file_identity
+
+# 同时计算摘要的线程数（主要在等待磁盘，线程数不宜太多，以免机械硬盘来回寻道）
+HASH_WORKERS = 4
+# 每个线程最多排队的文件数：所有组的文件连续提交，已提交未完成的文件数不超过 线程数 × 这个值
+HASH_QUEUE_PER_WORKER = 4
+# 第二阶段读取的文件头和文件尾的字节数
+EDGE_BYTES = 64 * 1024
+
+# 保留策略：newest —— 保留修改时间最新的一份；preferred_root —— 优先保留位于首选目录中的一份
+KEEP_NEWEST = 'newest'
+KEEP_PREFERRED_ROOT = 'preferred_root'
+
+# 一组内容相同的文件：size为文件大小，digest为完整SHA-1，paths按路径排序
+DuplicateSet = namedtuple('DuplicateSet', ['size', 'digest', 'paths'])
+
+# 查找结果：sets为DuplicateSet列表（按浪费的空间从大到小），其余为各阶段统计：
+# files —— 参与比较的文件数（硬链接只算一个）；size_candidates —— 与其他文件大小相同的文件数；
+# edge_hashed/full_hashed —— 计算了头尾摘要/完整摘要的文件数；
+# bytes_read —— 读取过的字节数（同一文件读了头尾又读完整文件时只计一次）；
+# total_bytes —— 所有文件的总大小；errors —— [(路径, 原因), ...]
+DuplicateReport = namedtuple('DuplicateReport', [
+    'sets', 'files', 'size_candidates', 'edge_hashed', 'full_hashed', 'bytes_read', 'total_bytes', 'errors'
+])
+
+def edge_digest(path, size, edge_bytes=EDGE_BYTES):
+    """对文件头尾各edge_bytes字节计算SHA-1，返回 (摘要, 读取的字节数)
+
+    文件不超过2 * edge_bytes时读取的就是整个文件，摘要可以直接作为完整摘要。
+    """
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        head = f.read(edge_bytes)
+        h.update(head)
+        read = len(head)
+        if size > 2 * edge_bytes:
+            f.seek(-edge_bytes, os.SEEK_END)
+            tail = f.read(edge_bytes)
+        else:
+            tail = f.read()
+        h.update(tail)
+        read += len(tail)
+    return h.hexdigest(), read
+
+def _unique_files(group, errors):
+    """同一个文件的多个硬链接（设备和inode相同）只保留一个，不算作重复
+
+    只对大小相同的候选文件获取文件ID（Windows下每个文件需要额外stat一次）。
+    """
+    seen = set()
+    unique = []
+    for entry in group:
+        try:
+            key = file_identity(entry)
+        except OSError as e:
+            errors.append((entry.path, str(e)))
+            continue
+        if key[1] and key in seen:
+            continue
+        seen.add(key)
+        unique.append(entry)
+    return unique
+
+def _hash_all(executor, func, groups, errors, max_in_flight):
+    """把各组的文件连续提交到线程池，按完成顺序产出 (组序号, 文件条目, 结果)
+
+    不等一组算完再提交下一组，小组（常见的只有两三个文件）也不会让其余线程空闲；
+    同时提交的文件不超过max_in_flight个。读取失败的文件记入errors，不产出。
+    """
+    pending = {}
+
+    def collect():
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            index, entry = pending.pop(future)
+            try:
+                yield index, entry, future.result()
+            except OSError as e:
+                errors.append((entry.path, str(e)))
+                print(f"计算文件摘要 {entry.path} 时出错: {str(e)}")
+
+    for index, group in enumerate(groups):
+        for entry in group:
+            if len(pending) >= max_in_flight:
+                yield from collect()
+            pending[executor.submit(func, entry)] = (index, entry)
+    while pending:
+        yield from collect()
+
+def find_duplicates(entries, workers=HASH_WORKERS, edge_bytes=EDGE_BYTES):
+    """在ScanEntry中查找内容相同的文件，返回DuplicateReport
+
+    分三个阶段，每个阶段只处理上一阶段仍然冲突的文件：
+    1. 按遍历时得到的文件大小分组（不读取文件）；
+    2. 大小相同的文件计算头尾各edge_bytes字节的摘要；
+    3. 头尾摘要仍相同的文件计算完整的流式摘要（小文件在第2阶段已读完整个文件，跳过）。
+    摘要在最多workers个线程中计算，每个阶段所有组的文件连续提交（见_hash_all）；
+    读取失败的文件记入errors，不参与比较。
+    """
+    by_size = {}
+    files = 0
+    total_bytes = 0
+    errors = []
+    for entry in entries:
+        if entry.size == 0:
+            continue
+        files += 1
+        total_bytes += entry.size
+        by_size.setdefault(entry.size, []).append(entry)
+    size_groups = []
+    for group in by_size.values():
+        if len(group) < 2:
+            continue
+        unique = _unique_files(group, errors)
+        files -= len(group) - len(unique)
+        total_bytes -= (len(group) - len(unique)) * group[0].size
+        if len(unique) > 1:
+            size_groups.append(unique)
+
+    bytes_read = 0
+    edge_hashed = 0
+    full_hashed = 0
+    sets = []
+    workers = max(1, workers)
+    max_in_flight = workers * HASH_QUEUE_PER_WORKER
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        by_edge = [{} for _ in size_groups]
+        edge_read = {}
+        for index, entry, (digest, read) in _hash_all(
+                executor, lambda e: edge_digest(e.path, e.size, edge_bytes), size_groups, errors, max_in_flight):
+            edge_hashed += 1
+            bytes_read += read
+            edge_read[entry.path] = read
+            by_edge[index].setdefault(digest, []).append(entry)
+        full_candidates = []
+        for groups in by_edge:
+            for digest, matches in groups.items():
+                if len(matches) < 2:
+                    continue
+                if matches[0].size <= 2 * edge_bytes:
+                    sets.append(DuplicateSet(matches[0].size, digest, sorted(e.path for e in matches)))
+                else:
+                    full_candidates.append(matches)
+
+        by_digest = [{} for _ in full_candidates]
+        for index, entry, digest in _hash_all(
+                executor, lambda e: file_checksum(e.path), full_candidates, errors, max_in_flight):
+            full_hashed += 1
+            # 头尾已在第2阶段计入，每个文件的字节只计一次，bytes_read不会超过total_bytes
+            bytes_read += entry.size - edge_read[entry.path]
+            by_digest[index].setdefault(digest, []).append(entry)
+        for groups in by_digest:
+            for digest, matches in groups.items():
+                if len(matches) > 1:
+                    sets.append(DuplicateSet(matches[0].size, digest, sorted(e.path for e in matches)))
+
+    sets.sort(key=lambda s: (-s.size * (len(s.paths) - 1), s.paths[0]))
+    return DuplicateReport(sets, files, sum(len(g) for g in size_groups), edge_hashed, full_hashed,
+                           bytes_read, total_bytes, errors)
+
+def _under(path, root):
+    return os.path.normcase(os.path.abspath(path)).startswith(os.path.normcase(os.path.abspath(root)) + os.sep)
+
+def choose_keeper(duplicate_set, policy=KEEP_NEWEST, preferred_roots=()):
+    """在一组重复文件中选出要保留的一份
+
+    newest：修改时间最新的一份；preferred_root：位于preferred_roots中最靠前的目录下的一份，
+    都不在首选目录中或同一目录下有多份时再取最新的。
+    """
+    def mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return -1
+
+    def rank(path):
+        if policy == KEEP_PREFERRED_ROOT:
+            for index, root in enumerate(preferred_roots):
+                if _under(path, root):
+                    return index
+            return len(preferred_roots)
+        return 0
+
+    return min(duplicate_set.paths, key=lambda path: (rank(path), -mtime(path), path))
+
+def redundant_files(report, policy=KEEP_NEWEST, preferred_roots=()):
+    """每组重复文件中除保留的一份之外的文件：[(多余的文件, 保留的文件), ...]"""
+    extras = []
+    for duplicate_set in report.sets:
+        keeper = choose_keeper(duplicate_set, policy, preferred_roots)
+        extras.extend((path, keeper) for path in duplicate_set.paths if path != keeper)
+    return extras
+
+def format_duplicate_report(report):
+    """生成重复文件报告行"""
+    wasted = sum(s.size * (len(s.paths) - 1) for s in report.sets)
+    skipped = 1 - report.bytes_read / report.total_bytes if report.total_bytes else 0.0
+    lines = [
+        f"比较文件 {report.files} 个, 大小相同 {report.size_candidates} 个, "
+        f"计算头尾摘要 {report.edge_hashed} 个, 计算完整摘要 {report.full_hashed} 个",
+        f"读取 {report.bytes_read / (1024 * 1024):.1f} MB / 共 {report.total_bytes / (1024 * 1024):.1f} MB "
+        f"(未读取 {skipped:.1%})",
+        f"重复文件 {len(report.sets)} 组, 多余的副本占用 {wasted / (1024 * 1024):.1f} MB",
+    ]
+    for duplicate_set in report.sets:
+        lines.append("")
+        lines.append(f"大小: {duplicate_set.size} 字节, SHA-1: {duplicate_set.digest}")
+        for path in duplicate_set.paths:
+            lines.append(f"文件: {path}")
+    for path, reason in report.errors:
+        lines.append(f"读取失败: {path} - {reason}")
+    return lines
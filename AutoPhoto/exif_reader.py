@@ -0,0 +1,296 @@
+import struct
+
+# 只关心的三个日期标签及其所在位置
+TAG_DATETIME = 0x0132            # IFD0: DateTime（修改时间）
+TAG_EXIF_IFD = 0x8769            # IFD0: 指向Exif子IFD的偏移
+TAG_DATETIME_ORIGINAL = 0x9003   # ExifIFD: DateTimeOriginal（原始拍摄时间）
+TAG_DATETIME_DIGITIZED = 0x9004  # ExifIFD: DateTimeDigitized（数字化时间）
+
+# 每个文件先读入的字节数；日期标签几乎总在这个范围内，超出时再按偏移补读
+HEADER_READ_SIZE = 16 * 1024
+# 防止损坏文件导致无限循环的上限
+MAX_JPEG_SEGMENTS = 64
+MAX_IFD_ENTRIES = 1024
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+TIFF_MAGIC = (b'II*\x00', b'MM\x00*')
+# HEIF/HEIC容器ftyp中可能出现的品牌
+HEIF_BRANDS = (b'heic', b'heix', b'heim', b'heis', b'hevc', b'hevx', b'mif1', b'msf1', b'avif')
+MAX_BOXES = 256
+
+class ExifFormatError(ValueError):
+    """文件结构无法识别或已损坏，需要交给PIL等完整解析器处理"""
+
+class ByteSource:
+    """按文件偏移读取数据：优先使用已读入的缓冲区，超出部分再定位读取"""
+
+    def __init__(self, fp, buf, start=0):
+        self.fp = fp
+        self.buf = buf
+        self.start = start  # buf[0]在文件中的偏移
+
+    def read(self, offset, size):
+        rel = offset - self.start
+        if rel >= 0 and rel + size <= len(self.buf):
+            return self.buf[rel:rel + size]
+        if self.fp is None:
+            raise ExifFormatError("数据被截断")
+        self.fp.seek(offset)
+        data = self.fp.read(size)
+        if len(data) < size:
+            raise ExifFormatError("数据被截断")
+        return data
+
+def _read_ifd(src, base, endian, ifd_offset, wanted):
+    """读取一个IFD中指定的标签，返回 {标签: (类型, 数量, 4字节值字段)}"""
+    count = struct.unpack(endian + 'H', src.read(base + ifd_offset, 2))[0]
+    if count > MAX_IFD_ENTRIES:
+        raise ExifFormatError("IFD条目数异常")
+    data = src.read(base + ifd_offset + 2, count * 12)
+    found = {}
+    for i in range(0, count * 12, 12):
+        tag = struct.unpack(endian + 'H', data[i:i + 2])[0]
+        if tag in wanted:
+            type_id, num = struct.unpack(endian + 'HI', data[i + 2:i + 8])
+            found[tag] = (type_id, num, data[i + 8:i + 12])
+    return found
+
+def _ascii_value(src, base, endian, field):
+    """读取ASCII类型标签的值，空值或全零日期返回None"""
+    type_id, num, value = field
+    if type_id != 2 or num == 0 or num > 64:
+        return None
+    if num <= 4:
+        raw = value[:num]
+    else:
+        raw = src.read(base + struct.unpack(endian + 'I', value)[0], num)
+    text = raw.split(b'\x00', 1)[0].decode('ascii', errors='replace').strip()
+    if not text or text.startswith('0000'):
+        return None
+    return text
+
+def parse_tiff_date(src, base):
+    """从TIFF结构（EXIF数据块本身就是TIFF结构）中读取日期
+
+    按 DateTimeOriginal → DateTimeDigitized → DateTime 的顺序返回第一个有效值；
+    结构有效但没有日期时返回None。
+    """
+    header = src.read(base, 8)
+    if header[:2] == b'II':
+        endian = '<'
+    elif header[:2] == b'MM':
+        endian = '>'
+    else:
+        raise ExifFormatError("TIFF字节序标记无效")
+    magic, ifd0_offset = struct.unpack(endian + 'HI', header[2:8])
+    if magic != 42:
+        raise ExifFormatError("TIFF标识无效")
+
+    ifd0 = _read_ifd(src, base, endian, ifd0_offset, (TAG_DATETIME, TAG_EXIF_IFD))
+    if TAG_EXIF_IFD in ifd0:
+        exif_offset = struct.unpack(endian + 'I', ifd0[TAG_EXIF_IFD][2])[0]
+        exif_ifd = _read_ifd(src, base, endian, exif_offset, (TAG_DATETIME_ORIGINAL, TAG_DATETIME_DIGITIZED))
+        for tag in (TAG_DATETIME_ORIGINAL, TAG_DATETIME_DIGITIZED):
+            if tag in exif_ifd:
+                date = _ascii_value(src, base, endian, exif_ifd[tag])
+                if date:
+                    return date
+    if TAG_DATETIME in ifd0:
+        return _ascii_value(src, base, endian, ifd0[TAG_DATETIME])
+    return None
+
+def _jpeg_exif_date(src):
+    """遍历JPEG标记段，只解析第一个Exif APP1段"""
+    pos = 2
+    for _ in range(MAX_JPEG_SEGMENTS):
+        marker = src.read(pos, 4)
+        if marker[0] != 0xFF:
+            raise ExifFormatError("JPEG标记无效")
+        code = marker[1]
+        if code == 0xFF:  # 填充字节
+            pos += 1
+            continue
+        if code in (0xD9, 0xDA):  # EOI/SOS之后不再有元数据段
+            return None
+        length = struct.unpack('>H', marker[2:4])[0]
+        if code == 0xE1 and src.read(pos + 4, 6) == b'Exif\x00\x00':
+            return parse_tiff_date(src, pos + 10)
+        pos += 2 + length
+    return None
+
+def _png_exif_date(src):
+    """遍历PNG数据块，解析IDAT之前的eXIf块"""
+    pos = 8
+    while True:
+        length, chunk_type = struct.unpack('>I4s', src.read(pos, 8))
+        if chunk_type == b'eXIf':
+            return parse_tiff_date(src, pos + 8)
+        if chunk_type in (b'IDAT', b'IEND'):
+            return None
+        pos += 12 + length
+
+def is_heif_ftyp(buf):
+    """根据ftyp盒子的主品牌和兼容品牌判断是否为HEIF/HEIC容器"""
+    ftyp_size = min(struct.unpack('>I', buf[:4])[0], len(buf), 128)
+    brands = [buf[8:12]] + [buf[i:i + 4] for i in range(16, ftyp_size - 3, 4)]
+    return any(brand in HEIF_BRANDS for brand in brands)
+
+def _iter_boxes(src, start, end=None):
+    """遍历ISOBMFF盒子，产出 (类型, 内容起始偏移, 盒子结束偏移)；end为None时读到所需盒子为止"""
+    pos = start
+    for _ in range(MAX_BOXES):
+        if end is not None and pos + 8 > end:
+            return
+        size, box_type = struct.unpack('>I4s', src.read(pos, 8))
+        header_size = 8
+        if size == 1:
+            size = struct.unpack('>Q', src.read(pos + 8, 8))[0]
+            header_size = 16
+        elif size == 0:
+            if end is None:
+                raise ExifFormatError("无法确定盒子大小")
+            size = end - pos
+        if size < header_size:
+            raise ExifFormatError("盒子大小无效")
+        yield box_type, pos + header_size, pos + size
+        pos += size
+
+def _read_uint(data, offset, size):
+    """读取大端的0/2/4/8字节无符号整数"""
+    if size == 0:
+        return 0, offset
+    fmt = {2: '>H', 4: '>I', 8: '>Q'}.get(size)
+    if fmt is None:
+        raise ExifFormatError("整数长度无效")
+    return struct.unpack(fmt, data[offset:offset + size])[0], offset + size
+
+def _exif_item_ids(src, body, end):
+    """解析iinf盒子，返回类型为Exif的项目ID"""
+    version = src.read(body, 1)[0]
+    pos = body + 4 + (2 if version == 0 else 4)
+    item_ids = []
+    for box_type, infe_body, infe_end in _iter_boxes(src, pos, end):
+        if box_type != b'infe':
+            continue
+        infe = src.read(infe_body, min(infe_end - infe_body, 14))
+        infe_version = infe[0]
+        if infe_version == 2:
+            item_id = struct.unpack('>H', infe[4:6])[0]
+            item_type = infe[8:12]
+        elif infe_version == 3:
+            item_id = struct.unpack('>I', infe[4:8])[0]
+            item_type = infe[10:14]
+        else:
+            continue
+        if item_type == b'Exif':
+            item_ids.append(item_id)
+    return item_ids
+
+def _item_locations(src, body, end):
+    """解析iloc盒子，返回 {项目ID: (构造方式, [(偏移, 长度), ...])}"""
+    data = src.read(body, end - body)
+    version = data[0]
+    offset_size = data[4] >> 4
+    length_size = data[4] & 0x0F
+    base_offset_size = data[5] >> 4
+    index_size = data[5] & 0x0F if version in (1, 2) else 0
+    pos = 6
+    if version < 2:
+        item_count, pos = _read_uint(data, pos, 2)
+    else:
+        item_count, pos = _read_uint(data, pos, 4)
+
+    locations = {}
+    for _ in range(item_count):
+        item_id, pos = _read_uint(data, pos, 2 if version < 2 else 4)
+        construction_method = 0
+        if version in (1, 2):
+            construction_method = struct.unpack('>H', data[pos:pos + 2])[0] & 0x0F
+            pos += 2
+        pos += 2  # data_reference_index
+        base_offset, pos = _read_uint(data, pos, base_offset_size)
+        extent_count, pos = _read_uint(data, pos, 2)
+        extents = []
+        for _ in range(extent_count):
+            if index_size:
+                _, pos = _read_uint(data, pos, index_size)
+            extent_offset, pos = _read_uint(data, pos, offset_size)
+            extent_length, pos = _read_uint(data, pos, length_size)
+            extents.append((base_offset + extent_offset, extent_length))
+        locations[item_id] = (construction_method, extents)
+    return locations
+
+def _heif_exif_date(src):
+    """在HEIC/HEIF容器中定位Exif项目并解析其中的日期，不解码图像"""
+    for box_type, body, end in _iter_boxes(src, 0):
+        if box_type == b'meta':
+            break
+    else:
+        raise ExifFormatError("未找到meta盒子")
+
+    item_ids = []
+    locations = {}
+    idat_start = None
+    for child_type, child_body, child_end in _iter_boxes(src, body + 4, end):
+        if child_type == b'iinf':
+            item_ids = _exif_item_ids(src, child_body, child_end)
+        elif child_type == b'iloc':
+            locations = _item_locations(src, child_body, child_end)
+        elif child_type == b'idat':
+            idat_start = child_body
+
+    for item_id in item_ids:
+        if item_id not in locations:
+            continue
+        construction_method, extents = locations[item_id]
+        if construction_method == 1:
+            if idat_start is None:
+                continue
+            extents = [(idat_start + offset, length) for offset, length in extents]
+        elif construction_method != 0:
+            continue
+        if not extents:
+            continue
+
+        if len(extents) == 1:
+            item_src = src
+            start = extents[0][0]
+        else:
+            # 多段存储时把各段拼接起来（Exif数据通常只有几十KB）
+            item_src = ByteSource(None, b''.join(src.read(offset, length) for offset, length in extents))
+            start = 0
+
+        # Exif项目以4字节的TIFF头偏移开头，后面通常是 "Exif\0\0"
+        tiff_offset = struct.unpack('>I', item_src.read(start, 4))[0]
+        base = start + 4 + tiff_offset
+        if item_src.read(base, 2) not in (b'II', b'MM') and item_src.read(start + 4, 6) == b'Exif\x00\x00':
+            base = start + 10
+        return parse_tiff_date(item_src, base)
+    return None
+
+def read_exif_date_from_file(fp):
+    """从已打开的二进制文件对象中读取EXIF日期（不解码像素，也不解析其余标签）
+    支持JPEG、TIFF、PNG以及HEIC/HEIF容器。
+
+    返回EXIF原始格式的日期字符串（如 2024:05:18 19:26:20）或None；
+    无法识别的文件结构会抛出ExifFormatError。
+    """
+    buf = fp.read(HEADER_READ_SIZE)
+    src = ByteSource(fp, buf)
+    try:
+        if buf[:2] == b'\xff\xd8':
+            return _jpeg_exif_date(src)
+        if buf[:4] in TIFF_MAGIC:
+            return parse_tiff_date(src, 0)
+        if buf[:8] == PNG_SIGNATURE:
+            return _png_exif_date(src)
+        if buf[4:8] == b'ftyp' and is_heif_ftyp(buf):
+            return _heif_exif_date(src)
+    except (struct.error, IndexError) as e:
+        raise ExifFormatError(f"EXIF结构损坏: {str(e)}")
+    raise ExifFormatError("无法识别的图片格式")
+
+def read_exif_date(path):
+    """读取JPEG/TIFF/PNG/HEIC文件的EXIF日期"""
+    with open(path, 'rb') as fp:
+        return read_exif_date_from_file(fp)
@@ -0,0 +1,167 @@
+import os
+import time
+import threading
+from collections import namedtuple
+
+# 提取方式的级别：同一级别内的提取方式得到的日期含义相同，可以按开销调整先后顺序；
+# 不同级别之间的顺序固定（可信的文件名日期总是先于文件内的日期）
+TIER_NAME = 0
+TIER_METADATA = 1
+
+# 一种日期提取方式：
+# name        —— 提取方式名称（写入缓存和报告）
+# tier        —— 级别（见上）
+# extensions  —— 适用的扩展名集合
+# prior_cost  —— 还没有统计数据时假定的单次耗时（秒）
+# run         —— run(路径, defer_probe) → (日期字符串或None, 比特率或None)；
+#                无法处理该文件时抛出ExtractorSkipped，交给下一个提取方式
+Extractor = namedtuple('Extractor', ['name', 'tier', 'extensions', 'prior_cost', 'run'])
+
+# 单个提取方式的统计：尝试次数、取得日期次数、跳过次数、累计耗时（秒）
+ExtractorRecord = namedtuple('ExtractorRecord', ['attempts', 'hits', 'skips', 'elapsed'])
+
+# 每次尝试的结果
+OUTCOME_HIT = 'hit'    # 取得日期
+OUTCOME_MISS = 'miss'  # 能处理该文件，但其中没有日期（不再尝试后面的提取方式）
+OUTCOME_SKIP = 'skip'  # 无法处理该文件，交给下一个提取方式
+
+# 目录内的尝试次数达到这个数量后，按该目录自己的统计排序，否则按扩展名的统计排序
+MIN_DIR_SAMPLES = 8
+# 计算期望开销时成功率的下限，避免除以0
+MIN_SUCCESS_RATE = 0.05
+
+class ExtractorSkipped(Exception):
+    """提取方式无法处理该文件（如文件结构无法识别），应继续尝试下一个提取方式"""
+    pass
+
+class ExtractorStats:
+    """按 (提取方式, 扩展名) 和 (提取方式, 目录) 记录命中率和平均耗时
+
+    统计值为 [尝试次数, 取得日期次数, 跳过次数, 累计耗时]；
+    工作进程用take_delta取出增量交给主进程，主进程用merge合并后写入报告。
+    分阶段扫描和异步扫描在多个线程中同时记录，读写都在self.lock下进行。
+    """
+
+    def __init__(self):
+        self.by_ext = {}
+        self.by_dir = {}
+        self._delta = {}
+        self.lock = threading.Lock()
+
+    def record(self, name, ext, directory, elapsed, outcome):
+        with self.lock:
+            for table, key in ((self.by_ext, (name, ext)), (self.by_dir, (name, directory))):
+                self._add(table, key, elapsed, outcome)
+            self._add(self._delta, (name, ext), elapsed, outcome)
+
+    @staticmethod
+    def _add(table, key, elapsed, outcome):
+        counts = table.get(key)
+        if counts is None:
+            counts = table[key] = [0, 0, 0, 0.0]
+        counts[0] += 1
+        if outcome == OUTCOME_HIT:
+            counts[1] += 1
+        elif outcome == OUTCOME_SKIP:
+            counts[2] += 1
+        counts[3] += elapsed
+
+    def take_delta(self):
+        """取出上次调用以来新增的按扩展名统计（用于从工作进程传回主进程）"""
+        with self.lock:
+            delta, self._delta = self._delta, {}
+        return delta
+
+    def merge(self, delta):
+        """合并工作进程传回的按扩展名统计"""
+        with self.lock:
+            for key, counts in delta.items():
+                total = self.by_ext.get(key)
+                if total is None:
+                    self.by_ext[key] = list(counts)
+                else:
+                    for i, value in enumerate(counts):
+                        total[i] += value
+
+    def get(self, name, ext=None, directory=None):
+        """返回统计记录，没有数据时返回None"""
+        with self.lock:
+            if directory is not None:
+                counts = self.by_dir.get((name, directory))
+            else:
+                counts = self.by_ext.get((name, ext))
+            return ExtractorRecord(*counts) if counts else None
+
+    def expected_cost(self, extractor, ext, directory):
+        """得到一个结论（取得日期或确定没有日期）的期望耗时：平均耗时 / 成功率
+
+        没有统计数据时使用prior_cost并假定一定成功，因此初始顺序就是注册顺序。
+        """
+        record = self.get(extractor.name, directory=directory)
+        if record is None or record.attempts < MIN_DIR_SAMPLES:
+            record = self.get(extractor.name, ext=ext)
+        if record is None:
+            return extractor.prior_cost
+        # 先验值相当于一次成功的尝试，样本少时不会因为一两次失败就大幅调整顺序
+        attempts = record.attempts + 1
+        mean_cost = (record.elapsed + extractor.prior_cost) / attempts
+        success_rate = (attempts - record.skips) / attempts
+        return mean_cost / max(success_rate, MIN_SUCCESS_RATE)
+
+    def report_lines(self):
+        """按提取方式和扩展名生成报告中的统计行"""
+        lines = []
+        with self.lock:
+            by_ext = sorted((key, list(counts)) for key, counts in self.by_ext.items())
+        for (name, ext), (attempts, hits, skips, elapsed) in by_ext:
+            mean_ms = elapsed / attempts * 1000 if attempts else 0
+            lines.append(
+                f"{name} {ext}: 尝试 {attempts} 次, 取得日期 {hits} 次 ({hits / attempts:.0%}), "
+                f"跳过 {skips} 次, 平均 {mean_ms:.2f} 毫秒, 共 {elapsed:.2f} 秒"
+            )
+        return lines
+
+class ExtractorChain:
+    """按期望开销排序的日期提取链
+
+    同一级别内期望开销（平均耗时 / 成功率）最低的提取方式先运行，
+    只有它无法处理该文件时才运行后面更慢的提取方式。
+    """
+
+    def __init__(self, extractors, stats=None):
+        self.extractors = list(extractors)
+        self.stats = stats or ExtractorStats()
+
+    def ordered(self, ext, directory, exclude=()):
+        """返回适用于该扩展名的提取方式，按 (级别, 期望开销, 注册顺序) 排序"""
+        candidates = [
+            (extractor.tier, self.stats.expected_cost(extractor, ext, directory), index, extractor)
+            for index, extractor in enumerate(self.extractors)
+            if ext in extractor.extensions and extractor.name not in exclude
+        ]
+        candidates.sort(key=lambda item: item[:3])
+        return [item[3] for item in candidates]
+
+    def run(self, file_path, defer_probe=False, pending=None, exclude=()):
+        """依次运行提取方式，返回 (日期字符串或None, 比特率或None, 提取方式名称或None, 跳过原因列表)
+
+        某个提取方式返回pending（如等待ffprobe线程池）时立即返回，该次尝试不计入统计。
+        全部提取方式都无法处理该文件时提取方式名称为None；exclude中的提取方式不运行。
+        """
+        ext = os.path.splitext(file_path)[1].lower()
+        directory = os.path.dirname(file_path)
+        reasons = []
+        for extractor in self.ordered(ext, directory, exclude):
+            start = time.perf_counter()
+            try:
+                date, bitrate = extractor.run(file_path, defer_probe)
+            except ExtractorSkipped as e:
+                self.stats.record(extractor.name, ext, directory, time.perf_counter() - start, OUTCOME_SKIP)
+                reasons.append(str(e))
+                continue
+            if pending is not None and date == pending:
+                return date, None, extractor.name, reasons
+            outcome = OUTCOME_HIT if date else OUTCOME_MISS
+            self.stats.record(extractor.name, ext, directory, time.perf_counter() - start, outcome)
+            return date, bitrate, extractor.name, reasons
+        return None, None, None, reasons
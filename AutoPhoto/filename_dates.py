@@ -0,0 +1,139 @@
+import os
+import re
+from collections import namedtuple
+from datetime import datetime
+
+# 从文件名或文件夹名中得到的日期：date为datetime，source为匹配到的规则名，trust为信任级别
+NameDate = namedtuple('NameDate', ['date', 'source', 'trust'])
+
+# 信任级别：
+# trusted  —— 命名规则本身就是拍摄时间，扫描时直接采用，不再打开文件
+# fallback —— 可能是导出或保存时间，只在文件内没有日期时使用
+# ignored  —— 不使用
+TRUSTED = 'trusted'
+FALLBACK = 'fallback'
+IGNORED = 'ignored'
+
+_CLOCK = r'(?P<hour>\d{2})[-_.]?(?P<minute>\d{2})[-_.]?(?P<second>\d{2})'
+
+# 文件名规则（按顺序匹配去掉扩展名后的文件名，越具体的规则越靠前）
+FILENAME_PATTERNS = (
+    # 手机相机：IMG_20240518_192620、VID_20240518_192620、PXL_20240518_192620123、20240518_192620
+    ('camera', re.compile(
+        r'^(?:IMG|VID|PXL|MVIMG|PANO|BURST\d*|MAGIC)?[_-]?'
+        r'(?P<year>\d{4})(?P<month>\d{2})(?P<day>\d{2})[_-]' + _CLOCK, re.IGNORECASE)),
+    # 截屏和录屏：Screenshot_2024-05-18-19-26-20、Screenshot_20240518-192620、Screenshot 2024-05-18 at 19.26.20
+    ('screenshot', re.compile(
+        r'^(?:Screenshot|Screen[ _]?Recording|截屏|屏幕截图|录屏)[_ -]?'
+        r'(?P<year>\d{4})-?(?P<month>\d{2})-?(?P<day>\d{2})[_ -]?(?:at )?' + _CLOCK, re.IGNORECASE)),
+    # 本程序和不少导出工具使用的格式：2024-05-18 192620
+    ('dashed', re.compile(r'^(?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2}) ' + _CLOCK)),
+    # 微信相机拍摄：wx_camera_1590000000000（毫秒时间戳）
+    ('wx_camera', re.compile(r'^wx_camera_(?P<millis>\d{13})', re.IGNORECASE)),
+    # 微信保存的图片和视频：mmexport1590000000000（保存时间）
+    ('mmexport', re.compile(r'^mmexport(?P<millis>\d{13})', re.IGNORECASE)),
+    # 微信电脑版导出：微信图片_20240518192620、WeChat_20240518192620
+    ('wechat_export', re.compile(
+        r'^(?:微信图片|微信视频|WeChat(?:Image)?)_'
+        r'(?P<year>\d{4})(?P<month>\d{2})(?P<day>\d{2})(?P<hour>\d{2})(?P<minute>\d{2})(?P<second>\d{2})',
+        re.IGNORECASE)),
+    # 百度网盘等导出工具常见的14位时间：xxx_20240518192620
+    ('timestamp', re.compile(
+        r'(?<!\d)(?P<year>(?:19|20)\d{2})(?P<month>\d{2})(?P<day>\d{2})'
+        r'(?P<hour>\d{2})(?P<minute>\d{2})(?P<second>\d{2})(?!\d)')),
+    # 文件名中单独的13位毫秒时间戳（网盘、QQ导出等）
+    ('epoch_millis', re.compile(r'(?<!\d)(?P<millis>1\d{12})(?!\d)')),
+)
+
+# 文件夹名规则：2019-07 旅行、2019.07.15 生日、2019年7月
+FOLDER_PATTERN = re.compile(
+    r'^(?P<year>(?:19|20)\d{2})\s*[-._年 ]\s*(?P<month>1[0-2]|0?[1-9])(?!\d)\s*月?'
+    r'(?:\s*[-._]?\s*(?P<day>3[01]|[12]\d|0?[1-9])(?!\d)\s*日?)?'
+)
+
+# 每种规则默认的信任级别
+DEFAULT_TRUST = {
+    'camera': TRUSTED,
+    'screenshot': TRUSTED,
+    'dashed': TRUSTED,
+    'wx_camera': TRUSTED,
+    'mmexport': FALLBACK,
+    'wechat_export': FALLBACK,
+    'timestamp': FALLBACK,
+    'epoch_millis': FALLBACK,
+    'folder': FALLBACK,
+}
+
+# 合理的年份范围，超出范围的匹配视为巧合（如文件名中的编号）
+MIN_YEAR = 1990
+MAX_YEAR = 2100
+
+def _build_date(match):
+    """把匹配结果转换为datetime，数值不合法时返回None"""
+    fields = match.groupdict()
+    try:
+        if fields.get('millis'):
+            date = datetime.fromtimestamp(int(fields['millis']) / 1000)
+        else:
+            date = datetime(
+                int(fields['year']), int(fields['month']), int(fields.get('day') or 1),
+                int(fields.get('hour') or 0), int(fields.get('minute') or 0), int(fields.get('second') or 0)
+            )
+    except (ValueError, OverflowError, OSError):
+        return None
+    if not MIN_YEAR <= date.year <= MAX_YEAR:
+        return None
+    return date
+
+class NameDateMatcher:
+    """按命名规则从文件名和所在文件夹名中提取日期
+
+    trust可以覆盖DEFAULT_TRUST中各规则的信任级别；
+    文件夹名的结果按目录记录，同一目录下的文件只匹配一次。
+    """
+
+    def __init__(self, trust=None):
+        self.trust = dict(DEFAULT_TRUST)
+        if trust:
+            self.trust.update(trust)
+        self._folder_dates = {}
+
+    def match_filename(self, path):
+        """匹配文件名，返回第一个未被忽略的NameDate或None"""
+        stem = os.path.splitext(os.path.basename(path))[0]
+        for source, pattern in FILENAME_PATTERNS:
+            trust = self.trust.get(source, IGNORED)
+            if trust == IGNORED:
+                continue
+            match = pattern.search(stem)
+            if match:
+                date = _build_date(match)
+                if date:
+                    return NameDate(date, source, trust)
+        return None
+
+    def match_folder(self, directory):
+        """匹配文件夹名，返回NameDate或None（按目录缓存）"""
+        if directory in self._folder_dates:
+            return self._folder_dates[directory]
+        result = None
+        trust = self.trust.get('folder', IGNORED)
+        if trust != IGNORED:
+            match = FOLDER_PATTERN.match(os.path.basename(directory))
+            if match:
+                date = _build_date(match)
+                if date:
+                    result = NameDate(date, 'folder', trust)
+        self._folder_dates[directory] = result
+        return result
+
+    def trusted_date(self, path):
+        """文件名中可信的拍摄日期，没有时返回None"""
+        named = self.match_filename(path)
+        if named and named.trust == TRUSTED:
+            return named
+        return None
+
+    def fallback_date(self, path):
+        """文件内没有日期时使用的日期：先看文件名，再看所在文件夹名"""
+        return self.match_filename(path) or self.match_folder(os.path.dirname(path))
@@ -0,0 +1,48 @@
+import os
+import struct
+import zipfile
+from exif_reader import read_exif_date_from_file, ExifFormatError
+from video_parsers import parse_mp4, VideoFormatError
+
+# LIVP（iPhone实况照片导出）是一个zip包，内含一张HEIC/JPEG图片和一段MOV视频
+LIVP_IMAGE_EXTENSIONS = ('.heic', '.heif', '.jpg', '.jpeg')
+LIVP_VIDEO_EXTENSIONS = ('.mov', '.mp4')
+
+def read_livp_date(path):
+    """读取LIVP中的拍摄日期，返回 (日期字符串, 来源)，来源为 'image' 或 'video'；没有日期时返回 (None, None)
+
+    只读取zip的中央目录，再以流的方式读取图片成员的文件头解析EXIF，不解压到临时文件；
+    图片中没有日期时再解析MOV成员的moov。zip结构损坏时抛出zipfile.BadZipFile。
+    """
+    with zipfile.ZipFile(path) as zf:
+        images = []
+        videos = []
+        for info in zf.infolist():
+            if info.is_dir():
+                continue
+            ext = os.path.splitext(info.filename)[1].lower()
+            if ext in LIVP_IMAGE_EXTENSIONS:
+                images.append(info)
+            elif ext in LIVP_VIDEO_EXTENSIONS:
+                videos.append(info)
+
+        for info in images:
+            with zf.open(info) as fp:
+                try:
+                    date = read_exif_date_from_file(fp)
+                except ExifFormatError as e:
+                    print(f"解析LIVP中的图片失败: {path} - {info.filename} - {str(e)}")
+                    continue
+            if date:
+                return date, 'image'
+
+        for info in videos:
+            with zf.open(info) as fp:
+                try:
+                    video_info = parse_mp4(fp, info.file_size)
+                except (VideoFormatError, struct.error, IndexError) as e:
+                    print(f"解析LIVP中的视频失败: {path} - {info.filename} - {str(e)}")
+                    continue
+            if video_info.creation_time:
+                return video_info.creation_time, 'video'
+    return None, None
@@ -0,0 +1,180 @@
+import os
+import sqlite3
+import time
+import json
+import threading
+from functools import wraps
+
+# 提取逻辑或表结构发生变化时递增，旧版本写入的缓存会被整体清空
+CACHE_VERSION = 10
+# 目录修改时间距离记录时间太近时不可信（文件系统时间精度有限，FAT为2秒）
+RACY_MTIME_NS = 2 * 10**9
+
+def _locked(method):
+    """在连接锁内执行，分阶段扫描时遍历、查询和写入可能来自不同线程"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+class MetadataCache:
+    """媒体元数据的持久化缓存（SQLite WAL模式）
+
+    以 (路径, 大小, mtime_ns, inode) 判断文件是否变化，未变化的文件直接返回上次的提取结果。
+    失效策略：文件属性不一致、缓存超过max_age_days、缓存版本号变化、文件被移动。
+
+    同时记录每个目录的mtime和子项名称，目录mtime未变化时遍历器可以复用上次记录的名称列表，
+    不必重新列举目录（每个文件仍然会stat，原地修改的文件不会被漏掉）。
+    """
+
+    def __init__(self, db_path, batch_size=500, max_age_days=90):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.max_age = max_age_days * 86400 if max_age_days else None
+        self.hits = 0
+        self.misses = 0
+        self.dir_hits = 0
+        self.dir_misses = 0
+        self._pending = []
+        self._discarded = []
+        self._pending_dirs = []
+
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        if not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        # check_same_thread=False：GUI在线程中扫描，分阶段扫描时多个线程共用连接，由self.lock串行化
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)'
+        )
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if row is None or row[0] != str(CACHE_VERSION):
+            # 版本变化时表结构也可能变化，直接重建
+            self.conn.execute('DROP TABLE IF EXISTS media')
+            self.conn.execute('DROP TABLE IF EXISTS dirs')
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (str(CACHE_VERSION),)
+            )
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS media ('
+            'path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, inode INTEGER, '
+            'has_date INTEGER, date_info TEXT, date_type TEXT, bitrate INTEGER, '
+            'extractor TEXT, checked_at REAL)'
+        )
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS dirs ('
+            'path TEXT PRIMARY KEY, mtime_ns INTEGER, filter TEXT, '
+            'files TEXT, subdirs TEXT, scanned_at_ns INTEGER)'
+        )
+        self.conn.commit()
+
+    @_locked
+    def get(self, entry):
+        """查询文件的缓存结果，命中时返回 (检查结果, 提取方式)，否则返回None"""
+        row = self.conn.execute(
+            'SELECT size, mtime_ns, inode, has_date, date_info, date_type, bitrate, extractor, checked_at '
+            'FROM media WHERE path = ?', (entry.path,)
+        ).fetchone()
+        if (row is None
+                or row[0] != entry.size or row[1] != entry.mtime_ns or row[2] != entry.inode
+                or (self.max_age and time.time() - row[8] > self.max_age)):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return (bool(row[3]), row[4], row[5], row[6]), row[7]
+
+    @_locked
+    def put(self, entry, check_result, extractor):
+        """记录文件的提取结果，累计到batch_size条后批量写入"""
+        has_date, date_info, date_type, bitrate = check_result
+        self._pending.append((
+            entry.path, entry.size, entry.mtime_ns, entry.inode,
+            int(bool(has_date)), date_info, date_type, bitrate, extractor, time.time()
+        ))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    @_locked
+    def discard(self, path):
+        """文件被移动或删除后，使其缓存失效"""
+        self._discarded.append((path,))
+        if len(self._discarded) >= self.batch_size:
+            self.flush()
+
+    @_locked
+    def lookup_dir(self, path, mtime_ns, ext_filter):
+        """目录mtime与记录一致时返回上次记录的 (文件列表, 子目录列表)，否则返回None
+
+        文件列表元素为 (名称, 大小, mtime_ns, inode)，子目录列表元素为 (名称, 是否符号链接)。
+        """
+        row = self.conn.execute(
+            'SELECT mtime_ns, filter, files, subdirs, scanned_at_ns FROM dirs WHERE path = ?', (path,)
+        ).fetchone()
+        # 目录在记录前后极短时间内被修改时mtime可能没有变化，这种记录不可信
+        if (row is None or row[0] != mtime_ns or row[1] != ext_filter
+                or row[4] - row[0] < RACY_MTIME_NS):
+            self.dir_misses += 1
+            return None
+        self.dir_hits += 1
+        files = [tuple(item) for item in json.loads(row[2])]
+        subdirs = [tuple(item) for item in json.loads(row[3])]
+        return files, subdirs
+
+    @_locked
+    def record_dir(self, path, mtime_ns, ext_filter, files, subdirs):
+        """记录完整列举过的目录的mtime和子项"""
+        self._pending_dirs.append((
+            path, mtime_ns, ext_filter,
+            json.dumps(files, ensure_ascii=False), json.dumps(subdirs, ensure_ascii=False),
+            time.time_ns()
+        ))
+        if len(self._pending_dirs) >= self.batch_size:
+            self.flush()
+
+    @_locked
+    def flush(self):
+        """把待写入的记录一次性提交到数据库"""
+        if not self._pending and not self._discarded and not self._pending_dirs:
+            return
+        try:
+            with self.conn:
+                if self._pending_dirs:
+                    self.conn.executemany(
+                        'INSERT OR REPLACE INTO dirs (path, mtime_ns, filter, files, subdirs, '
+                        'scanned_at_ns) VALUES (?, ?, ?, ?, ?, ?)',
+                        self._pending_dirs
+                    )
+                if self._pending:
+                    self.conn.executemany(
+                        'INSERT OR REPLACE INTO media (path, size, mtime_ns, inode, has_date, date_info, '
+                        'date_type, bitrate, extractor, checked_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        self._pending
+                    )
+                if self._discarded:
+                    self.conn.executemany('DELETE FROM media WHERE path = ?', self._discarded)
+        except sqlite3.Error as e:
+            print(f"写入元数据缓存失败: {str(e)}")
+        self._pending = []
+        self._discarded = []
+        self._pending_dirs = []
+
+    @_locked
+    def clear(self):
+        """清空所有缓存记录"""
+        self._pending = []
+        self._discarded = []
+        self._pending_dirs = []
+        with self.conn:
+            self.conn.execute('DELETE FROM media')
+            self.conn.execute('DELETE FROM dirs')
+
+    @_locked
+    def close(self):
+        """写入剩余记录并关闭数据库"""
+        self.flush()
+        self.conn.close()
@@ -0,0 +1,273 @@
+import os
+import json
+import time
+import errno
+from collections import namedtuple
+from name_index import TargetNameIndex
+from copy_engine import CopyScheduler, move_file, file_checksum, PARTIAL_SUFFIX
+
+# 计划中的一次移动：category为扫描结果类别（without_date / big_videos）
+MoveOp = namedtuple('MoveOp', ['source', 'target', 'category'])
+
+# 执行结果：renamed/copied为成功的数量，failed为 [(MoveOp, 原因), ...]，skipped为已在日志中完成的数量，
+# copied_bytes为跨设备复制的字节数，elapsed为执行耗时（秒）
+ApplyResult = namedtuple('ApplyResult', ['renamed', 'copied', 'failed', 'skipped', 'copied_bytes', 'elapsed'])
+
+# 每批移动的文件数：每批开始和结束时各fsync一次日志
+MOVE_BATCH_SIZE = 200
+
+class MovePlan:
+    """扫描得到的移动计划，保存为JSON Lines（每行一个移动），可以先审阅或删减再执行"""
+
+    def __init__(self, ops=None):
+        self.ops = list(ops or [])
+        self.name_index = TargetNameIndex()
+
+    def add(self, source, target_dir, category):
+        """加入一次移动，目标名称在计划内互不冲突（也不与目标文件夹中已有的文件冲突），返回目标路径"""
+        target = self.name_index.reserve(target_dir, os.path.basename(source))
+        self.ops.append(MoveOp(source, target, category))
+        return target
+
+    def __len__(self):
+        return len(self.ops)
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for op in self.ops:
+                f.write(json.dumps(op._asdict(), ensure_ascii=False) + '\n')
+
+    @classmethod
+    def load(cls, path):
+        ops = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    record = json.loads(line)
+                    ops.append(MoveOp(record['source'], record['target'], record.get('category')))
+        return cls(ops)
+
+class MoveJournal:
+    """只追加的移动日志（JSON Lines）
+
+    {"state": "start", "src", "dst"}          —— 即将移动
+    {"state": "done", "src", "dst", "method"}  —— 已移动（method为rename、copy或recovered）
+    {"state": "failed", "src", "dst", "error"} —— 移动失败，源文件未改动
+    {"state": "undone", "src", "dst"}         —— 已撤销（文件已移回src）
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def read(self):
+        """返回日志中的全部记录（忽略崩溃时写了一半的最后一行）"""
+        records = []
+        if not os.path.exists(self.path):
+            return records
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+        return records
+
+    def open(self):
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def write(self, **record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+def _same_device(source, target_dir):
+    try:
+        return os.stat(source).st_dev == os.stat(target_dir).st_dev
+    except OSError:
+        return False
+
+def _rename_no_replace(source, target):
+    """同一文件系统内的原子改名，不覆盖已有文件"""
+    if os.path.lexists(target):
+        raise FileExistsError(errno.EEXIST, f"目标文件已存在: {target}")
+    os.rename(source, target)
+
+def _completed_sources(records):
+    """日志中已完成且未撤销的移动：源路径 → 目标路径"""
+    done = {}
+    for record in records:
+        if record.get('state') == 'done':
+            done[record['src']] = record['dst']
+        elif record.get('state') == 'undone':
+            done.pop(record['src'], None)
+    return done
+
+def _recover_interrupted(records):
+    """处理上次中断时“已开始但没有完成记录”的移动，返回已经实际完成的 {源路径: 目标路径}
+
+    改名是原子的：源文件已不存在而目标存在，说明改名已完成；复制留下的临时文件直接删除，重新移动；
+    复制已完成但源文件还没删除时（两者内容相同），删除源文件即完成。
+    """
+    started = {}
+    finished = set()
+    for record in records:
+        state = record.get('state')
+        if state == 'start':
+            started[record['src']] = record['dst']
+        elif state in ('done', 'failed', 'undone'):
+            finished.add(record['src'])
+    recovered = {}
+    for src, dst in started.items():
+        if src in finished:
+            continue
+        partial = dst + PARTIAL_SUFFIX
+        if os.path.exists(partial):
+            os.remove(partial)
+        if not os.path.exists(dst):
+            continue
+        if not os.path.exists(src):
+            recovered[src] = dst
+        elif os.path.getsize(src) == os.path.getsize(dst) and file_checksum(src) == file_checksum(dst):
+            os.remove(src)
+            recovered[src] = dst
+    return recovered
+
+def apply_move_plan(plan, journal_path, batch_size=MOVE_BATCH_SIZE, copy_workers=None, on_progress=None):
+    """按批执行移动计划，每个移动都记录在journal_path中
+
+    同一文件系统内用os.rename（原子、不复制数据），跨设备时交给copy_engine.CopyScheduler
+    并行复制 + 校验 + 删除源文件（copy_workers为None时按磁盘类型决定并发数）。
+    使用同一个日志再次执行时跳过已完成的移动，因此中断后可以继续；
+    目标名称在执行时已被占用（计划之后有新文件）时重新分配带序号的名称。
+    on_progress(已处理数, 总数) 在每批结束后调用。
+    """
+    start_time = time.monotonic()
+    journal = MoveJournal(journal_path)
+    records = journal.read()
+    done = _completed_sources(records)
+    journal.open()
+    for src, dst in _recover_interrupted(records).items():
+        journal.write(state='done', src=src, dst=dst, method='recovered')
+        done[src] = dst
+    journal.sync()
+
+    names = TargetNameIndex()
+    planned = {os.path.normcase(op.target) for op in plan.ops}
+    renamed = 0
+    copied = 0
+    copied_bytes = 0
+    skipped = 0
+    failed = []
+    pending = []
+    for op in plan.ops:
+        if op.source in done:
+            skipped += 1
+        else:
+            pending.append(op)
+
+    scheduler = CopyScheduler(copy_workers)
+    try:
+        for index in range(0, len(pending), batch_size):
+            batch = []
+            for op in pending[index:index + batch_size]:
+                target_dir, file_name = os.path.split(op.target)
+                try:
+                    os.makedirs(target_dir, exist_ok=True)
+                except OSError as e:
+                    # 目标文件夹无法创建（无权限、路径无效等）只影响这一个移动
+                    journal.write(state='failed', src=op.source, dst=op.target, error=str(e))
+                    failed.append((op, str(e)))
+                    continue
+                target = op.target
+                if os.path.lexists(target):
+                    # 新名称也不能占用计划中其他移动的目标
+                    target = names.reserve(target_dir, file_name)
+                    while os.path.normcase(target) in planned:
+                        target = names.reserve(target_dir, file_name)
+                batch.append((op, target))
+                journal.write(state='start', src=op.source, dst=target)
+            journal.sync()
+
+            copies = []
+            for op, target in batch:
+                if _same_device(op.source, os.path.dirname(target)):
+                    try:
+                        _rename_no_replace(op.source, target)
+                        journal.write(state='done', src=op.source, dst=target, method='rename')
+                        renamed += 1
+                        continue
+                    except OSError as e:
+                        if e.errno != errno.EXDEV:
+                            journal.write(state='failed', src=op.source, dst=target, error=str(e))
+                            failed.append((op, str(e)))
+                            continue
+                try:
+                    size = os.path.getsize(op.source)
+                except OSError as e:
+                    journal.write(state='failed', src=op.source, dst=target, error=str(e))
+                    failed.append((op, str(e)))
+                    continue
+                copies.append((op, target, size, scheduler.submit_move(op.source, target)))
+            for op, target, size, future in copies:
+                try:
+                    method = future.result()
+                    journal.write(state='done', src=op.source, dst=target, method=method)
+                    copied += 1
+                    copied_bytes += size
+                except Exception as e:
+                    journal.write(state='failed', src=op.source, dst=target, error=str(e))
+                    failed.append((op, str(e)))
+            journal.sync()
+            if on_progress:
+                on_progress(skipped + min(index + batch_size, len(pending)), len(plan.ops))
+    finally:
+        scheduler.shutdown()
+        journal.close()
+    return ApplyResult(renamed, copied, failed, skipped, copied_bytes, time.monotonic() - start_time)
+
+def undo_moves(journal_path):
+    """按相反顺序把日志中已完成的移动移回原位置，返回 (撤销数量, [(源路径, 原因), ...])"""
+    journal = MoveJournal(journal_path)
+    records = journal.read()
+    done = _completed_sources(records)
+    undone = 0
+    failed = []
+    journal.open()
+    try:
+        for src, dst in reversed(list(done.items())):
+            try:
+                os.makedirs(os.path.dirname(src), exist_ok=True)
+                move_file(dst, src)
+                journal.write(state='undone', src=src, dst=dst, at=time.time())
+                undone += 1
+            except Exception as e:
+                failed.append((src, str(e)))
+                print(f"撤销移动失败: {dst} -> {src} - {str(e)}")
+    finally:
+        journal.close()
+    return undone, failed
+
+def format_apply_result(result, journal_path):
+    """生成执行移动计划后的报告行"""
+    lines = [
+        f"移动完成: 同盘改名 {result.renamed} 个, 跨盘复制 {result.copied} 个, "
+        f"此前已完成 {result.skipped} 个, 失败 {len(result.failed)} 个",
+        f"移动日志: {journal_path}",
+    ]
+    if result.copied_bytes:
+        megabytes = result.copied_bytes / (1024 * 1024)
+        speed = megabytes / result.elapsed if result.elapsed else 0.0
+        lines.append(f"跨盘复制: {megabytes:.1f} MB, 用时 {result.elapsed:.1f} 秒, 平均 {speed:.1f} MB/秒")
+    for op, reason in result.failed:
+        lines.append(f"移动失败: {op.source} -> {op.target} - {reason}")
+    return lines
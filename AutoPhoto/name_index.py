@@ -0,0 +1,74 @@
+import os
+import threading
+
+class TargetNameIndex:
+    """目标文件夹的文件名索引，为移动的文件分配不冲突的名称（name、name_1、name_2 ……）
+
+    每个目标文件夹只列举一次，之后在内存中记录已占用的名称和每个文件名下一个可用的序号，
+    分配名称不再逐个stat。分配后的名称立即记为占用，因此多个线程同时移动也不会拿到同一个名称；
+    其他程序在扫描期间创建的同名文件，在分配时用一次exists检查发现并记入索引。
+    名称按os.path.normcase比较（Windows下不区分大小写）。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.names = {}     # 目标文件夹 → 已占用的名称集合
+        self.counters = {}  # (目标文件夹, 文件名, 扩展名) → 下一个尝试的序号
+
+    def _names_for(self, directory):
+        names = self.names.get(directory)
+        if names is None:
+            names = set()
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        names.add(os.path.normcase(entry.name))
+            except FileNotFoundError:
+                pass
+            self.names[directory] = names
+        return names
+
+    def _taken(self, directory, names, file_name):
+        key = os.path.normcase(file_name)
+        if key in names:
+            return True
+        # 索引之外创建的文件（如其他程序在扫描期间写入）
+        if os.path.lexists(os.path.join(directory, file_name)):
+            names.add(key)
+            return True
+        return False
+
+    def reserve(self, directory, file_name):
+        """分配并占用directory中一个不冲突的路径"""
+        with self.lock:
+            names = self._names_for(directory)
+            if not self._taken(directory, names, file_name):
+                names.add(os.path.normcase(file_name))
+                return os.path.join(directory, file_name)
+
+            stem, ext = os.path.splitext(file_name)
+            counter_key = (directory, os.path.normcase(stem), os.path.normcase(ext))
+            counter = self.counters.get(counter_key, 1)
+            while True:
+                candidate = f"{stem}_{counter}{ext}"
+                counter += 1
+                if not self._taken(directory, names, candidate):
+                    break
+            self.counters[counter_key] = counter
+            names.add(os.path.normcase(candidate))
+            return os.path.join(directory, candidate)
+
+    def release(self, path):
+        """移动失败时归还分配的名称"""
+        directory, file_name = os.path.split(path)
+        with self.lock:
+            names = self.names.get(directory)
+            if names is not None:
+                names.discard(os.path.normcase(file_name))
+
+    def forget(self, directory):
+        """丢弃某个目标文件夹的索引（如文件夹被外部清空），下次分配时重新列举"""
+        with self.lock:
+            self.names.pop(directory, None)
+            for key in [key for key in self.counters if key[0] == directory]:
+                del self.counters[key]
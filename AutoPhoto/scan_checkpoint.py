@@ -0,0 +1,154 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+# 检查点文件格式变化时递增
+CHECKPOINT_VERSION = 1
+# 两次把检查点写入磁盘（fsync）之间的最长间隔（秒）
+CHECKPOINT_SYNC_INTERVAL = 5.0
+
+def checkpoint_path_for(log_dir, directory):
+    """每个检查目录对应一个检查点文件，不同目录（如多块备份盘）的未完成扫描互不影响"""
+    digest = hashlib.sha1(os.path.normcase(os.path.abspath(directory)).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(log_dir, f'scan_checkpoint_{digest}.jsonl')
+
+class ScanCheckpoint:
+    """扫描检查点：以追加方式记录每个已归类的文件和已经处理完的目录
+
+    文件为JSON Lines，第一行是扫描参数，之后每行一条记录：
+    {"src": 原路径, "r": ScanResult字段}  —— 一个文件已归类（移动过的文件r中是新路径）
+    {"d": 目录}                          —— 该目录中的文件都已处理
+    每条记录立即写入操作系统，每隔CHECKPOINT_SYNC_INTERVAL秒fsync一次；
+    程序崩溃时最后一行可能不完整，读取时忽略。扫描完成后删除检查点文件。
+    分阶段扫描中track在遍历线程、record在当前线程中调用，目录计数和写入都在self.lock下进行。
+    """
+
+    def __init__(self, path, directory, options):
+        self.path = path
+        self.header = {'version': CHECKPOINT_VERSION, 'directory': os.path.abspath(directory), 'options': options}
+        self.results = []          # 上次扫描已产出的ScanResult字段列表
+        self.completed_dirs = set()
+        self.done_files = set()    # 所在目录尚未处理完的已归类文件（原路径）
+        self.pending = {}          # 目录 → 本次已产出但尚未归类的文件数
+        self.listed = set()        # 本次已列举完的目录
+        self.file = None
+        self.last_sync = 0.0
+        self.lock = threading.Lock()
+
+    def exists(self):
+        """是否有与当前扫描参数一致、可以继续的检查点"""
+        header = self._read_header()
+        return header == self.header
+
+    def _read_header(self):
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.loads(f.readline())
+        except (OSError, ValueError):
+            return None
+
+    def load(self):
+        """读取检查点中的记录，返回上次已产出的结果数量"""
+        done = set()
+        with open(self.path, 'r', encoding='utf-8') as f:
+            f.readline()
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 崩溃时写了一半的行
+                    continue
+                if 'd' in record:
+                    self.completed_dirs.add(record['d'])
+                elif 'src' in record:
+                    done.add(record['src'])
+                    self.results.append(record['r'])
+        # 已处理完的目录整体跳过，不必再记住其中的每个文件
+        self.done_files = {path for path in done if os.path.dirname(path) not in self.completed_dirs}
+        return len(self.results)
+
+    def open(self, resume):
+        """打开检查点开始记录；resume为False时丢弃旧记录"""
+        if resume:
+            self.load()
+            self.file = open(self.path, 'a', encoding='utf-8', buffering=1)
+        else:
+            self.file = open(self.path, 'w', encoding='utf-8', buffering=1)
+            self._write(self.header)
+            self.sync()
+
+    def is_done(self, entry_path):
+        """文件在上次扫描中是否已经归类"""
+        return os.path.dirname(entry_path) in self.completed_dirs or entry_path in self.done_files
+
+    def track(self, entries):
+        """包装文件遍历：跳过已归类的文件，并记录每个目录何时列举完
+
+        walk_media_files逐个目录产出文件，同一目录的文件是连续的，因此目录变化时上一个目录已列举完。
+        """
+        current = None
+        for entry in entries:
+            directory = os.path.dirname(entry.path)
+            if directory != current:
+                if current is not None:
+                    self._listed(current)
+                current = directory
+            if self.is_done(entry.path):
+                continue
+            with self.lock:
+                self.pending[directory] = self.pending.get(directory, 0) + 1
+            yield entry
+        if current is not None:
+            self._listed(current)
+
+    def _listed(self, directory):
+        with self.lock:
+            self.listed.add(directory)
+            self._maybe_complete(directory)
+
+    def _maybe_complete(self, directory):
+        if directory in self.listed and not self.pending.get(directory) and directory not in self.completed_dirs:
+            self.completed_dirs.add(directory)
+            self.pending.pop(directory, None)
+            self._write({'d': directory})
+
+    def record(self, src_path, result):
+        """记录一个已归类的文件（result为ScanResult，None表示移动失败、没有结果）"""
+        with self.lock:
+            if result is not None:
+                self._write({'src': src_path, 'r': list(result)})
+            directory = os.path.dirname(src_path)
+            if directory in self.pending:
+                self.pending[directory] -= 1
+                self._maybe_complete(directory)
+        if time.monotonic() - self.last_sync >= CHECKPOINT_SYNC_INTERVAL:
+            self.sync()
+
+    def _write(self, record):
+        if self.file:
+            self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def sync(self):
+        """把已写入的记录落盘"""
+        with self.lock:
+            if self.file:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+            self.last_sync = time.monotonic()
+
+    def close(self, finished):
+        """关闭检查点；扫描完整结束时删除文件，取消或出错时保留以便继续"""
+        if self.file:
+            self.sync()
+            with self.lock:
+                self.file.close()
+                self.file = None
+        if finished:
+            try:
+                os.remove(self.path)
+            except OSError as e:
+                print(f"删除扫描检查点失败: {str(e)}")
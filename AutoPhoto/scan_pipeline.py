@@ -0,0 +1,214 @@
+import time
+import queue
+import threading
+from collections import namedtuple
+
+# 每个阶段队列的默认容量：队列满时上游阶段等待（背压），避免一次性读入整个目录树
+DEFAULT_QUEUE_SIZE = 256
+# 等待队列时检查停止标记的间隔（秒）
+POLL_INTERVAL = 0.1
+
+# 一个阶段的运行统计：
+# processed —— 处理的条目数；busy —— 各线程处理条目的累计耗时（秒）；elapsed —— 流水线从开始到结束的时间
+# mean_depth/max_depth —— 取条目时输入队列的平均/最大长度
+StageStats = namedtuple('StageStats', [
+    'name', 'workers', 'processed', 'busy', 'elapsed', 'mean_depth', 'max_depth', 'queue_size'
+])
+
+class PipelineStopped(Exception):
+    """流水线已停止（调用方提前结束或某个阶段出错）"""
+
+class _Stage:
+    def __init__(self, name, workers, func, queue_size):
+        self.name = name
+        self.workers = workers
+        self.func = func
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.queue_size = queue_size
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.busy = 0.0
+        self.depth_total = 0
+        self.max_depth = 0
+
+    def account(self, depth, busy):
+        with self.lock:
+            self.processed += 1
+            self.busy += busy
+            self.depth_total += depth
+            if depth > self.max_depth:
+                self.max_depth = depth
+
+    def stats(self, elapsed):
+        mean_depth = self.depth_total / self.processed if self.processed else 0.0
+        return StageStats(self.name, self.workers, self.processed, self.busy, elapsed,
+                          mean_depth, self.max_depth, self.queue_size)
+
+class Pipeline:
+    """分阶段的流水线：每个阶段有自己的线程数和有界输入队列
+
+    源阶段在单独的线程中迭代产出条目；普通阶段的func(item)返回 (下一阶段名称, 条目)，
+    返回None表示丢弃该条目；最后一个阶段（sink）没有线程，由调用方在run()中逐个取出。
+    条目只能流向后面的阶段，队列满时上游线程等待，因此最慢的阶段决定整体速度，
+    各阶段的队列长度和忙碌比例可以说明瓶颈在哪里。
+    """
+
+    def __init__(self, cancel_event=None):
+        self.cancel_event = cancel_event  # 调用方设置后流水线停止，self.cancelled为True
+        self.cancelled = False
+        self.stop_event = threading.Event()
+        self.stages = {}
+        self.order = []
+        self.source = None
+        self.threads = []
+        self.error = None
+        self.in_flight = 0
+        self.in_flight_lock = threading.Lock()
+        self.source_done = threading.Event()
+        self.started = None
+        self.finished = None
+
+    def add_source(self, name, iterable, next_stage):
+        self.source = (_Stage(name, 1, None, 0), iterable, next_stage)
+        self.order.append(name)
+
+    def add_stage(self, name, workers, func, queue_size=DEFAULT_QUEUE_SIZE):
+        self.stages[name] = _Stage(name, max(1, workers), func, queue_size)
+        self.order.append(name)
+
+    def add_sink(self, name, queue_size=DEFAULT_QUEUE_SIZE):
+        self.stages[name] = _Stage(name, 1, None, queue_size)
+        self.order.append(name)
+        self.sink = self.stages[name]
+
+    def _put(self, stage_name, item):
+        """放入下一阶段的队列，队列满时等待；流水线停止时抛出PipelineStopped"""
+        target = self.stages[stage_name].queue
+        while True:
+            if self.stop_event.is_set():
+                raise PipelineStopped()
+            try:
+                target.put(item, timeout=POLL_INTERVAL)
+                return
+            except queue.Full:
+                continue
+
+    def _finish_item(self):
+        with self.in_flight_lock:
+            self.in_flight -= 1
+
+    def _fail(self, error):
+        if self.error is None:
+            self.error = error
+        self.stop_event.set()
+
+    def _run_source(self):
+        stage, iterable, next_stage = self.source
+        try:
+            iterator = iter(iterable)
+            while not self.stop_event.is_set():
+                start = time.monotonic()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                stage.account(0, time.monotonic() - start)
+                with self.in_flight_lock:
+                    self.in_flight += 1
+                self._put(next_stage, item)
+        except PipelineStopped:
+            pass
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self.source_done.set()
+
+    def _run_worker(self, stage):
+        # 流水线结束或停止时run()设置stop_event，各线程随之退出
+        while not self.stop_event.is_set():
+            try:
+                item = stage.queue.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            depth = stage.queue.qsize()
+            start = time.monotonic()
+            try:
+                routed = stage.func(item)
+                stage.account(depth, time.monotonic() - start)
+                if routed is None:
+                    self._finish_item()
+                else:
+                    self._put(routed[0], routed[1])
+            except PipelineStopped:
+                break
+            except Exception as e:
+                self._fail(e)
+                break
+
+    def run(self):
+        """启动所有阶段，逐个产出到达最后一个阶段的条目
+
+        调用方处理条目的时间计入最后一个阶段的忙碌时间；生成器关闭时停止整个流水线。
+        """
+        self.started = time.monotonic()
+        self.threads.append(threading.Thread(target=self._run_source, daemon=True))
+        for name in self.order[1:]:
+            stage = self.stages[name]
+            if stage is self.sink:
+                continue
+            for _ in range(stage.workers):
+                self.threads.append(threading.Thread(target=self._run_worker, args=(stage,), daemon=True))
+        for thread in self.threads:
+            thread.start()
+
+        try:
+            while True:
+                if self.error is not None:
+                    raise self.error
+                if self.cancel_event is not None and self.cancel_event.is_set():
+                    self.cancelled = True
+                    break
+                try:
+                    item = self.sink.queue.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    if self.source_done.is_set() and self.in_flight == 0:
+                        break
+                    continue
+                depth = self.sink.queue.qsize()
+                start = time.monotonic()
+                yield item
+                self.sink.account(depth, time.monotonic() - start)
+                self._finish_item()
+        finally:
+            self.finished = time.monotonic()
+            self.stop_event.set()
+            for thread in self.threads:
+                thread.join()
+
+    def stats(self):
+        """按阶段顺序返回StageStats列表（吞吐量和忙碌比例都按整个流水线的运行时间计算）"""
+        if self.started is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self.finished or time.monotonic()) - self.started
+        result = [self.source[0].stats(elapsed)]
+        result.extend(self.stages[name].stats(elapsed) for name in self.order[1:])
+        return result
+
+def format_stage_stats(stats):
+    """生成报告中的阶段统计行，并指出忙碌比例最高的阶段"""
+    lines = []
+    bottleneck = None
+    for stage in stats:
+        throughput = stage.processed / stage.elapsed if stage.elapsed else 0.0
+        utilization = stage.busy / (stage.workers * stage.elapsed) if stage.elapsed else 0.0
+        queue_text = f", 平均队列 {stage.mean_depth:.1f}/{stage.queue_size}, 最大 {stage.max_depth}" if stage.queue_size else ""
+        lines.append(
+            f"{stage.name}: 线程 {stage.workers}, 处理 {stage.processed} 个, 吞吐 {throughput:.1f} 个/秒, "
+            f"忙碌 {utilization:.0%}{queue_text}"
+        )
+        if stage.processed and (bottleneck is None or utilization > bottleneck[1]):
+            bottleneck = (stage.name, utilization)
+    if bottleneck:
+        lines.append(f"瓶颈阶段: {bottleneck[0]}")
+    return lines
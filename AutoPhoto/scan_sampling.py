@@ -0,0 +1,142 @@
+import math
+import os
+from collections import namedtuple
+
+# 估计值和95%置信区间
+Estimate = namedtuple('Estimate', ['value', 'low', 'high'])
+
+# 一个抽样层：population为层内文件总数，sample为抽中的文件条目
+SampleStratum = namedtuple('SampleStratum', ['directories', 'population', 'sample'])
+
+# 95%置信区间对应的正态分位数
+Z_95 = 1.96
+# 每层至少抽取的文件数（至少2个才能估计层内方差）
+MIN_PER_STRATUM = 2
+# 遍历时保留的随机样本是样本量的多少倍（各层再从中按比例抽取）
+RESERVOIR_OVERSAMPLE = 4
+
+def build_strata(entries, sample_size, rng, min_per_stratum=MIN_PER_STRATUM, oversample=RESERVOIR_OVERSAMPLE):
+    """按目录分层抽样，返回SampleStratum列表
+
+    同一目录中的文件通常来自同一台设备或同一次导入，按目录分层可以让各目录都有代表；
+    小目录按路径顺序合并为一层（相邻目录一般也相似），使层数不超过 sample_size / min_per_stratum。
+    每层按文件数比例分配样本量，至少min_per_stratum个（层内文件更少时全部抽取）。
+
+    entries可以是遍历目录的生成器，只遍历一次，不保存完整的文件列表：每个目录只记文件数，
+    另外用蓄水池抽样保留全部文件的一个均匀随机样本（sample_size × oversample个），
+    以及每个目录最多min_per_stratum个备用条目，内存与样本量和目录数成正比。
+    层内的文件落在全局样本中的部分是该层的均匀随机子集，从中抽取；个别层不够时才用备用条目补足。
+    """
+    capacity = max(sample_size, min_per_stratum) * oversample
+    counts = {}
+    reservoir = []
+    spares = {}
+    seen = 0
+    for entry in entries:
+        directory = os.path.dirname(entry.path)
+        count = counts.get(directory, 0) + 1
+        counts[directory] = count
+        seen += 1
+        if len(reservoir) < capacity:
+            reservoir.append(entry)
+        else:
+            j = rng.randrange(seen)
+            if j < capacity:
+                reservoir[j] = entry
+        kept = spares.setdefault(directory, [])
+        if len(kept) < min_per_stratum:
+            kept.append(entry)
+        else:
+            j = rng.randrange(count)
+            if j < min_per_stratum:
+                kept[j] = entry
+    total = seen
+    if total == 0:
+        return []
+
+    sampled_by_dir = {}
+    for entry in reservoir:
+        sampled_by_dir.setdefault(os.path.dirname(entry.path), []).append(entry)
+
+    max_strata = max(1, sample_size // min_per_stratum)
+    target_size = math.ceil(total / max_strata)
+    groups = []
+    directories, population = [], 0
+    for directory in sorted(counts):
+        directories.append(directory)
+        population += counts[directory]
+        if population >= target_size:
+            groups.append((directories, population))
+            directories, population = [], 0
+    if population:
+        groups.append((directories, population))
+
+    strata = []
+    for directories, population in groups:
+        n = max(min_per_stratum, round(sample_size * population / total))
+        n = min(n, population)
+        candidates = [entry for directory in directories for entry in sampled_by_dir.get(directory, ())]
+        if len(candidates) >= n:
+            sample = rng.sample(candidates, n)
+        else:
+            chosen = {entry.path for entry in candidates}
+            extras = [entry for directory in directories for entry in spares[directory]
+                      if entry.path not in chosen]
+            sample = candidates + rng.sample(extras, min(n - len(candidates), len(extras)))
+        strata.append(SampleStratum(directories, population, sample))
+    return strata
+
+def _mean_and_variance(values):
+    """样本均值和样本方差（只有一个值时方差为0）"""
+    n = len(values)
+    mean = sum(values) / n
+    variance = sum((v - mean) ** 2 for v in values) / (n - 1) if n > 1 else 0.0
+    return mean, variance
+
+def _stratified_total(strata_values):
+    """分层估计的总量和方差：Σ N_h·ȳ_h，Σ N_h²·(1 - n_h/N_h)·s_h²/n_h（含有限总体校正）"""
+    value = 0.0
+    variance = 0.0
+    for population, values in strata_values:
+        if not values:
+            continue
+        mean, s2 = _mean_and_variance(values)
+        n = len(values)
+        value += population * mean
+        variance += population ** 2 * (1 - n / population) * s2 / n
+    return value, variance
+
+def _interval(value, variance, lower_bound=0, upper_bound=None):
+    half_width = Z_95 * math.sqrt(variance)
+    low = max(lower_bound, value - half_width)
+    high = value + half_width
+    if upper_bound is not None:
+        high = min(upper_bound, high)
+    return Estimate(value, low, high)
+
+def estimate_total(strata_values, lower_bound=0, upper_bound=None):
+    """分层估计总量：strata_values为 [(层内总数, 样本中每个文件的取值列表), ...]
+
+    置信区间截断到 [lower_bound, upper_bound]（如不少于样本中已经看到的数量、不超过文件总数）。
+    """
+    value, variance = _stratified_total(strata_values)
+    return _interval(value, variance, lower_bound, upper_bound)
+
+def estimate_cost(counts_by_ext, costs_by_ext):
+    """按格式估计完整扫描的耗时（秒）
+
+    counts_by_ext为每种扩展名的文件总数，costs_by_ext为样本中每种扩展名每个文件的耗时列表；
+    样本中没有出现的格式使用全部样本的平均耗时。
+    """
+    all_costs = [cost for costs in costs_by_ext.values() for cost in costs]
+    if not all_costs:
+        return Estimate(0.0, 0.0, 0.0)
+    overall_mean, overall_variance = _mean_and_variance(all_costs)
+    value, variance = _stratified_total(
+        (count, costs_by_ext[ext]) for ext, count in counts_by_ext.items() if costs_by_ext.get(ext)
+    )
+    for ext, count in counts_by_ext.items():
+        if not costs_by_ext.get(ext):
+            value += count * overall_mean
+            variance += count ** 2 * overall_variance / len(all_costs)
+    return _interval(value, variance)
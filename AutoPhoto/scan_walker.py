@@ -0,0 +1,122 @@
+import os
+from collections import namedtuple
+
+# 遍历时产出的文件条目，大小和修改时间直接取自DirEntry缓存的stat数据
+# inode同样取自DirEntry.stat()：POSIX下就是真实的inode，Windows下目录列举结果中没有文件ID，为0
+# （需要判断硬链接时用file_identity按需获取）
+ScanEntry = namedtuple('ScanEntry', ['path', 'name', 'ext', 'size', 'mtime_ns', 'inode'])
+
+def file_identity(entry):
+    """返回文件的 (设备, inode)，用于识别同一文件的多个硬链接
+
+    Windows下需要额外stat一次才能得到文件ID，因此只在确实需要时调用。
+    """
+    st = os.stat(entry.path)
+    return st.st_dev, st.st_ino
+
+def walk_media_files(directory, extensions, exclude_dirs=(), dir_index=None):
+    """基于os.scandir遍历目录，逐个产出扩展名在extensions中的文件
+
+    产出的路径保持directory的写法（如Windows下的映射盘符不会被展开为UNC路径）；
+    exclude_dirs中的目录按 (dev, inode) 比较（与经由哪个盘符、UNC路径或符号链接访问无关），在进入之前就被剪掉；
+    通过(dev, inode)记录已访问的目录，避免符号链接造成的循环。
+    提供dir_index（如MetadataCache）时，mtime未变化的目录复用上次记录的文件名和子目录，不再列举目录，
+    但每个文件仍然单独stat（原地修改文件不会改变目录的mtime）；完整列举过的目录会被记录下来供下次使用。
+    注意FAT/exFAT等文件系统上目录的mtime不可靠，新增的文件可能被漏掉，因此这只是可选的加速。
+    """
+    extensions = frozenset(extensions)
+    ext_filter = ','.join(sorted(extensions))
+    excluded = set()
+    for excluded_dir in exclude_dirs:
+        try:
+            st = os.stat(excluded_dir)
+            excluded.add((st.st_dev, st.st_ino))
+        except OSError:
+            # 不存在的目录不会被遍历到
+            pass
+    root = os.path.abspath(directory)
+
+    visited = set()
+    try:
+        st = os.stat(root)
+    except OSError as e:
+        print(f"无法访问目录 {directory}: {str(e)}")
+        return
+    if (st.st_dev, st.st_ino) in excluded:
+        return
+    visited.add((st.st_dev, st.st_ino))
+
+    stack = [(root, st.st_mtime_ns)]
+    while stack:
+        current, dir_mtime_ns = stack.pop()
+
+        known = dir_index.lookup_dir(current, dir_mtime_ns, ext_filter) if dir_index else None
+        if known is not None:
+            # 目录未变化：使用记录的文件名，但大小和修改时间重新stat，不使用记录中的旧值
+            files, subdirs = known
+            for name, _, _, recorded_inode in files:
+                path = os.path.join(current, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                except OSError as e:
+                    print(f"读取文件信息失败 {path}: {str(e)}")
+                    continue
+                # inode与列举目录时的来源一致：Windows下DirEntry.stat()的st_ino总是0，
+                # 而os.stat返回真实的文件ID，记录为0时这里也用0，否则缓存会因inode不同而失效
+                inode = st.st_ino if recorded_inode else 0
+                dot = name.rfind('.')
+                yield ScanEntry(path, name, name[dot:].lower(), st.st_size, st.st_mtime_ns, inode)
+        else:
+            files = []
+            subdirs = []
+            complete = True
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        name = entry.name
+                        try:
+                            if entry.is_dir():
+                                subdirs.append((name, entry.is_symlink()))
+                                continue
+                        except OSError:
+                            complete = False
+                            continue
+
+                        dot = name.rfind('.')
+                        if dot <= 0:
+                            continue
+                        ext = name[dot:].lower()
+                        if ext not in extensions:
+                            continue
+
+                        try:
+                            st = entry.stat()
+                            inode = st.st_ino
+                        except OSError as e:
+                            complete = False
+                            print(f"读取文件信息失败 {entry.path}: {str(e)}")
+                            continue
+                        files.append((name, st.st_size, st.st_mtime_ns, inode))
+                        yield ScanEntry(entry.path, name, ext, st.st_size, st.st_mtime_ns, inode)
+            except OSError as e:
+                print(f"无法读取目录 {current}: {str(e)}")
+                continue
+
+            if dir_index and complete:
+                dir_index.record_dir(current, dir_mtime_ns, ext_filter, files, subdirs)
+
+        # 倒序压栈，使子目录按目录项顺序被访问
+        for name, _ in reversed(subdirs):
+            path = os.path.join(current, name)
+            try:
+                st = os.stat(path)
+            except OSError as e:
+                print(f"无法访问目录 {path}: {str(e)}")
+                continue
+            key = (st.st_dev, st.st_ino)
+            if key in visited or key in excluded:
+                continue
+            visited.add(key)
+            stack.append((path, st.st_mtime_ns))
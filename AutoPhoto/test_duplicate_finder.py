@@ -0,0 +1,62 @@
+import os
+import re
+import shutil
+import tempfile
+import unittest
+from duplicate_finder import find_duplicates, format_duplicate_report, EDGE_BYTES
+from scan_walker import walk_media_files
+
+class FindDuplicatesTest(unittest.TestCase):
+    """重复文件查找：读取字节数的统计"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def scan(self):
+        entries = walk_media_files(self.directory, ['.mp4', '.jpg'])
+        return find_duplicates(list(entries))
+
+    def assert_unread_in_range(self, report):
+        self.assertGreaterEqual(report.bytes_read, 0)
+        self.assertLessEqual(report.bytes_read, report.total_bytes)
+        line = format_duplicate_report(report)[1]
+        unread = float(re.search(r'未读取 (-?[\d.]+)%', line).group(1))
+        self.assertGreaterEqual(unread, 0.0)
+        self.assertLessEqual(unread, 100.0)
+
+    def test_full_hash_counts_each_byte_once(self):
+        # 两个相同的300KB视频：先读头尾，再读完整文件，每个文件只计一次
+        data = os.urandom(300 * 1024)
+        self.write('a.mp4', data)
+        self.write('b.mp4', data)
+        report = self.scan()
+        self.assertEqual(report.full_hashed, 2)
+        self.assertEqual(len(report.sets), 1)
+        self.assertEqual(report.bytes_read, report.total_bytes)
+        self.assert_unread_in_range(report)
+
+    def test_mixed_stages(self):
+        # 小文件在第2阶段读完；大小相同但头部不同的文件只读头尾；大小唯一的文件不读取
+        small = os.urandom(EDGE_BYTES)
+        self.write('s1.jpg', small)
+        self.write('s2.jpg', small)
+        self.write('c1.mp4', b'x' + os.urandom(400 * 1024))
+        self.write('c2.mp4', b'y' + os.urandom(400 * 1024))
+        self.write('unique.mp4', os.urandom(500 * 1024))
+        report = self.scan()
+        self.assertEqual(report.full_hashed, 0)
+        self.assertEqual(len(report.sets), 1)
+        self.assertEqual(report.bytes_read, 2 * len(small) + 2 * 2 * EDGE_BYTES)
+        self.assert_unread_in_range(report)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import os
+import json
+import shutil
+import subprocess
+import threading
+from collections import namedtuple
+
+# 缓存文件格式变化时递增
+TOOLCHAIN_CACHE_VERSION = 1
+# 需要查找的工具
+TOOL_NAMES = ('ffprobe', 'ffmpeg')
+# 单次 -version 调用的超时时间（秒）
+VERSION_TIMEOUT = 10
+
+# 一个可用的外部工具：capabilities为编译时启用的功能（--enable-xxx中的xxx）
+ToolInfo = namedtuple('ToolInfo', ['name', 'path', 'version', 'capabilities'])
+
+class Toolchain:
+    """本机可用的ffmpeg/ffprobe，每个工具记录路径、版本和编译功能"""
+
+    def __init__(self, tools):
+        self.tools = tools  # 工具名 → ToolInfo，未找到的工具不在其中
+
+    def get(self, name):
+        return self.tools.get(name)
+
+    @property
+    def ffprobe_path(self):
+        tool = self.tools.get('ffprobe')
+        return tool.path if tool else None
+
+    @property
+    def has_ffprobe(self):
+        return 'ffprobe' in self.tools
+
+_toolchains = {}
+_toolchains_lock = threading.Lock()
+
+def _candidate_paths(name, bundled_dir):
+    """按优先级产出工具的候选路径：先找环境变量PATH，再找随程序附带的目录"""
+    found = shutil.which(name)
+    if found:
+        yield os.path.abspath(found)
+    if bundled_dir:
+        for file_name in (name + '.exe', name):
+            path = os.path.join(bundled_dir, file_name)
+            if os.path.isfile(path):
+                yield path
+
+def _parse_version_output(output):
+    """从 -version 输出中提取版本号和 --enable-xxx 功能列表"""
+    lines = output.splitlines()
+    version = None
+    if lines:
+        words = lines[0].split()
+        if len(words) >= 3 and words[1] == 'version':
+            version = words[2]
+    capabilities = []
+    for line in lines:
+        if line.startswith('configuration:'):
+            capabilities = sorted(
+                option[len('--enable-'):] for option in line.split() if option.startswith('--enable-')
+            )
+            break
+    return version, capabilities
+
+def _run_version(path):
+    """运行 工具 -version，可用时返回 (版本号, 功能列表)，否则返回None"""
+    try:
+        result = subprocess.run([path, '-version'], capture_output=True, text=True, timeout=VERSION_TIMEOUT)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if result.returncode != 0:
+        return None
+    return _parse_version_output(result.stdout)
+
+def _load_cache(cache_path):
+    if not cache_path or not os.path.exists(cache_path):
+        return {}
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"读取工具缓存失败: {str(e)}")
+        return {}
+    if data.get('version') != TOOLCHAIN_CACHE_VERSION:
+        return {}
+    return data.get('binaries', {})
+
+def _save_cache(cache_path, binaries):
+    if not cache_path:
+        return
+    tmp_path = cache_path + '.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': TOOLCHAIN_CACHE_VERSION, 'binaries': binaries}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"写入工具缓存失败: {str(e)}")
+
+def discover_toolchain(bundled_dir=None, cache_path=None):
+    """查找ffprobe/ffmpeg并检查是否可用
+
+    每个候选文件的检查结果（是否可用、版本、功能）按 路径 + 修改时间 + 大小 记录在cache_path中，
+    文件未变化时直接使用记录，不再启动 -version 进程。
+    """
+    cached = _load_cache(cache_path)
+    binaries = {}
+    tools = {}
+    changed = False
+    for name in TOOL_NAMES:
+        for path in _candidate_paths(name, bundled_dir):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            record = cached.get(path)
+            if record is None or record.get('mtime_ns') != st.st_mtime_ns or record.get('size') != st.st_size:
+                version_info = _run_version(path)
+                record = {
+                    'mtime_ns': st.st_mtime_ns,
+                    'size': st.st_size,
+                    'usable': version_info is not None,
+                    'version': version_info[0] if version_info else None,
+                    'capabilities': version_info[1] if version_info else [],
+                }
+                changed = True
+            binaries[path] = record
+            if record['usable']:
+                tools[name] = ToolInfo(name, path, record['version'], tuple(record['capabilities']))
+                break
+    if changed or set(binaries) != set(cached):
+        _save_cache(cache_path, binaries)
+    return Toolchain(tools)
+
+def get_toolchain(bundled_dir=None, cache_path=None, refresh=False):
+    """返回本进程共用的Toolchain，每个进程只查找一次（refresh为True时重新查找）"""
+    key = (bundled_dir, cache_path)
+    with _toolchains_lock:
+        if refresh or key not in _toolchains:
+            _toolchains[key] = discover_toolchain(bundled_dir, cache_path)
+        return _toolchains[key]
@@ -0,0 +1,409 @@
+import os
+import re
+import struct
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from date_normalizer import normalize_date
+
+# 视频解析结果：creation_time为 YYYY-MM-DD HH:MM:SS 字符串，duration为秒，bitrate为kbps，无法获取时为None
+VideoInfo = namedtuple('VideoInfo', ['creation_time', 'duration', 'bitrate'])
+
+# MP4/MOV的时间戳从1904-01-01 UTC开始计算
+MAC_EPOCH = datetime(1904, 1, 1, tzinfo=timezone.utc)
+# Matroska的DateUTC为距2001-01-01 UTC的纳秒数
+MATROSKA_EPOCH = datetime(2001, 1, 1, tzinfo=timezone.utc)
+# 先读入文件头，moov在文件开头时一次读取即可完成解析
+HEADER_READ_SIZE = 64 * 1024
+# moov通常只有几十KB到几MB，超过上限视为损坏
+MAX_MOOV_SIZE = 64 * 1024 * 1024
+# 防止损坏文件导致无限循环的上限
+MAX_ATOMS = 4096
+
+QUICKTIME_CREATIONDATE_KEY = b'com.apple.quicktime.creationdate'
+ISO_DATE_PATTERN = re.compile(rb'(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2}):(\d{2})')
+
+# Matroska/WebM中用到的EBML元素ID
+EBML_HEADER_ID = 0x1A45DFA3
+SEGMENT_ID = 0x18538067
+SEEK_HEAD_ID = 0x114D9B74
+SEEK_ID = 0x4DBB
+SEEK_ID_ID = 0x53AB
+SEEK_POSITION_ID = 0x53AC
+INFO_ID = 0x1549A966
+CLUSTER_ID = 0x1F43B675
+TIMESTAMP_SCALE_ID = 0x2AD7B1
+DURATION_ID = 0x4489
+DATE_UTC_ID = 0x4461
+
+
+class VideoFormatError(ValueError):
+    """视频容器结构无法识别或已损坏，需要交给ffprobe处理"""
+
+def _iter_atoms(data, start, end):
+    """遍历内存中的MP4 atom，产出 (类型, 内容起始偏移, atom结束偏移)"""
+    pos = start
+    for _ in range(MAX_ATOMS):
+        if pos + 8 > end:
+            return
+        size, atom_type = struct.unpack('>I4s', data[pos:pos + 8])
+        header_size = 8
+        if size == 1:
+            size = struct.unpack('>Q', data[pos + 8:pos + 16])[0]
+            header_size = 16
+        elif size == 0:
+            size = end - pos
+        if size < header_size or pos + size > end:
+            raise VideoFormatError("atom大小无效")
+        yield atom_type, pos + header_size, pos + size
+        pos += size
+
+class RangeReader:
+    """按文件偏移读取数据：文件头部分从已读入的缓冲区取，其余部分再定位读取"""
+
+    def __init__(self, fp, file_size):
+        self.fp = fp
+        self.size = file_size
+        self.head = fp.read(HEADER_READ_SIZE)
+
+    def read(self, offset, size):
+        if offset + size <= len(self.head):
+            return self.head[offset:offset + size]
+        self.fp.seek(offset)
+        data = self.fp.read(size)
+        if len(data) < size:
+            raise VideoFormatError("数据被截断")
+        return data
+
+def _find_moov(reader):
+    """遍历顶层atom找到moov并返回其内容
+
+    moov在文件开头时直接使用已读入的文件头；moov位于mdat之后时，
+    只按偏移读取各顶层atom的头部，再单独读取moov本身。
+    """
+    if reader.head[4:8] not in (b'ftyp', b'moov', b'mdat', b'free', b'wide', b'skip'):
+        raise VideoFormatError("不是MP4/MOV容器")
+
+    pos = 0
+    for _ in range(MAX_ATOMS):
+        if pos + 8 > reader.size:
+            break
+        size, atom_type = struct.unpack('>I4s', reader.read(pos, 8))
+        header_size = 8
+        if size == 1:
+            size = struct.unpack('>Q', reader.read(pos + 8, 8))[0]
+            header_size = 16
+        elif size == 0:
+            size = reader.size - pos
+        if size < header_size:
+            raise VideoFormatError("atom大小无效")
+
+        if atom_type == b'moov':
+            if size > MAX_MOOV_SIZE:
+                raise VideoFormatError("moov过大")
+            return reader.read(pos + header_size, size - header_size)
+        pos += size
+    raise VideoFormatError("未找到moov")
+
+def _parse_time_header(data, body):
+    """解析mvhd/mdhd，返回 (创建时间秒数, 时间刻度, 时长刻度)"""
+    version = data[body]
+    if version == 1:
+        creation, _, timescale, duration = struct.unpack('>QQIQ', data[body + 4:body + 32])
+        unknown_duration = 0xFFFFFFFFFFFFFFFF
+    else:
+        creation, _, timescale, duration = struct.unpack('>IIII', data[body + 4:body + 20])
+        unknown_duration = 0xFFFFFFFF
+    if duration == unknown_duration:
+        duration = 0
+    return creation, timescale, duration
+
+def _mac_time_to_str(seconds):
+    """把1904纪元的UTC秒数转换为日期字符串，0（未设置）返回None"""
+    if not seconds:
+        return None
+    try:
+        return (MAC_EPOCH + timedelta(seconds=seconds)).strftime('%Y-%m-%d %H:%M:%S')
+    except OverflowError:
+        return None
+
+def _quicktime_creationdate(data, body, end):
+    """从QuickTime元数据（meta/keys/ilst）中读取com.apple.quicktime.creationdate"""
+    # QuickTime风格的meta不带version/flags，MP4风格的meta带4字节的version/flags
+    if data[body + 4:body + 8] != b'hdlr':
+        body += 4
+
+    key_index = None
+    ilst = None
+    for atom_type, atom_body, atom_end in _iter_atoms(data, body, end):
+        if atom_type == b'keys':
+            count = struct.unpack('>I', data[atom_body + 4:atom_body + 8])[0]
+            pos = atom_body + 8
+            for index in range(1, count + 1):
+                if pos + 8 > atom_end:
+                    break
+                key_size = struct.unpack('>I', data[pos:pos + 4])[0]
+                if key_size < 8:
+                    break
+                if data[pos + 8:pos + key_size] == QUICKTIME_CREATIONDATE_KEY:
+                    key_index = index
+                    break
+                pos += key_size
+        elif atom_type == b'ilst':
+            ilst = (atom_body, atom_end)
+
+    if key_index is None or ilst is None:
+        return None
+    for atom_type, item_body, item_end in _iter_atoms(data, ilst[0], ilst[1]):
+        if struct.unpack('>I', atom_type)[0] != key_index:
+            continue
+        for child_type, child_body, child_end in _iter_atoms(data, item_body, item_end):
+            if child_type != b'data':
+                continue
+            # data atom：4字节类型 + 4字节区域，之后是UTF-8文本（如 2024-03-14T15:30:00+0800）
+            match = ISO_DATE_PATTERN.match(data[child_body + 8:child_end])
+            if match:
+                # 保留拍摄地的本地时间，忽略时区后缀
+                return '%s-%s-%s %s:%s:%s' % tuple(part.decode('ascii') for part in match.groups())
+    return None
+
+def parse_mp4(fp, file_size):
+    """解析MP4/MOV/M4V/3GP的moov，返回VideoInfo
+
+    创建时间优先使用QuickTime的creationdate键（本地时间），
+    其次是mvhd、第一个mdhd中的创建时间（UTC，与ffprobe的creation_time一致）。
+    比特率按 文件大小 / mvhd时长 计算，与ffprobe的format.bit_rate相同。
+    """
+    moov = _find_moov(RangeReader(fp, file_size))
+    movie_time = None
+    media_time = None
+    quicktime_date = None
+    timescale = duration = 0
+    media_duration = 0.0
+
+    for atom_type, body, end in _iter_atoms(moov, 0, len(moov)):
+        if atom_type == b'mvhd':
+            creation, timescale, duration = _parse_time_header(moov, body)
+            movie_time = _mac_time_to_str(creation)
+        elif atom_type == b'meta' and quicktime_date is None:
+            quicktime_date = _quicktime_creationdate(moov, body, end)
+        elif atom_type == b'udta' and quicktime_date is None:
+            for child_type, child_body, child_end in _iter_atoms(moov, body, end):
+                if child_type == b'meta':
+                    quicktime_date = _quicktime_creationdate(moov, child_body, child_end)
+        elif atom_type == b'trak':
+            for child_type, child_body, child_end in _iter_atoms(moov, body, end):
+                if child_type != b'mdia':
+                    continue
+                for mdia_type, mdia_body, _ in _iter_atoms(moov, child_body, child_end):
+                    if mdia_type != b'mdhd':
+                        continue
+                    creation, track_scale, track_duration = _parse_time_header(moov, mdia_body)
+                    if media_time is None:
+                        media_time = _mac_time_to_str(creation)
+                    if track_scale:
+                        media_duration = max(media_duration, track_duration / track_scale)
+
+    seconds = duration / timescale if timescale and duration else media_duration
+    bitrate = int(file_size * 8 / seconds / 1000) if seconds else None
+    return VideoInfo(quicktime_date or movie_time or media_time, seconds or None, bitrate)
+
+def _read_vint(reader, pos, keep_marker):
+    """读取EBML变长整数，返回 (值, 长度)；keep_marker为True时保留长度标记位（用于元素ID）"""
+    first = reader.read(pos, 1)[0]
+    if first == 0:
+        raise VideoFormatError("EBML变长整数无效")
+    length = 1
+    while not first & (0x80 >> (length - 1)):
+        length += 1
+    value = first if keep_marker else first & (0xFF >> length)
+    for byte in reader.read(pos + 1, length - 1):
+        value = (value << 8) | byte
+    if not keep_marker and value == (1 << (7 * length)) - 1:
+        value = None  # 全1表示长度未知（直播录制等场景）
+    return value, length
+
+def _iter_ebml(reader, start, end):
+    """遍历EBML元素，产出 (ID, 内容起始偏移, 内容长度)；长度未知时为None"""
+    pos = start
+    for _ in range(MAX_ATOMS):
+        if pos >= end:
+            return
+        element_id, id_len = _read_vint(reader, pos, True)
+        size, size_len = _read_vint(reader, pos + id_len, False)
+        body = pos + id_len + size_len
+        yield element_id, body, size
+        if size is None:
+            return
+        pos = body + size
+
+def _ebml_uint(data):
+    value = 0
+    for byte in data:
+        value = (value << 8) | byte
+    return value
+
+def _parse_matroska_info(reader, body, size):
+    """解析Segment Info，返回 (DateUTC字符串, 时长秒数)"""
+    timestamp_scale = 1000000
+    duration = None
+    date = None
+    for element_id, element_body, element_size in _iter_ebml(reader, body, body + size):
+        if element_size is None or element_size > 8:
+            continue
+        data = reader.read(element_body, element_size)
+        if element_id == TIMESTAMP_SCALE_ID:
+            timestamp_scale = _ebml_uint(data) or timestamp_scale
+        elif element_id == DURATION_ID and element_size in (4, 8):
+            duration = struct.unpack('>f' if element_size == 4 else '>d', data)[0]
+        elif element_id == DATE_UTC_ID and element_size == 8:
+            nanoseconds = struct.unpack('>q', data)[0]
+            if nanoseconds:
+                try:
+                    date = (MATROSKA_EPOCH + timedelta(microseconds=nanoseconds // 1000)).strftime('%Y-%m-%d %H:%M:%S')
+                except OverflowError:
+                    pass
+    seconds = duration * timestamp_scale / 1e9 if duration and duration > 0 else None
+    return date, seconds
+
+def _matroska_info_from_seek_head(reader, body, size, segment_body):
+    """从SeekHead中查找Info元素的位置（相对Segment内容起始）"""
+    for element_id, seek_body, seek_size in _iter_ebml(reader, body, body + size):
+        if element_id != SEEK_ID or seek_size is None:
+            continue
+        target_id = position = None
+        for child_id, child_body, child_size in _iter_ebml(reader, seek_body, seek_body + seek_size):
+            if child_size is None or child_size > 8:
+                continue
+            if child_id == SEEK_ID_ID:
+                target_id = _ebml_uint(reader.read(child_body, child_size))
+            elif child_id == SEEK_POSITION_ID:
+                position = _ebml_uint(reader.read(child_body, child_size))
+        if target_id == INFO_ID and position is not None:
+            return segment_body + position
+    return None
+
+def parse_matroska(fp, file_size):
+    """解析Matroska/WebM的Segment Info，返回VideoInfo
+
+    创建时间取DateUTC（UTC，与ffprobe的creation_time一致），时长取Duration × TimestampScale。
+    Info通常紧跟在SeekHead之后；若在Cluster之后才出现，则按SeekHead记录的位置直接跳转读取。
+    """
+    reader = RangeReader(fp, file_size)
+    if reader.head[:4] != struct.pack('>I', EBML_HEADER_ID):
+        raise VideoFormatError("不是Matroska/WebM容器")
+
+    for element_id, body, size in _iter_ebml(reader, 0, file_size):
+        if element_id == SEGMENT_ID:
+            break
+    else:
+        raise VideoFormatError("未找到Segment")
+
+    segment_body = body
+    segment_end = file_size if size is None else min(file_size, body + size)
+    info_pos = None
+    for element_id, child_body, child_size in _iter_ebml(reader, segment_body, segment_end):
+        if element_id == INFO_ID and child_size is not None:
+            date, seconds = _parse_matroska_info(reader, child_body, child_size)
+            break
+        if element_id == SEEK_HEAD_ID and child_size is not None:
+            info_pos = _matroska_info_from_seek_head(reader, child_body, child_size, segment_body)
+        elif element_id == CLUSTER_ID:
+            if info_pos is None:
+                raise VideoFormatError("Cluster之前未找到Info")
+            element_id, child_body, child_size = next(_iter_ebml(reader, info_pos, segment_end))
+            if element_id != INFO_ID or child_size is None:
+                raise VideoFormatError("SeekHead指向的位置不是Info")
+            date, seconds = _parse_matroska_info(reader, child_body, child_size)
+            break
+    else:
+        raise VideoFormatError("未找到Info")
+
+    bitrate = int(file_size * 8 / seconds / 1000) if seconds else None
+    return VideoInfo(date, seconds, bitrate)
+
+def _iter_riff_chunks(reader, start, end):
+    """遍历RIFF块，产出 (块ID, 内容起始偏移, 内容长度)；块按偶数字节对齐"""
+    pos = start
+    for _ in range(MAX_ATOMS):
+        if pos + 8 > end:
+            return
+        chunk_id, size = struct.unpack('<4sI', reader.read(pos, 8))
+        yield chunk_id, pos + 8, min(size, end - pos - 8)
+        pos += 8 + size + (size & 1)
+
+def _parse_avi_date(data):
+    """解析IDIT/ICRD中的日期文本"""
+    # 常见写法为ctime格式（MON JAN 01 12:00:00 2024），也有EXIF、ISO、斜杠格式和只有日期的ICRD
+    text = data.split(b'\x00', 1)[0].decode('ascii', errors='replace')
+    return normalize_date(text, 'avi')
+
+def parse_avi(fp, file_size):
+    """解析AVI的hdrl，返回VideoInfo
+
+    创建时间取IDIT块（dashcam和数码相机常用），其次是INFO列表中的ICRD；
+    时长由avih的每帧微秒数 × 总帧数计算，OpenDML（超过1GB）文件使用dmlh中的总帧数。
+    只读取各块头部和hdrl/INFO的内容，跳过movi中的音视频数据。
+    """
+    reader = RangeReader(fp, file_size)
+    if reader.head[:4] != b'RIFF' or reader.head[8:12] != b'AVI ':
+        raise VideoFormatError("不是AVI容器")
+
+    riff_end = min(file_size, 8 + struct.unpack('<I', reader.head[4:8])[0])
+    micro_sec_per_frame = total_frames = 0
+    idit_date = icrd_date = None
+    found_header = False
+    for chunk_id, body, size in _iter_riff_chunks(reader, 12, riff_end):
+        if chunk_id == b'IDIT':
+            idit_date = idit_date or _parse_avi_date(reader.read(body, min(size, 64)))
+            continue
+        if chunk_id != b'LIST' or size < 4:
+            continue
+        list_type = reader.read(body, 4)
+        if list_type == b'hdrl':
+            found_header = True
+            for child_id, child_body, child_size in _iter_riff_chunks(reader, body + 4, body + size):
+                if child_id == b'avih' and child_size >= 20:
+                    micro_sec_per_frame, _, _, _, total_frames = struct.unpack('<5I', reader.read(child_body, 20))
+                elif child_id == b'IDIT':
+                    idit_date = idit_date or _parse_avi_date(reader.read(child_body, min(child_size, 64)))
+                elif child_id == b'LIST' and child_size >= 8 and reader.read(child_body, 4) == b'odml':
+                    for odml_id, odml_body, odml_size in _iter_riff_chunks(reader, child_body + 4, child_body + child_size):
+                        if odml_id == b'dmlh' and odml_size >= 4:
+                            total_frames = max(total_frames, struct.unpack('<I', reader.read(odml_body, 4))[0])
+        elif list_type == b'INFO':
+            for child_id, child_body, child_size in _iter_riff_chunks(reader, body + 4, body + size):
+                if child_id == b'ICRD':
+                    icrd_date = _parse_avi_date(reader.read(child_body, min(child_size, 64)))
+
+    if not found_header:
+        raise VideoFormatError("未找到hdrl")
+    seconds = micro_sec_per_frame * total_frames / 1e6 or None
+    bitrate = int(file_size * 8 / seconds / 1000) if seconds else None
+    return VideoInfo(idit_date or icrd_date, seconds, bitrate)
+
+# 扩展名 → 解析函数；解析函数接收 (文件对象, 文件大小)，结构无法识别时抛出VideoFormatError
+VIDEO_PARSERS = {
+    '.mp4': parse_mp4,
+    '.mov': parse_mp4,
+    '.m4v': parse_mp4,
+    '.3gp': parse_mp4,
+    '.mkv': parse_matroska,
+    '.webm': parse_matroska,
+    '.avi': parse_avi,
+}
+
+def can_parse(ext):
+    """是否有内置解析器可以处理该扩展名"""
+    return ext.lower() in VIDEO_PARSERS
+
+def read_video_info(path):
+    """用内置解析器读取视频的创建时间、时长和比特率，不启动ffprobe"""
+    parser = VIDEO_PARSERS.get(os.path.splitext(path)[1].lower())
+    if parser is None:
+        raise VideoFormatError("没有可用的内置解析器")
+    with open(path, 'rb') as fp:
+        file_size = os.fstat(fp.fileno()).st_size
+        try:
+            return parser(fp, file_size)
+        except (struct.error, IndexError) as e:
+            raise VideoFormatError(f"视频结构损坏: {str(e)}")
@@ -0,0 +1,191 @@
+import json
+import asyncio
+import subprocess
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from date_normalizer import normalize_date
+
+# 一次ffprobe调用得到的视频信息：creation_time为 YYYY-MM-DD HH:MM:SS 字符串，
+# duration为秒，bitrate/video_bitrate为kbps，无法获取的字段为None
+ProbeResult = namedtuple('ProbeResult', [
+    'creation_time', 'duration', 'bitrate', 'width', 'height', 'codec', 'video_bitrate'
+])
+
+# 单个文件ffprobe的最长运行时间（秒），超时后强制结束进程
+PROBE_TIMEOUT = 30
+# 同时运行的ffprobe进程数
+PROBE_WORKERS = 4
+# ffprobe对无法识别的文件返回1，其余非0返回码（含被信号终止）视为崩溃
+PROBE_INVALID_DATA_CODE = 1
+
+# 依次尝试的创建时间标签
+CREATION_TAGS = ('creation_time', 'date', 'date_created', 'creation_date')
+# 只让ffprobe输出需要的字段，避免生成和解析完整的format/streams JSON
+SHOW_ENTRIES = (
+    'format=bit_rate,duration'
+    ':format_tags=' + ','.join(CREATION_TAGS) +
+    ':stream=codec_name,width,height,bit_rate'
+)
+
+class ProbeError(Exception):
+    """ffprobe超时或崩溃，无法判断文件是否有日期"""
+
+class ProbeTimeout(ProbeError):
+    pass
+
+class ProbeCrash(ProbeError):
+    pass
+
+def build_probe_command(ffprobe_path, video_path):
+    """构造只输出所需字段的ffprobe命令（只查看第一路视频流）"""
+    return [
+        ffprobe_path,
+        '-v', 'quiet',
+        '-print_format', 'json',
+        '-select_streams', 'v:0',
+        '-show_entries', SHOW_ENTRIES,
+        video_path
+    ]
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _parse_creation_time(tags):
+    """按CREATION_TAGS的顺序取第一个存在的标签并解析"""
+    for tag in CREATION_TAGS:
+        if tag in tags:
+            return normalize_date(tags[tag], 'ffprobe')
+    return None
+
+def parse_probe_output(output):
+    """把ffprobe的JSON输出转换为ProbeResult"""
+    metadata = json.loads(output)
+    fmt = metadata.get('format', {})
+    streams = metadata.get('streams') or [{}]
+    stream = streams[0]
+
+    bitrate = _to_int(fmt.get('bit_rate'))
+    video_bitrate = _to_int(stream.get('bit_rate'))
+    return ProbeResult(
+        creation_time=_parse_creation_time(fmt.get('tags', {})),
+        duration=_to_float(fmt.get('duration')),
+        bitrate=bitrate // 1000 if bitrate else None,  # 转换为kbps
+        width=_to_int(stream.get('width')),
+        height=_to_int(stream.get('height')),
+        codec=stream.get('codec_name'),
+        video_bitrate=video_bitrate // 1000 if video_bitrate else None,
+    )
+
+def run_probe(ffprobe_path, video_path, timeout=PROBE_TIMEOUT):
+    """对视频执行一次ffprobe，返回ProbeResult；文件无法识别时返回None
+
+    超过timeout秒仍未结束时结束ffprobe进程并抛出ProbeTimeout，异常退出时抛出ProbeCrash。
+    """
+    try:
+        result = subprocess.run(
+            build_probe_command(ffprobe_path, video_path), capture_output=True, text=True, timeout=timeout
+        )
+    except subprocess.TimeoutExpired:
+        raise ProbeTimeout(f"ffprobe超过{timeout}秒未结束，已强制终止")
+    return interpret_probe_result(result.returncode, result.stdout, result.stderr)
+
+def interpret_probe_result(returncode, stdout, stderr):
+    """根据ffprobe的返回码和输出得到ProbeResult；无法识别返回None，崩溃时抛出ProbeCrash"""
+    if returncode == PROBE_INVALID_DATA_CODE:
+        print(f"ffprobe处理视频失败: {stderr}")
+        return None
+    if returncode != 0:
+        raise ProbeCrash(f"ffprobe异常退出（返回码 {returncode}）")
+    return parse_probe_output(stdout)
+
+async def run_probe_async(ffprobe_path, video_path, timeout=PROBE_TIMEOUT):
+    """run_probe的asyncio版本：用asyncio.create_subprocess_exec启动ffprobe，等待时不占用线程"""
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *build_probe_command(ffprobe_path, video_path),
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+    except OSError as e:
+        raise ProbeCrash(f"调用ffprobe失败: {str(e)}")
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise ProbeTimeout(f"ffprobe超过{timeout}秒未结束，已强制终止")
+    except asyncio.CancelledError:
+        # 扫描被取消时不留下孤儿ffprobe进程
+        process.kill()
+        await process.wait()
+        raise
+    return interpret_probe_result(
+        process.returncode, stdout.decode('utf-8', 'replace'), stderr.decode('utf-8', 'replace')
+    )
+
+class ProbePool:
+    """有上限的ffprobe线程池：同时最多运行workers个ffprobe进程，每个文件有独立的超时
+
+    ffprobe在子进程中运行，线程只负责等待，因此用线程池即可；
+    某个文件超时或崩溃只影响它自己的结果，不会拖住整个扫描。
+    """
+
+    def __init__(self, ffprobe_path, workers=PROBE_WORKERS, timeout=PROBE_TIMEOUT):
+        self.ffprobe_path = ffprobe_path
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.pending = {}  # future → 提交时附带的标识
+
+    def submit(self, key, video_path):
+        """提交一个视频，key会随结果一起返回"""
+        future = self.executor.submit(self._timed_probe, video_path)
+        self.pending[future] = key
+
+    def _timed_probe(self, video_path):
+        """在线程中运行ffprobe，返回 (ProbeResult或None, ProbeError或None, 耗时秒数)"""
+        start = time.perf_counter()
+        try:
+            probe = run_probe(self.ffprobe_path, video_path, self.timeout)
+            error = None
+        except ProbeError as e:
+            probe, error = None, e
+        return probe, error, time.perf_counter() - start
+
+    def is_full(self):
+        """排队的文件是否已经足够多（调用方应先取走一些结果再继续提交）"""
+        return len(self.pending) >= self.workers * 4
+
+    def completed(self, block=False):
+        """产出已完成的 (key, ProbeResult或None, ProbeError或None, 耗时秒数)
+
+        block为False时只取已经完成的结果，为True时至少等到一个结果完成。
+        """
+        if not self.pending:
+            return
+        done, _ = wait(self.pending, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+        for future in done:
+            key = self.pending.pop(future)
+            try:
+                yield (key,) + future.result()
+            except Exception as e:
+                yield key, None, ProbeCrash(f"调用ffprobe失败: {str(e)}"), 0.0
+
+    def drain(self):
+        """按完成顺序产出剩余的全部结果"""
+        while self.pending:
+            yield from self.completed(block=True)
+
+    def close(self):
+        """取消尚未开始的任务并等待正在运行的ffprobe结束（每个最多timeout秒）"""
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.pending = {}